@@ -0,0 +1,188 @@
+#!/usr/bin/env python3
+"""
+load_server.py — Many concurrent sessions against run.py --serve.
+
+Starts mock_groq.py in this process and `run.py --serve` from a scratch
+copy of a variant (see run_bench.py), then has --sessions clients chat at
+once over /chat/stream, each for --turns turns in its own session. Prints
+the time to first text and the whole reply (p50/p95/p99), errors,
+throughput and the server's memory:
+
+  python bench/load_server.py                                  # 200 sessions x 3 turns
+  python bench/load_server.py --sessions 500 --turns 5 --ttft 400 --jitter 100
+  python bench/load_server.py --max-concurrency 16             # queue on the server's limit
+  python bench/load_server.py --max-sessions 50                # evict and reload sessions between turns
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import shutil
+import socket
+import subprocess
+import sys
+import time
+import urllib.request
+
+from mock_groq import MockGroqServer, add_arguments, settings_from_args
+from run_bench import PROMPTS, REPO_DIR, TURN_TIMEOUT, bench_env, make_workdir, percentiles
+
+
+# Seconds the server may take to start answering /health
+START_TIMEOUT = 30
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def start_server(workdir, env, port, server_config):
+    """run.py --serve in `workdir`, once /health answers."""
+    config_file = os.path.join(workdir, "config.json")
+    with open(config_file, "r") as f:
+        config = json.load(f)
+    config["server"] = server_config
+    with open(config_file, "w") as f:
+        json.dump(config, f, indent=2)
+
+    process = subprocess.Popen([sys.executable, "run.py", "--serve", f"--port={port}"], cwd=workdir, env=env,
+                               stdout=subprocess.DEVNULL, stderr=subprocess.PIPE)
+    deadline = time.monotonic() + START_TIMEOUT
+    while True:
+        try:
+            health(port)
+            return process
+        except OSError:
+            if process.poll() is not None or time.monotonic() > deadline:
+                process.kill()
+                raise RuntimeError("server did not start: " + process.stderr.read().decode(errors="replace"))
+            time.sleep(0.2)
+
+
+def health(port):
+    with urllib.request.urlopen(f"http://127.0.0.1:{port}/health", timeout=5) as response:
+        return json.load(response)
+
+
+def memory_of(pid):
+    """(current, peak) resident memory of a process in MB, from /proc; None where that is missing."""
+    sizes = {}
+    try:
+        with open(f"/proc/{pid}/status", "r") as f:
+            for line in f:
+                name, _, value = line.partition(":")
+                if name in ("VmRSS", "VmHWM"):
+                    sizes[name] = int(value.split()[0]) / 1024
+    except OSError:
+        pass
+    return sizes.get("VmRSS"), sizes.get("VmHWM")
+
+
+async def stream_turn(port, session_id, message):
+    """One /chat/stream request: (start, first, end, error) in time.perf_counter() seconds."""
+    reader, writer = await asyncio.open_connection("127.0.0.1", port)
+    body = json.dumps({"session_id": session_id, "message": message}).encode("utf-8")
+    start = time.perf_counter()
+    writer.write((f"POST /chat/stream HTTP/1.1\r\nHost: 127.0.0.1\r\n"
+                  f"Content-Type: application/json\r\nContent-Length: {len(body)}\r\n\r\n").encode() + body)
+    try:
+        status = (await reader.readline()).split()
+        error = None if status[1:2] == [b"200"] else f"HTTP {b' '.join(status[1:]).decode()}"
+        while (await reader.readline()) not in (b"\r\n", b""):
+            pass
+        first = None
+        async for line in reader:
+            if not line.startswith(b"data: "):
+                continue
+            data = json.loads(line[6:])
+            if "delta" in data and first is None:
+                first = time.perf_counter()
+            if "error" in data:
+                error = data["error"]
+        end = time.perf_counter()
+        return start, first or end, end, error
+    finally:
+        writer.close()
+
+
+async def run_session(port, index, turns, results):
+    session_id = f"load-{index}"
+    for turn in range(turns):
+        message = PROMPTS[(index + turn) % len(PROMPTS)]
+        try:
+            results.append(await asyncio.wait_for(stream_turn(port, session_id, message), TURN_TIMEOUT))
+        except Exception as e:
+            now = time.perf_counter()
+            results.append((now, now, now, str(e) or type(e).__name__))
+
+
+async def run_load(port, sessions, turns):
+    results = []
+    start = time.perf_counter()
+    await asyncio.gather(*(run_session(port, i, turns, results) for i in range(sessions)))
+    return results, time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Concurrent-session load test of run.py --serve")
+    parser.add_argument("--sessions", type=int, default=200)
+    parser.add_argument("--turns", type=int, default=3, help="turns per session")
+    parser.add_argument("--max-concurrency", type=int, default=256, help='the server\'s "max_concurrency"')
+    parser.add_argument("--max-sessions", type=int, help='the server\'s "max_sessions" (loaded at once)')
+    parser.add_argument("--max-sessions-mb", type=float, help='the server\'s "max_sessions_mb"')
+    parser.add_argument("--variant", default="riko_ai-py")
+    parser.add_argument("--api", default="{}", help='extra config.json "api" settings, as JSON')
+    add_arguments(parser)
+    args = parser.parse_args()
+
+    settings = settings_from_args(args)
+    api_config = dict({"response_cache": False}, **json.loads(args.api))
+    mock = MockGroqServer(settings).start()
+    workdir = make_workdir(os.path.join(REPO_DIR, args.variant), api_config)
+    port = free_port()
+    server_config = {"max_concurrency": args.max_concurrency}
+    if args.max_sessions is not None:
+        server_config["max_sessions"] = args.max_sessions
+    if args.max_sessions_mb is not None:
+        server_config["max_sessions_mb"] = args.max_sessions_mb
+    server = start_server(workdir, bench_env(mock), port, server_config)
+    print(f"Mock Groq API on {mock.url}: {settings.as_dict()}")
+    print(f"Riko server on port {port} (pid {server.pid}): "
+          f"{args.sessions} sessions x {args.turns} turns", flush=True)
+
+    try:
+        results, elapsed = asyncio.run(run_load(port, args.sessions, args.turns))
+        rss, peak = memory_of(server.pid)
+        sessions = health(port)
+    finally:
+        server.terminate()
+        server.wait()
+        mock.stop()
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    ok = [r for r in results if r[3] is None]
+    errors = {}
+    for r in results:
+        if r[3] is not None:
+            errors[r[3]] = errors.get(r[3], 0) + 1
+
+    print(f"\n{len(ok)}/{len(results)} turns ok in {elapsed:.1f}s ({len(ok) / elapsed:.1f} turns/s)")
+    for label, values in (("first text", [f - s for s, f, e, _ in ok]), ("total", [e - s for s, f, e, _ in ok])):
+        p = percentiles(values)
+        if p:
+            print(f"  {label:<11} p50 {p['p50']:9.1f}   p95 {p['p95']:9.1f}   p99 {p['p99']:9.1f}   "
+                  f"max {p['max']:9.1f} ms")
+    if rss is not None:
+        print(f"  server memory: {rss:.0f} MB now, {peak:.0f} MB peak "
+              f"({peak / max(1, args.sessions):.2f} MB per session)")
+    print(f"  sessions: {sessions['loaded']} loaded (~{sessions['memory_mb']} MB estimated), "
+          f"{sessions['loads']} loads, {sessions['evictions']} evictions")
+    for error, count in sorted(errors.items(), key=lambda item: -item[1])[:5]:
+        print(f"  {count} x {error}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,264 @@
+#!/usr/bin/env python3
+"""
+mock_groq.py — A local stand-in for the Groq chat completions API.
+
+Speaks enough of the OpenAI/Groq wire format for the groq SDK, streaming
+(SSE) included, so Riko can be pointed at it with GROQ_BASE_URL and timed
+without the network. Replies are filler words produced at a fixed token
+rate after a time-to-first-token, both with optional jitter, and a share
+of requests can be failed with 503s or 429s.
+
+Every chat request is logged with its start, first-token and end times, which is what
+run_bench.py uses to tell Riko's own overhead from the (simulated) model.
+
+Standalone:
+  python bench/mock_groq.py --port 8765 --ttft 200 --tokens-per-sec 300
+  GROQ_BASE_URL=http://127.0.0.1:8765 GROQ_API_KEY=anything python riko_ai-py/run.py -t
+
+GET / returns the settings and the request log as JSON.
+"""
+
+import argparse
+import json
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+DEFAULT_PORT           = 8765
+DEFAULT_TTFT_MS        = 200
+DEFAULT_TOKENS_PER_SEC = 300
+DEFAULT_REPLY_TOKENS   = 60
+
+WORDS = ("sure", "that", "sounds", "fun", "and", "I", "think", "you", "could", "try",
+         "it", "today", "maybe", "with", "a", "friend", "too")
+
+
+class MockSettings:
+    """Latency and failure knobs; times are in milliseconds."""
+
+    def __init__(self, ttft=DEFAULT_TTFT_MS, tokens_per_sec=DEFAULT_TOKENS_PER_SEC,
+                 reply_tokens=DEFAULT_REPLY_TOKENS, jitter=0.0, error_rate=0.0,
+                 rate_limit_rate=0.0, seed=None):
+        self.ttft            = ttft
+        self.tokens_per_sec  = tokens_per_sec
+        self.reply_tokens    = reply_tokens
+        self.jitter          = jitter           # +/- ms added to the first token and to each token gap
+        self.error_rate      = error_rate       # share of requests answered with a 503
+        self.rate_limit_rate = rate_limit_rate  # share answered with a 429 (retry-after: 1)
+        self.random          = random.Random(seed)
+        self.lock            = threading.Lock()
+
+    def as_dict(self):
+        return {
+            "ttft_ms": self.ttft, "tokens_per_sec": self.tokens_per_sec,
+            "reply_tokens": self.reply_tokens, "jitter_ms": self.jitter,
+            "error_rate": self.error_rate, "rate_limit_rate": self.rate_limit_rate,
+        }
+
+    def delay(self, ms):
+        """`ms` plus jitter, in seconds, never negative."""
+        with self.lock:
+            noise = self.random.uniform(-self.jitter, self.jitter) if self.jitter else 0.0
+        return max(0.0, ms + noise) / 1000
+
+    def failure(self):
+        """429, 503 or None for the next request."""
+        with self.lock:
+            roll = self.random.random()
+        if roll < self.rate_limit_rate:
+            return 429
+        if roll < self.rate_limit_rate + self.error_rate:
+            return 503
+        return None
+
+
+class MockHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    # Headers and body go out in separate writes; with Nagle on, the client's
+    # delayed ACK would add ~40 ms to every non-streamed reply
+    disable_nagle_algorithm = True
+
+    def log_message(self, *args):
+        pass
+
+    def do_GET(self):
+        server = self.server
+        with server.log_lock:
+            body = {"settings": server.settings.as_dict(), "requests": list(server.log)}
+        self._send_json(200, body)
+
+    def do_POST(self):
+        started = time.perf_counter()
+        length  = int(self.headers.get("Content-Length", 0))
+        request = json.loads(self.rfile.read(length) or b"{}")
+        settings = self.server.settings
+        entry = self._record(request, started)
+
+        status = settings.failure()
+        if status is not None:
+            message = "rate limited" if status == 429 else "overloaded"
+            headers = {"retry-after": "1"} if status == 429 else {}
+            self._finish(entry, status)
+            self._send_json(status, {"error": {"message": message, "type": "mock"}}, headers)
+            return
+
+        tokens = self._reply_tokens(request)
+        if request.get("stream"):
+            self._stream(request, tokens, entry)
+        else:
+            time.sleep(settings.delay(settings.ttft))
+            for _ in tokens[1:]:
+                time.sleep(settings.delay(1000 / settings.tokens_per_sec))
+            self._finish(entry, 200)
+            self._send_json(200, {
+                "id": "mock", "object": "chat.completion", "created": int(time.time()),
+                "model": request.get("model", "mock"),
+                "choices": [{"index": 0, "finish_reason": "stop",
+                             "message": {"role": "assistant", "content": "".join(tokens)}}],
+                "usage": self._usage(request, tokens),
+            }, self._rate_headers())
+
+    def _reply_tokens(self, request):
+        limit = request.get("max_completion_tokens") or request.get("max_tokens") or 1 << 30
+        count = max(1, min(self.server.settings.reply_tokens, limit))
+        return [WORDS[i % len(WORDS)] + " " for i in range(count)]
+
+    def _usage(self, request, tokens):
+        prompt = sum(len(m.get("content") or "") for m in request.get("messages", [])) // 4
+        return {"prompt_tokens": prompt, "completion_tokens": len(tokens),
+                "total_tokens": prompt + len(tokens)}
+
+    def _rate_headers(self):
+        return {"x-ratelimit-remaining-requests": "1000", "x-ratelimit-remaining-tokens": "100000",
+                "x-ratelimit-reset-requests": "1s", "x-ratelimit-reset-tokens": "1s"}
+
+    def _stream(self, request, tokens, entry):
+        settings = self.server.settings
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Transfer-Encoding", "chunked")
+        for name, value in self._rate_headers().items():
+            self.send_header(name, value)
+        self.end_headers()
+
+        time.sleep(settings.delay(settings.ttft))
+        entry["first"] = time.perf_counter()
+        for i, token in enumerate(tokens):
+            if i:
+                time.sleep(settings.delay(1000 / settings.tokens_per_sec))
+            chunk = {"id": "mock", "object": "chat.completion.chunk", "created": int(time.time()),
+                     "model": request.get("model", "mock"),
+                     "choices": [{"index": 0, "delta": {"content": token}, "finish_reason": None}]}
+            if i == len(tokens) - 1:
+                # Like Groq, the last chunk carries the usage
+                chunk["x_groq"] = {"id": "mock", "usage": self._usage(request, tokens)}
+            self._write_chunk(f"data: {json.dumps(chunk)}\n\n".encode("utf-8"))
+        self._finish(entry, 200)
+        self._write_chunk(b"data: [DONE]\n\n")
+        self.wfile.write(b"0\r\n\r\n")
+        self.wfile.flush()
+
+    def _write_chunk(self, data):
+        self.wfile.write(b"%x\r\n%s\r\n" % (len(data), data))
+        self.wfile.flush()
+
+    def _send_json(self, status, body, headers=None):
+        data = json.dumps(body).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(data)
+
+    def _record(self, request, started):
+        """Log a request as it arrives; _finish() fills in its end."""
+        messages = request.get("messages") or [{}]
+        entry = {
+            "start":  started,
+            "first":  None,     # first token sent (the whole reply, when not streaming)
+            "end":    None,
+            "status": None,
+            "stream": bool(request.get("stream")),
+            "model":  request.get("model"),
+            # Riko's own turns start with its personality prompt; background calls don't
+            "system": (messages[0].get("content") or "")[:40],
+        }
+        with self.server.log_lock:
+            self.server.log.append(entry)
+        return entry
+
+    def _finish(self, entry, status):
+        # Set before the last bytes go out, so the client never sees a reply the log lacks
+        entry["end"] = time.perf_counter()
+        entry["first"] = entry["first"] or entry["end"]
+        entry["status"] = status
+
+
+class MockGroqServer(ThreadingHTTPServer):
+    """The mock API on 127.0.0.1; start() serves it from a daemon thread."""
+
+    daemon_threads = True
+
+    def __init__(self, settings=None, port=0):
+        super().__init__(("127.0.0.1", port), MockHandler)
+        self.settings = settings or MockSettings()
+        self.log      = []
+        self.log_lock = threading.Lock()
+
+    @property
+    def url(self):
+        return f"http://127.0.0.1:{self.server_address[1]}"
+
+    def start(self):
+        threading.Thread(target=self.serve_forever, daemon=True).start()
+        return self
+
+    def stop(self):
+        self.shutdown()
+        self.server_close()
+
+    def requests_between(self, start, end):
+        """Finished requests that started inside [start, end] (time.perf_counter() values)."""
+        with self.log_lock:
+            return [dict(r) for r in self.log if start <= r["start"] <= end and r["end"] is not None]
+
+
+def add_arguments(parser):
+    """The latency/failure options, shared with run_bench.py."""
+    parser.add_argument("--ttft", type=float, default=DEFAULT_TTFT_MS, help="time to first token, ms")
+    parser.add_argument("--tokens-per-sec", type=float, default=DEFAULT_TOKENS_PER_SEC)
+    parser.add_argument("--reply-tokens", type=int, default=DEFAULT_REPLY_TOKENS)
+    parser.add_argument("--jitter", type=float, default=0.0, help="+/- ms on the first token and each token gap")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="share of requests failed with 503")
+    parser.add_argument("--rate-limit-rate", type=float, default=0.0, help="share of requests failed with 429")
+    parser.add_argument("--seed", type=int, default=None)
+
+
+def settings_from_args(args):
+    return MockSettings(ttft=args.ttft, tokens_per_sec=args.tokens_per_sec, reply_tokens=args.reply_tokens,
+                        jitter=args.jitter, error_rate=args.error_rate,
+                        rate_limit_rate=args.rate_limit_rate, seed=args.seed)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Local mock of the Groq chat completions API")
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT)
+    add_arguments(parser)
+    args = parser.parse_args()
+
+    server = MockGroqServer(settings_from_args(args), args.port)
+    print(f"Mock Groq API on {server.url} (GROQ_BASE_URL={server.url})")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,378 @@
+#!/usr/bin/env python3
+"""
+run_bench.py — End-to-end latency benchmark of Riko against mock_groq.py.
+
+Starts the mock Groq API in this process, copies a Riko variant into a
+scratch directory (so its config.json, memory and caches are throwaway)
+and drives it turn by turn in each mode:
+
+  reply     Riko.reply() in this process
+  stream    Riko.reply_stream() in this process, also timing the first delta
+  bridge    riko_bridge.py (C/C++ builds) as a subprocess, streaming over stdin/stdout
+  terminal  run.py --terminal as a subprocess, one line of input per turn
+
+Every turn's latency is split into the time the mock spent on Riko's own
+request(s) and the rest, which is Riko's overhead: prompt building, the
+SDK, retries, pipes and process hops. Percentiles (p50/p95/p99) of both
+are printed and saved as JSON, tagged with the git commit, so runs can be
+compared between commits:
+
+  python bench/run_bench.py                                   # every mode, 30 turns
+  python bench/run_bench.py --modes reply stream --turns 200 --jitter 40
+  python bench/run_bench.py --error-rate 0.1                  # exercise the retry path
+  python bench/run_bench.py --compare bench/results/<earlier run>.json
+"""
+
+import argparse
+import glob
+import json
+import os
+import platform
+import queue
+import shutil
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from datetime import datetime
+
+from mock_groq import MockGroqServer, add_arguments, settings_from_args
+
+
+BENCH_DIR   = os.path.dirname(os.path.abspath(__file__))
+REPO_DIR    = os.path.dirname(BENCH_DIR)
+RESULTS_DIR = os.path.join(BENCH_DIR, "results")
+
+MODES = ("reply", "stream", "bridge", "terminal")
+
+BENCH_KEY = "bench-key"
+
+# Riko's own chat requests start with its personality prompt
+RIKO_PROMPT_PREFIX = "You are Riko"
+
+# Seconds a subprocess turn may take before the run is abandoned
+TURN_TIMEOUT = 60
+
+PROMPTS = [
+    "hey, how's it going?",
+    "can you recommend a book for a long train ride?",
+    "what should I cook tonight with rice, eggs and spinach?",
+    "explain why the sky is blue like I'm five",
+    "I have a job interview tomorrow, any tips?",
+    "what's a fun weekend project for learning electronics?",
+    "tell me a joke about cats",
+    "how do I stay focused when studying at home?",
+    "give me three ideas for a rainy afternoon",
+    "what do you think about learning japanese as a hobby?",
+]
+
+
+# ── scratch copies ───────────────────────────────────────────────────────────
+
+def make_workdir(variant, api_config):
+    """A scratch copy of a variant's Python files with a bench config.json."""
+    workdir = tempfile.mkdtemp(prefix=f"riko-bench-{os.path.basename(variant)}-")
+    for path in glob.glob(os.path.join(variant, "*.py")):
+        shutil.copy(path, workdir)
+    config = {
+        "groq_api_keys": [{"label": "bench", "key": BENCH_KEY}],
+        "active_key_index": 0,
+        "api": api_config,
+    }
+    with open(os.path.join(workdir, "config.json"), "w") as f:
+        json.dump(config, f, indent=2)
+    return workdir
+
+
+def bench_env(server):
+    env = dict(os.environ, GROQ_BASE_URL=server.url, GROQ_API_KEY=BENCH_KEY, PYTHONUNBUFFERED="1")
+    env.pop("PYTHONPATH", None)
+    return env
+
+
+# ── drivers ──────────────────────────────────────────────────────────────────
+#
+# Each driver runs one turn and returns (start, first, end, reply) in
+# time.perf_counter() seconds; `first` is when the first text arrived
+# (the whole reply, for drivers that don't stream).
+
+class InProcessDriver:
+    """Riko imported from the scratch copy into this process."""
+
+    def __init__(self, workdir, stream):
+        self.stream  = stream
+        self.workdir = workdir
+        self.cwd     = os.getcwd()
+        os.chdir(workdir)
+        sys.path.insert(0, workdir)
+        for name in ("riko", "response_cache", "embeddings", "facts", "recall", "chat_history"):
+            sys.modules.pop(name, None)
+        from riko import Riko
+        self.riko = Riko()
+
+    def turn(self, message):
+        start = time.perf_counter()
+        if not self.stream:
+            reply = self.riko.reply(message)
+            end = time.perf_counter()
+            return start, end, end, reply
+        first, parts = None, []
+        for delta in self.riko.reply_stream(message):
+            if first is None:
+                first = time.perf_counter()
+            parts.append(delta)
+        end = time.perf_counter()
+        return start, first or end, end, "".join(parts)
+
+    def close(self):
+        self.riko.close()
+        sys.path.remove(self.workdir)
+        os.chdir(self.cwd)
+
+
+class SubprocessDriver:
+    """A child process read line by line on a thread, so reads can time out."""
+
+    def __init__(self, argv, workdir, env):
+        self.proc = subprocess.Popen(argv, cwd=workdir, env=env, stdin=subprocess.PIPE,
+                                     stdout=subprocess.PIPE, stderr=subprocess.DEVNULL,
+                                     text=True, encoding="utf-8", bufsize=1)
+        self.lines = queue.Queue()
+        threading.Thread(target=self._read, daemon=True).start()
+
+    def _read(self):
+        for line in self.proc.stdout:
+            self.lines.put((time.perf_counter(), line))
+        self.lines.put((time.perf_counter(), None))
+
+    def send(self, text):
+        self.proc.stdin.write(text + "\n")
+        self.proc.stdin.flush()
+
+    def next_line(self):
+        try:
+            at, line = self.lines.get(timeout=TURN_TIMEOUT)
+        except queue.Empty:
+            raise RuntimeError("timed out waiting for output")
+        if line is None:
+            raise RuntimeError(f"process exited with {self.proc.wait()}")
+        return at, line
+
+    def close(self):
+        try:
+            self.proc.stdin.close()
+            self.proc.wait(timeout=10)
+        except (OSError, subprocess.TimeoutExpired):
+            self.proc.kill()
+
+
+class BridgeDriver(SubprocessDriver):
+    """riko_bridge.py, one streaming request per turn."""
+
+    def __init__(self, workdir, env):
+        super().__init__([sys.executable, os.path.join(workdir, "riko_bridge.py")], workdir, env)
+        self.next_id = 0
+
+    def turn(self, message):
+        self.next_id += 1
+        req_id = self.next_id
+        start = time.perf_counter()
+        self.send(json.dumps({"id": req_id, "message": message, "lang_prefix": "", "stream": True}))
+        first, parts = None, []
+        while True:
+            at, line = self.next_line()
+            try:
+                frame = json.loads(line)
+            except ValueError:
+                continue
+            if frame.get("id") != req_id:
+                continue
+            if "delta" in frame:
+                first = first or at
+                parts.append(frame["delta"])
+            elif frame.get("done") or "error" in frame or "reply" in frame:
+                reply = "".join(parts) or frame.get("reply") or f"❌ {frame.get('error')}"
+                return start, first or at, at, reply
+
+
+class TerminalDriver(SubprocessDriver):
+    """run.py --terminal, which prints "Riko: <reply>" once the reply is complete."""
+
+    def __init__(self, workdir, env):
+        super().__init__([sys.executable, os.path.join(workdir, "run.py"), "--terminal"], workdir, env)
+
+    def turn(self, message):
+        start = time.perf_counter()
+        self.send(message)
+        while True:
+            at, line = self.next_line()
+            # The "You: " prompt has no newline, so it shares the reply's line
+            if "Riko: " in line:
+                return start, at, at, line.split("Riko: ", 1)[1].strip()
+
+
+# ── measuring ────────────────────────────────────────────────────────────────
+
+def percentiles(values):
+    """p50/p95/p99/mean/max of `values` (linear interpolation), in ms rounded to 0.01."""
+    if not values:
+        return {}
+    ordered = sorted(values)
+
+    def at(p):
+        pos = (len(ordered) - 1) * p / 100
+        low = int(pos)
+        high = min(low + 1, len(ordered) - 1)
+        return ordered[low] + (ordered[high] - ordered[low]) * (pos - low)
+
+    stats = {"p50": at(50), "p95": at(95), "p99": at(99),
+             "mean": sum(ordered) / len(ordered), "max": ordered[-1]}
+    return {k: round(v * 1000, 2) for k, v in stats.items()}
+
+
+def run_mode(mode, args, server, api_config):
+    variant = os.path.join(REPO_DIR, args.bridge_variant if mode == "bridge" else args.variant)
+    workdir = make_workdir(variant, api_config)
+    env = bench_env(server)
+    try:
+        if mode in ("reply", "stream"):
+            os.environ.update(GROQ_BASE_URL=server.url, GROQ_API_KEY=BENCH_KEY)
+            driver = InProcessDriver(workdir, stream=(mode == "stream"))
+        elif mode == "bridge":
+            driver = BridgeDriver(workdir, env)
+        else:
+            driver = TerminalDriver(workdir, env)
+
+        latency, overhead, server_time, ttft, ttft_overhead = [], [], [], [], []
+        errors = 0
+        for i in range(args.warmup + args.turns):
+            start, first, end, reply = driver.turn(PROMPTS[i % len(PROMPTS)] + f" (turn {i})")
+            if i < args.warmup:
+                continue
+            if reply.startswith("❌"):
+                errors += 1
+                continue
+            # Only the turn's own requests count; facts and summaries run beside it
+            own = [r for r in server.requests_between(start, end)
+                   if r["system"].startswith(RIKO_PROMPT_PREFIX)]
+            served = max(r["end"] for r in own) - min(r["start"] for r in own) if own else 0.0
+            latency.append(end - start)
+            server_time.append(served)
+            overhead.append(end - start - served)
+            answered = [r["first"] for r in own if r["status"] == 200]
+            if mode in ("stream", "bridge") and answered:
+                # Failed attempts and retry back-off before the first token count as server time
+                ttft.append(first - start)
+                ttft_overhead.append(first - start - (min(answered) - min(r["start"] for r in own)))
+        driver.close()
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    result = {
+        "turns": args.turns, "errors": errors,
+        "latency_ms": percentiles(latency),
+        "server_ms": percentiles(server_time),
+        "overhead_ms": percentiles(overhead),
+    }
+    if ttft:
+        result["ttft_ms"] = percentiles(ttft)
+        result["ttft_overhead_ms"] = percentiles(ttft_overhead)
+    return result
+
+
+# ── reporting ────────────────────────────────────────────────────────────────
+
+def git_commit():
+    try:
+        commit = subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], cwd=REPO_DIR,
+                                         text=True, stderr=subprocess.DEVNULL).strip()
+        dirty = subprocess.call(["git", "diff", "--quiet", "HEAD"], cwd=REPO_DIR,
+                                stderr=subprocess.DEVNULL) != 0
+        return commit + ("-dirty" if dirty else "")
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+def print_results(results):
+    print(f"\n{'mode':<10}{'metric':<18}{'p50':>10}{'p95':>10}{'p99':>10}{'max':>10}   (ms)")
+    for mode, result in results["modes"].items():
+        if "error" in result:
+            print(f"{mode:<10}failed: {result['error']}")
+            continue
+        for metric in ("latency_ms", "server_ms", "overhead_ms", "ttft_ms", "ttft_overhead_ms"):
+            stats = result.get(metric)
+            if stats:
+                print(f"{mode:<10}{metric[:-3]:<18}" + "".join(f"{stats[p]:>10.2f}" for p in ("p50", "p95", "p99", "max")))
+        if result["errors"]:
+            print(f"{mode:<10}{'errors':<18}{result['errors']:>10}")
+
+
+def print_comparison(old, new):
+    print(f"\nvs {old.get('commit', '?')} ({old.get('timestamp', '?')}): overhead, ms")
+    print(f"{'mode':<10}{'':<6}{'old':>10}{'new':>10}{'change':>10}")
+    for mode, result in new["modes"].items():
+        before = old.get("modes", {}).get(mode, {}).get("overhead_ms")
+        after = result.get("overhead_ms")
+        if not before or not after:
+            continue
+        for p in ("p50", "p95", "p99"):
+            change = (after[p] - before[p]) / before[p] * 100 if before[p] else 0.0
+            print(f"{mode:<10}{p:<6}{before[p]:>10.2f}{after[p]:>10.2f}{change:>+9.1f}%")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Latency benchmark of Riko against a local mock Groq API")
+    parser.add_argument("--modes", nargs="+", choices=MODES, default=list(MODES))
+    parser.add_argument("--turns", type=int, default=30, help="measured turns per mode")
+    parser.add_argument("--warmup", type=int, default=3, help="unmeasured turns first (imports, connections)")
+    parser.add_argument("--variant", default="riko_ai-py", help="variant for reply/stream/terminal")
+    parser.add_argument("--bridge-variant", default="riko_ai-C", help="variant whose riko_bridge.py is used")
+    parser.add_argument("--api", default="{}", help='extra config.json "api" settings, as JSON')
+    parser.add_argument("--out", help="results file (default: bench/results/<time>-<commit>.json)")
+    parser.add_argument("--compare", help="earlier results file to compare overheads with")
+    add_arguments(parser)
+    args = parser.parse_args()
+
+    settings = settings_from_args(args)
+    # Caches would answer repeated turns without a request; keep them out of the way
+    api_config = dict({"response_cache": False, "semantic_cache": {"enabled": False}}, **json.loads(args.api))
+    server = MockGroqServer(settings).start()
+    print(f"Mock Groq API on {server.url}: {settings.as_dict()}")
+
+    results = {
+        "commit": git_commit(),
+        "timestamp": datetime.now().isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "mock": settings.as_dict(),
+        "api": api_config,
+        "turns": args.turns,
+        "warmup": args.warmup,
+        "modes": {},
+    }
+    try:
+        for mode in args.modes:
+            print(f"running {mode}...", flush=True)
+            try:
+                results["modes"][mode] = run_mode(mode, args, server, api_config)
+            except Exception as e:
+                results["modes"][mode] = {"error": str(e), "errors": 0}
+    finally:
+        server.stop()
+
+    print_results(results)
+    if args.compare:
+        with open(args.compare, "r") as f:
+            print_comparison(json.load(f), results)
+
+    out = args.out or os.path.join(
+        RESULTS_DIR, f"{datetime.now().strftime('%Y%m%d-%H%M%S')}-{results['commit']}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(out)), exist_ok=True)
+    with open(out, "w") as f:
+        json.dump(results, f, indent=2)
+    print(f"\nSaved {out}")
+
+
+if __name__ == "__main__":
+    main()
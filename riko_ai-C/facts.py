@@ -0,0 +1,285 @@
+"""
+facts.py — Durable facts about the user, kept in memory["facts"].
+
+FactExtractor reads finished turns in small batches and asks Groq, on a
+worker thread, for anything worth remembering about the user (their name,
+job, pets, likes and dislikes, plans...). FactStore keeps the answers
+deduplicated in memory["facts"] with an inverted word index over them, so
+when a prompt is built only the few facts that share words with the new
+message are sent, within a small token budget, however many facts pile up.
+"""
+
+import heapq
+import json
+import math
+import queue
+import re
+import sys
+import threading
+import time
+
+
+# Defaults for config.json["api"]
+DEFAULT_FACTS_BATCH  = 2        # user turns collected before one extraction call
+DEFAULT_FACTS_K      = 6        # facts sent with a request at most
+DEFAULT_FACTS_TOKENS = 150      # prompt tokens those facts may take
+DEFAULT_MAX_FACTS    = 500      # facts kept; the least recently seen go first
+
+# Two facts sharing this much of their words are treated as the same fact
+DUPLICATE_OVERLAP = 0.75
+
+CHARS_PER_TOKEN = 4
+
+FACT_PROMPT = """You pick out durable facts about the user from a chat between the user and Riko, an AI.
+Durable facts stay true for weeks: name, age, job, studies, where they live, family, pets,
+hobbies, likes and dislikes, goals and long-running plans. Ignore moods, small talk,
+questions the user asked and anything only said about Riko.
+Reply with JSON only: {"user_name": "<first name or null>", "facts": ["short third-person sentence", ...]}
+Write facts like "The user has a cat named Miso." Reply {"user_name": null, "facts": []} if there is nothing new."""
+
+WORD_RE = re.compile(r"[a-z0-9']+")
+
+# Messages without a first-person word rarely say anything about the user
+FIRST_PERSON_RE = re.compile(r"\b(i|i'm|im|i've|i'd|me|my|mine|myself|we|our|us)\b", re.IGNORECASE)
+
+STOP_WORDS = frozenset("""
+a an and are as at be been but by for from has have he her his i in is it its me my of on or our
+she so that the their them they this to too user user's users was we were with you your who what
+named called also really very
+""".split())
+
+
+def fact_terms(text):
+    """Index terms of a fact or message: lower-case words minus stop words, crude plurals folded."""
+    terms = set()
+    for word in WORD_RE.findall(text.lower()):
+        word = word.strip("'")
+        if len(word) < 2 or word in STOP_WORDS:
+            continue
+        if len(word) > 3 and word.endswith("s") and not word.endswith("ss"):
+            word = word[:-1]
+        terms.add(word)
+    return terms
+
+
+def parse_facts(text):
+    """(user_name, facts) from an extraction reply; tolerant of prose around the JSON."""
+    start, end = text.find("{"), text.rfind("}")
+    if start < 0 or end < start:
+        return None, []
+    try:
+        data = json.loads(text[start:end + 1])
+    except ValueError:
+        return None, []
+    if not isinstance(data, dict):
+        return None, []
+
+    name = data.get("user_name")
+    name = name.strip() if isinstance(name, str) and name.strip().lower() not in ("", "null", "none") else None
+    facts = [f.strip() for f in data.get("facts") or [] if isinstance(f, str) and f.strip()]
+    return name, facts
+
+
+class FactStore:
+    """memory["facts"] plus an inverted index from words to the facts using them.
+
+    Each fact is {"text": ..., "seen": <unix time>}; "seen" is bumped when the
+    fact is extracted again or sent with a request, and the least recently
+    seen facts are dropped once there are more than `max_facts`.
+    """
+
+    def __init__(self, facts, max_facts=DEFAULT_MAX_FACTS):
+        self.max_facts = max_facts
+        self._lock     = threading.Lock()
+        self.load(facts)
+
+    def load(self, facts):
+        """Index the list from memory["facts"], which is updated in place from now on."""
+        with self._lock:
+            now = time.time()
+            # Older memory files may hold bare strings
+            facts[:] = [f if isinstance(f, dict) else {"text": str(f), "seen": now}
+                        for f in facts if f]
+            self.facts = facts
+            self._reindex()
+
+    def _reindex(self):
+        self.terms = [fact_terms(f["text"]) for f in self.facts]
+        self.index = {}
+        for i, terms in enumerate(self.terms):
+            for term in terms:
+                self.index.setdefault(term, set()).add(i)
+
+    def __len__(self):
+        return len(self.facts)
+
+    def _duplicate_of(self, terms):
+        """Index of a stored fact saying the same thing, or None."""
+        counts = {}
+        for term in terms:
+            for i in self.index.get(term, ()):
+                counts[i] = counts.get(i, 0) + 1
+        for i, shared in counts.items():
+            if shared / len(terms | self.terms[i]) >= DUPLICATE_OVERLAP:
+                return i
+        return None
+
+    def add(self, text):
+        """Store a fact; returns True if memory["facts"] changed."""
+        terms = fact_terms(text)
+        if not terms:
+            return False
+        now = time.time()
+        with self._lock:
+            i = self._duplicate_of(terms)
+            if i is not None:
+                if self.facts[i]["text"] == text:
+                    self.facts[i]["seen"] = now
+                    return False
+                # The newer wording wins, e.g. an updated age or job title
+                self.facts[i] = {"text": text, "seen": now}
+                for term in self.terms[i] - terms:
+                    self.index[term].discard(i)
+                for term in terms - self.terms[i]:
+                    self.index.setdefault(term, set()).add(i)
+                self.terms[i] = terms
+                return True
+
+            self.facts.append({"text": text, "seen": now})
+            self.terms.append(terms)
+            for term in terms:
+                self.index.setdefault(term, set()).add(len(self.facts) - 1)
+            if len(self.facts) > self.max_facts:
+                self._evict()
+            return True
+
+    def _evict(self):
+        keep = heapq.nlargest(self.max_facts, self.facts, key=lambda f: f["seen"])
+        self.facts[:] = sorted(keep, key=lambda f: f["seen"])
+        self._reindex()
+
+    def relevant(self, text, k=DEFAULT_FACTS_K, max_tokens=DEFAULT_FACTS_TOKENS):
+        """The facts most related to `text`, best first, at most `k` and `max_tokens`.
+
+        Facts score the summed rarity (IDF) of the words they share with
+        `text`; facts sharing no word with it are never sent.
+        """
+        with self._lock:
+            total = len(self.facts)
+            scores = {}
+            for term in fact_terms(text):
+                holders = self.index.get(term)
+                if not holders:
+                    continue
+                idf = math.log(1 + total / len(holders))
+                for i in holders:
+                    scores[i] = scores.get(i, 0.0) + idf
+
+            chosen, budget = [], max_tokens
+            now = time.time()
+            best = heapq.nlargest(k, scores, key=lambda i: (scores[i], self.facts[i]["seen"]))
+            for i in best:
+                cost = len(self.facts[i]["text"]) // CHARS_PER_TOKEN + 1
+                if cost > budget:
+                    continue
+                budget -= cost
+                self.facts[i]["seen"] = now
+                chosen.append(self.facts[i]["text"])
+            return chosen
+
+    def clear(self):
+        with self._lock:
+            self.facts.clear()
+            self._reindex()
+
+
+class FactExtractor:
+    """Extracts facts from finished turns in batches, on a worker thread.
+
+    Batches in which the user never talks about themselves (no "I", "my",
+    "we"...) are skipped without a Groq call.
+    """
+
+    def __init__(self, riko, store, batch_size=DEFAULT_FACTS_BATCH):
+        self.riko       = riko
+        self.store      = store
+        self.batch_size = batch_size
+        self.done       = 0          # leading messages of riko.history already read
+        self.generation = 0          # bumped by reset() so stale results are dropped
+        self._queue     = queue.Queue()
+        self._thread    = None
+
+    def update(self, history):
+        """Queue the turns since the last batch once enough user turns have finished."""
+        turns = history[self.done:]
+        if sum(m["role"] == "user" for m in turns) < self.batch_size:
+            return
+        self.done = len(history)
+        if not any(m["role"] == "user" and FIRST_PERSON_RE.search(m["content"]) for m in turns):
+            return
+        self._queue.put((self.generation, turns))
+
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, daemon=True)
+            self._thread.start()
+
+    def reset(self, done=1):
+        """Start reading again at history[done] (1 skips the system prompt)."""
+        self.done = done
+        self.generation += 1
+
+    def stop(self, wait=True):
+        """End the worker thread, after the queued batches unless `wait` is False, which drops them."""
+        if not wait:
+            self.generation += 1
+        if self._thread is not None:
+            self._queue.put(None)
+            if wait:
+                self._thread.join()
+            self._thread = None
+
+    def _run(self):
+        stopping = False
+        while not stopping:
+            batch = self._queue.get()
+            if batch is None:
+                return
+            generation, turns = batch
+            while not self._queue.empty():
+                batch = self._queue.get()
+                if batch is None:
+                    stopping = True       # once this batch is done
+                    break
+                next_generation, more = batch
+                if next_generation != generation:
+                    generation, turns = next_generation, []
+                turns = turns + more
+
+            if generation != self.generation:
+                continue
+            try:
+                name, facts = self._extract(turns)
+            except Exception as e:
+                print(f"Fact extraction error: {e}", file=sys.stderr)
+                continue
+            if generation != self.generation:
+                continue
+
+            changed = False
+            if name and name != self.riko.memory.get("user_name"):
+                self.riko.memory["user_name"] = name
+                changed = True
+            for fact in facts:
+                changed = self.store.add(fact) or changed
+            if changed:
+                self.riko.save_memory()
+
+    def _extract(self, turns):
+        transcript = "\n".join(
+            f"{'User' if m['role'] == 'user' else 'Riko'}: {m['content']}" for m in turns
+        )
+        known = self.riko.memory.get("user_name")
+        return parse_facts(self.riko.complete([
+            {"role": "system", "content": FACT_PROMPT},
+            {"role": "user", "content": f"Known name: {known or '(none)'}\n\nMessages:\n{transcript}"}
+        ], max_completion_tokens=200, background=True))
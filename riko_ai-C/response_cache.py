@@ -0,0 +1,287 @@
+"""
+response_cache.py — Caches in front of Riko's Groq requests.
+
+ResponseCache is an exact-match cache. A request is keyed by a hash of its
+model, temperature, token limit and messages (the system prompt plus the
+trimmed context window), so only a request that would be sent byte-for-byte
+again is answered from it. Entries live in an in-memory LRU and, optionally,
+in SQLite so they survive restarts. Both tiers expire entries after a TTL.
+
+SemanticCache also catches near-duplicates: it reuses the reply to an
+earlier question whose embedding is close enough to the new one.
+"""
+
+import hashlib
+import json
+import sqlite3
+import sys
+import threading
+import time
+from collections import OrderedDict
+
+from embeddings import VectorMatrix, get_embedder, np
+
+
+CACHE_DB = "response_cache.db"
+
+DEFAULT_MAX_ENTRIES      = 512          # in memory
+DEFAULT_MAX_DISK_ENTRIES = 10000
+DEFAULT_TTL              = 24 * 3600    # seconds
+
+# Disk entries written between trims back down to max_disk_entries
+TRIM_EVERY = 100
+
+# Defaults for config.json["api"]["semantic_cache"]
+DEFAULT_THRESHOLD        = 0.92     # cosine similarity needed to reuse a reply
+DEFAULT_SEMANTIC_ENTRIES = 100000
+
+
+def cache_key(request):
+    """Hash of everything in a chat completion request that shapes the reply."""
+    parts = {
+        "model":       request.get("model"),
+        "temperature": request.get("temperature"),
+        "max_tokens":  request.get("max_completion_tokens"),
+        "messages":    [(m["role"], m["content"].strip()) for m in request.get("messages", [])],
+    }
+    return hashlib.sha256(json.dumps(parts, sort_keys=True).encode("utf-8")).hexdigest()
+
+
+class ResponseCache:
+    """LRU + TTL cache of reply texts, with an optional SQLite tier."""
+
+    SCHEMA = """
+    CREATE TABLE IF NOT EXISTS responses (
+        key     TEXT PRIMARY KEY,
+        reply   TEXT NOT NULL,
+        expires REAL NOT NULL,
+        used    REAL NOT NULL
+    );
+    CREATE INDEX IF NOT EXISTS responses_used ON responses(used);
+    """
+
+    def __init__(self, max_entries=DEFAULT_MAX_ENTRIES, ttl=DEFAULT_TTL,
+                 db_file=CACHE_DB, max_disk_entries=DEFAULT_MAX_DISK_ENTRIES):
+        self.max_entries      = max_entries
+        self.ttl              = ttl
+        self.max_disk_entries = max_disk_entries
+        self.entries          = OrderedDict()   # key -> (expires, reply), oldest first
+        self.hits             = 0
+        self.disk_hits        = 0
+        self.misses           = 0
+        self._writes          = 0
+        self._lock            = threading.Lock()
+
+        self.db = None
+        if db_file:
+            try:
+                self.db = sqlite3.connect(db_file, check_same_thread=False)
+                self.db.executescript(self.SCHEMA)
+            except sqlite3.Error as e:
+                print(f"Response cache disk tier disabled: {e}", file=sys.stderr)
+                self.db = None
+
+    @classmethod
+    def from_config(cls, api_config):
+        """The cache described by config.json["api"], or None if "response_cache" is off."""
+        if not api_config.get("response_cache"):
+            return None
+        return cls(
+            max_entries=api_config.get("cache_entries", DEFAULT_MAX_ENTRIES),
+            ttl=api_config.get("cache_ttl", DEFAULT_TTL),
+            db_file=CACHE_DB if api_config.get("cache_on_disk", True) else None,
+        )
+
+    def get(self, key):
+        """The cached reply for `key`, or None."""
+        now = time.time()
+        with self._lock:
+            entry = self.entries.get(key)
+            if entry is not None:
+                if entry[0] > now:
+                    self.entries.move_to_end(key)
+                    self.hits += 1
+                    return entry[1]
+                del self.entries[key]
+
+            if self.db is not None:
+                row = self.db.execute(
+                    "SELECT reply, expires FROM responses WHERE key = ? AND expires > ?", (key, now)
+                ).fetchone()
+                if row is not None:
+                    with self.db:
+                        self.db.execute("UPDATE responses SET used = ? WHERE key = ?", (now, key))
+                    self._remember(key, row[1], row[0])
+                    self.hits += 1
+                    self.disk_hits += 1
+                    return row[0]
+
+            self.misses += 1
+            return None
+
+    def put(self, key, reply):
+        now = time.time()
+        expires = now + self.ttl
+        with self._lock:
+            self._remember(key, expires, reply)
+            if self.db is not None:
+                with self.db:
+                    self.db.execute(
+                        "INSERT OR REPLACE INTO responses (key, reply, expires, used) VALUES (?, ?, ?, ?)",
+                        (key, reply, expires, now)
+                    )
+                self._writes += 1
+                if self._writes % TRIM_EVERY == 0:
+                    self._trim_disk(now)
+
+    def _remember(self, key, expires, reply):
+        self.entries[key] = (expires, reply)
+        self.entries.move_to_end(key)
+        while len(self.entries) > self.max_entries:
+            self.entries.popitem(last=False)
+
+    def _trim_disk(self, now):
+        with self.db:
+            self.db.execute("DELETE FROM responses WHERE expires <= ?", (now,))
+            self.db.execute(
+                "DELETE FROM responses WHERE key IN ("
+                "SELECT key FROM responses ORDER BY used DESC LIMIT -1 OFFSET ?)",
+                (self.max_disk_entries,)
+            )
+
+    def stats(self):
+        """Hit/miss counters since start-up."""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "hits":      self.hits,
+                "disk_hits": self.disk_hits,
+                "misses":    self.misses,
+                "hit_rate":  self.hits / lookups if lookups else 0.0,
+                "entries":   len(self.entries),
+            }
+
+    def clear(self):
+        with self._lock:
+            self.entries.clear()
+            if self.db is not None:
+                with self.db:
+                    self.db.execute("DELETE FROM responses")
+
+
+class SemanticCache:
+    """Answers near-duplicate questions with the reply to an earlier one.
+
+    Every cached question is embedded (see embeddings.py) into a single
+    NumPy matrix. A new question is compared with the earlier questions
+    asked in the same scope (Riko uses the model, system prompt and the
+    reply being answered), and the closest one's reply is reused once its
+    cosine similarity reaches the threshold. When the matrix is full the
+    oldest entries are overwritten.
+
+    Settings come from config.json["api"]["semantic_cache"]: "enabled",
+    "threshold", "max_entries", "embedding_model", and "chats", which maps
+    a chat id to its own {"enabled": ..., "threshold": ...}.
+    """
+
+    def __init__(self, embedder, enabled=True, threshold=DEFAULT_THRESHOLD,
+                 max_entries=DEFAULT_SEMANTIC_ENTRIES, chats=None):
+        self.embedder      = embedder
+        self.enabled       = enabled
+        self.threshold     = threshold
+        self.max_entries   = max_entries
+        self.chats         = {str(k): v for k, v in (chats or {}).items()}
+        self.matrix        = VectorMatrix(embedder.dim)
+        self.entries       = []     # row -> (scope, question, reply)
+        self.rows_by_scope = {}     # scope -> rows holding its questions
+        self.next_row      = 0      # where the next entry goes once the matrix is full
+        self.hits          = 0
+        self.misses        = 0
+        self._lock         = threading.Lock()
+
+    @classmethod
+    def from_config(cls, api_config):
+        """The cache described by config.json["api"], or None if no chat uses it."""
+        config = api_config.get("semantic_cache") or {}
+        chats  = config.get("chats") or {}
+        enabled = bool(config.get("enabled"))
+        if not enabled and not any(c.get("enabled") for c in chats.values()):
+            return None
+
+        embedder = get_embedder(config.get("embedding_model"))
+        if embedder is None:
+            print("Semantic cache needs NumPy (pip install numpy); it is off", file=sys.stderr)
+            return None
+        return cls(
+            embedder,
+            enabled=enabled,
+            threshold=config.get("threshold", DEFAULT_THRESHOLD),
+            max_entries=config.get("max_entries", DEFAULT_SEMANTIC_ENTRIES),
+            chats=chats,
+        )
+
+    def settings(self, chat_id):
+        """(enabled, threshold) for a chat, after its overrides."""
+        overrides = self.chats.get(str(chat_id), {})
+        return overrides.get("enabled", self.enabled), overrides.get("threshold", self.threshold)
+
+    def lookup(self, scope, question, chat_id=None):
+        """The reply to the closest earlier question in `scope`, or None."""
+        enabled, threshold = self.settings(chat_id)
+        if not enabled:
+            return None
+
+        with self._lock:
+            rows = self.rows_by_scope.get(scope)
+            rows = np.array(rows, dtype=np.int64) if rows else None
+        if rows is not None:
+            found, scores = self.matrix.search(self.embedder.embed([question])[0], 1, rows)
+            if len(found) and scores[0] >= threshold:
+                with self._lock:
+                    self.hits += 1
+                    return self.entries[found[0]][2]
+
+        with self._lock:
+            self.misses += 1
+        return None
+
+    def add(self, scope, question, reply, chat_id=None):
+        if not reply or not self.settings(chat_id)[0]:
+            return
+        vector = self.embedder.embed([question])[0]
+
+        with self._lock:
+            if len(self.entries) < self.max_entries:
+                row = self.matrix.add(vector)
+                self.entries.append((scope, question, reply))
+            else:
+                row = self.next_row
+                self.next_row = (row + 1) % self.max_entries
+                self.rows_by_scope[self.entries[row][0]].remove(row)
+                self.matrix.replace(row, vector)
+                self.entries[row] = (scope, question, reply)
+            self.rows_by_scope.setdefault(scope, []).append(row)
+
+    def nearest(self, question, k=5):
+        """The k most similar cached questions in any scope, as (question, reply, score)."""
+        found, scores = self.matrix.search(self.embedder.embed([question])[0], k)
+        with self._lock:
+            return [(self.entries[row][1], self.entries[row][2], float(score))
+                    for row, score in zip(found, scores)]
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "hits":     self.hits,
+                "misses":   self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "entries":  len(self.entries),
+            }
+
+    def clear(self):
+        with self._lock:
+            self.matrix.clear()
+            self.entries.clear()
+            self.rows_by_scope.clear()
+            self.next_row = 0
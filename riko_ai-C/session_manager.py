@@ -0,0 +1,196 @@
+"""
+session_manager.py — Many users' Rikos in one process, within a memory cap.
+
+SessionManager maps session ids to Sessions, each holding one user's
+Riko with its own memory file. Recently used sessions stay loaded. When
+there are more than `max_sessions`, or their estimated size goes over
+`max_bytes`, the least recently used idle ones are closed. Closing one
+writes its memory to its file, and the next request for it loads it back
+from there.
+
+Loading and closing touch files, so both run off the event loop. They
+use separate thread pools: closing waits for a session's queued summary
+and fact extraction, which can take as long as a Groq request, and loads
+must not queue behind that. Sessions in use are never evicted, so the
+caps can be exceeded while more sessions than they allow are busy at once.
+
+    manager = SessionManager(make_riko, "sessions")
+    async with manager.use("alice") as session:
+        async with session.lock:
+            reply = await session.riko.areply("hi")
+"""
+
+import asyncio
+import json
+import os
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import asynccontextmanager
+
+
+DEFAULT_MAX_SESSIONS = 1000
+DEFAULT_MAX_MB       = 512
+DEFAULT_IO_THREADS   = 8
+
+# Estimated size of a loaded session: a fresh Riko adds ~128 KB to the
+# server's RSS (its objects and worker thread stacks), then ~3-4 bytes per
+# character of its memory and history, kept as str objects in dicts
+SESSION_BASE_BYTES  = 128 * 1024
+BYTES_PER_TEXT_CHAR = 4
+
+
+def estimate_size(riko):
+    """Rough bytes a loaded Riko takes; grows with its memory and history."""
+    text = len(json.dumps(riko.memory)) + sum(len(m["content"]) for m in riko.history)
+    return SESSION_BASE_BYTES + BYTES_PER_TEXT_CHAR * text
+
+
+class Session:
+    """One user's Riko while it is loaded."""
+
+    def __init__(self, session_id, riko):
+        self.id    = session_id
+        self.riko  = riko
+        self.lock  = asyncio.Lock()     # one turn at a time
+        self.users = 0                  # requests holding it; only idle sessions are evicted
+        self.size  = estimate_size(riko)
+
+
+class SessionManager:
+    """Session id -> Session, keeping the most recently used ones loaded.
+
+    `factory(session_id, memory_file)` makes a session's Riko; its memory
+    file is <directory>/<session_id>.json. Session ids are used as file
+    names as they are, so callers must check them first.
+    """
+
+    def __init__(self, factory, directory, max_sessions=DEFAULT_MAX_SESSIONS,
+                 max_bytes=DEFAULT_MAX_MB * 1024 * 1024, io_threads=DEFAULT_IO_THREADS):
+        self.factory      = factory
+        self.directory    = directory
+        self.max_sessions = max(1, max_sessions)
+        self.max_bytes    = max_bytes
+        self.sessions     = OrderedDict()  # session id -> Session, least recently used first
+        self.pending      = {}             # session id -> task loading or closing it
+        self.total_bytes  = 0              # estimated size of the loaded sessions
+        self.loads        = 0
+        self.evictions    = 0
+        self._executor    = ThreadPoolExecutor(max_workers=io_threads, thread_name_prefix="sessions")
+        self._closer      = ThreadPoolExecutor(max_workers=io_threads, thread_name_prefix="sessions-close")
+        os.makedirs(directory, exist_ok=True)
+
+    @classmethod
+    def from_config(cls, factory, server_config):
+        """The manager described by config.json["server"]."""
+        return cls(
+            factory,
+            server_config.get("sessions_dir", "sessions"),
+            max_sessions=int(server_config.get("max_sessions", DEFAULT_MAX_SESSIONS)),
+            max_bytes=int(server_config.get("max_sessions_mb", DEFAULT_MAX_MB) * 1024 * 1024),
+        )
+
+    def path(self, session_id):
+        return os.path.join(self.directory, f"{session_id}.json")
+
+    def exists(self, session_id):
+        """Whether `session_id` is loaded or has a memory file to load."""
+        return session_id in self.sessions or session_id in self.pending or os.path.exists(self.path(session_id))
+
+    def stats(self):
+        return {
+            "loaded": len(self.sessions),
+            "memory_mb": round(self.total_bytes / (1024 * 1024), 1),
+            "loads": self.loads,
+            "evictions": self.evictions,
+        }
+
+    async def acquire(self, session_id):
+        """The Session for `session_id`, loaded if needed; hold it until release()."""
+        while True:
+            session = self.sessions.get(session_id)
+            if session is not None:
+                session.users += 1
+                break
+            task = self.pending.get(session_id)
+            if task is None:
+                # It comes back held, so no other request evicts it before this one gets it
+                task = self.pending[session_id] = asyncio.ensure_future(self._load(session_id))
+                try:
+                    await asyncio.wait([task])
+                except asyncio.CancelledError:
+                    # The load goes on without this request; give back its hold once it is done
+                    task.add_done_callback(self._release_loaded)
+                    raise
+                session = task.result()
+                break
+            # Being loaded for another request, or still being written out
+            await asyncio.wait([task])
+
+        self.sessions.move_to_end(session_id)
+        self.evict()
+        return session
+
+    def release(self, session):
+        """Give back a Session from acquire(), re-estimating its size."""
+        session.users -= 1
+        if self.sessions.get(session.id) is session:
+            size = estimate_size(session.riko)
+            self.total_bytes += size - session.size
+            session.size = size
+        self.evict()
+
+    def _release_loaded(self, task):
+        if not task.cancelled() and task.exception() is None:
+            self.release(task.result())
+
+    @asynccontextmanager
+    async def use(self, session_id):
+        """acquire() and release() around a block."""
+        session = await self.acquire(session_id)
+        try:
+            yield session
+        finally:
+            self.release(session)
+
+    def evict(self):
+        """Close least recently used idle sessions until both caps are met."""
+        for session in list(self.sessions.values()):
+            if len(self.sessions) <= self.max_sessions and self.total_bytes <= self.max_bytes:
+                break
+            if session.users:
+                continue
+            del self.sessions[session.id]
+            self.total_bytes -= session.size
+            self.evictions += 1
+            # Submitted now, so close() waits for it even if the task has not run yet
+            closing = self._closer.submit(session.riko.close)
+            self.pending[session.id] = asyncio.ensure_future(self._unload(session, closing))
+
+    async def _load(self, session_id):
+        try:
+            riko = await asyncio.get_running_loop().run_in_executor(
+                self._executor, self.factory, session_id, self.path(session_id))
+            session = self.sessions[session_id] = Session(session_id, riko)
+            session.users = 1
+            self.total_bytes += session.size
+            self.loads += 1
+            return session
+        finally:
+            del self.pending[session_id]
+
+    async def _unload(self, session, closing):
+        try:
+            await asyncio.wrap_future(closing)
+        except Exception as e:
+            print(f"Session {session.id} close error: {e}")
+        finally:
+            del self.pending[session.id]
+
+    def close(self):
+        """Close every loaded session, writing its memory; waits for evictions under way."""
+        self._executor.shutdown(wait=True)
+        self._closer.shutdown(wait=True)
+        for session in self.sessions.values():
+            session.riko.close()
+        self.sessions.clear()
+        self.total_bytes = 0
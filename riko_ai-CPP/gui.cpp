@@ -21,9 +21,15 @@
 
 #define CONFIG_FILE  "config.json"
 #define HISTORY_FILE "chat_history.json"
+#define JOURNAL_FILE "chat_history.jsonl"
+#define CACHE_FILE   "response_cache.db"
+#define RECALL_FILE  "recall.db"
 #define MEMORY_FILE  "riko_memory.json"
 #define MEMORY_FILE2 "memory.json"
 
+/* Journal records written before they are folded into a new snapshot */
+#define JOURNAL_COMPACT_EVERY 500
+
 #define DEFAULT_PROMPT \
 "You are Riko, a warm and curious AI with genuine personality.\n\n" \
 "WHO YOU ARE:\n" \
@@ -80,6 +86,8 @@ struct AppState {
     /* Chat history (owned JsonArray of JsonObject) */
     JsonArray         *chats;
     int                current_chat_id;
+    gint64             journal_seq;      /* last journal record applied   */
+    guint              journal_pending;  /* records since the last snapshot */
 
     /* Main window widgets */
     GtkWidget         *window;
@@ -94,6 +102,13 @@ struct AppState {
 
     gboolean           is_thinking;
     gchar             *project_dir;
+
+    /* Streamed reply in progress (see riko_bridge.py protocol) */
+    gint               next_request_id;
+    gint               stream_request_id;
+    int                stream_chat_id;
+    GString           *stream_reply;
+    gboolean           stream_live;
 };
 
 /* Settings window state */
@@ -259,10 +274,95 @@ save_config(AppState *app)
 /*  Chat history                                                                */
 /* ═══════════════════════════════════════════════════════════════════════════ */
 
+/*
+ * chat_history.json is a snapshot. Every change made after it is appended to
+ * chat_history.jsonl as one JSON record, so saving a message costs the same
+ * however long the history gets. On load the journal is replayed on top of
+ * the snapshot, and every JOURNAL_COMPACT_EVERY records it is folded back
+ * into a fresh snapshot. Records (same format as the Python chat_history.py):
+ *   {"seq", "op": "create",  "chat": {...}}
+ *   {"seq", "op": "message", "chat_id", "msg": {...}}
+ *   {"seq", "op": "rename",  "chat_id", "title"}
+ *   {"seq", "op": "delete",  "chat_id"}
+ */
+
+static void
+apply_journal_record(JsonArray *chats, JsonObject *rec)
+{
+    const gchar *op = jstr(rec, "op", "");
+
+    if (g_strcmp0(op, "create") == 0) {
+        JsonObject *chat = jobj(rec, "chat");
+        if (chat) json_array_add_object_element(chats, json_object_ref(chat));
+        return;
+    }
+
+    gint chat_id = jint(rec, "chat_id", -1);
+    if (chat_id < 0 || (guint)chat_id >= json_array_get_length(chats)) return;
+    JsonObject *chat = json_array_get_object_element(chats, chat_id);
+
+    if (g_strcmp0(op, "message") == 0) {
+        JsonObject *msg = jobj(rec, "msg");
+        JsonArray  *messages = jarr(chat, "messages");
+        if (!messages) {
+            messages = json_array_new();
+            json_object_set_array_member(chat, "messages", messages);
+        }
+        if (msg) json_array_add_object_element(messages, json_object_ref(msg));
+    } else if (g_strcmp0(op, "rename") == 0) {
+        json_object_set_string_member(chat, "title", jstr(rec, "title", "Chat"));
+    } else if (g_strcmp0(op, "delete") == 0) {
+        json_array_remove_element(chats, chat_id);
+        guint len = json_array_get_length(chats);
+        for (guint i = 0; i < len; i++)
+            json_object_set_int_member(json_array_get_object_element(chats, i), "id", (int)i);
+    }
+}
+
+/* Replays chat_history.jsonl onto app->chats, dropping a torn last record */
+static void
+replay_journal(AppState *app)
+{
+    gchar *contents = NULL;
+    gsize  length   = 0;
+    if (!g_file_get_contents(JOURNAL_FILE, &contents, &length, NULL)) return;
+
+    gsize valid = 0;
+    JsonParser *parser = json_parser_new();
+    while (valid < length) {
+        gchar *line = contents + valid;
+        gchar *nl   = (gchar *)memchr(line, '\n', length - valid);
+        if (!nl) break;                               /* write cut short by a crash */
+        gsize line_len = (gsize)(nl - line);
+
+        if (!json_parser_load_from_data(parser, line, (gssize)line_len, NULL)) break;
+        JsonNode *root = json_parser_get_root(parser);
+        if (!root || JSON_NODE_TYPE(root) != JSON_NODE_OBJECT) break;
+
+        /* Records already in the snapshot (crash during compaction) are skipped */
+        JsonObject *rec = json_node_get_object(root);
+        gint64 seq = json_object_has_member(rec, "seq") ? json_object_get_int_member(rec, "seq") : 0;
+        if (seq > app->journal_seq) {
+            apply_journal_record(app->chats, rec);
+            app->journal_seq = seq;
+        }
+        app->journal_pending++;
+        valid += line_len + 1;
+    }
+    g_object_unref(parser);
+
+    /* Cut the torn tail so new records start on a clean line */
+    if (valid < length)
+        g_file_set_contents(JOURNAL_FILE, contents, (gssize)valid, NULL);
+    g_free(contents);
+}
+
 static void
 load_chat_history(AppState *app)
 {
     if (app->chats) { json_array_unref(app->chats); app->chats = NULL; }
+    app->journal_seq     = 0;
+    app->journal_pending = 0;
 
     JsonParser *parser = json_parser_new();
     GError *err = NULL;
@@ -272,6 +372,8 @@ load_chat_history(AppState *app)
             JsonObject *hist = json_node_get_object(root);
             JsonArray  *arr  = jarr(hist, "chats");
             if (arr) app->chats = json_array_ref(arr);
+            if (json_object_has_member(hist, "journal_seq"))
+                app->journal_seq = json_object_get_int_member(hist, "journal_seq");
         }
     } else {
         if (err) { g_error_free(err); }
@@ -279,13 +381,16 @@ load_chat_history(AppState *app)
     g_object_unref(parser);
 
     if (!app->chats) app->chats = json_array_new();
+    replay_journal(app);
 }
 
+/* Writes a full snapshot (atomically) and starts a new, empty journal */
 static void
 save_chat_history(AppState *app)
 {
     JsonObject *root_obj = json_object_new();
     json_object_set_array_member(root_obj, "chats", json_array_ref(app->chats));
+    json_object_set_int_member(root_obj, "journal_seq", app->journal_seq);
 
     JsonNode *root = json_node_new(JSON_NODE_OBJECT);
     json_node_set_object(root, root_obj);
@@ -296,13 +401,49 @@ save_chat_history(AppState *app)
 
     GError *err = NULL;
     json_generator_to_file(gen, HISTORY_FILE, &err);
-    if (err) { g_warning("History save: %s", err->message); g_error_free(err); }
+    if (err) {
+        g_warning("History save: %s", err->message);
+        g_error_free(err);
+    } else {
+        g_file_set_contents(JOURNAL_FILE, "", 0, NULL);
+        app->journal_pending = 0;
+    }
 
     g_object_unref(gen);
     json_node_free(root);
     json_object_unref(root_obj);
 }
 
+/* Applies one change in memory and appends it to the journal */
+static void
+journal_commit(AppState *app, JsonObject *rec)
+{
+    json_object_set_int_member(rec, "seq", ++app->journal_seq);
+    apply_journal_record(app->chats, rec);
+
+    JsonNode *node = json_node_new(JSON_NODE_OBJECT);
+    json_node_set_object(node, rec);
+    JsonGenerator *gen = json_generator_new();
+    json_generator_set_root(gen, node);
+    gchar *line = json_generator_to_data(gen, NULL);
+
+    FILE *f = fopen(JOURNAL_FILE, "a");
+    if (f) {
+        fprintf(f, "%s\n", line);
+        fclose(f);
+        app->journal_pending++;
+    } else {
+        g_warning("History journal: could not open %s", JOURNAL_FILE);
+    }
+
+    g_free(line);
+    g_object_unref(gen);
+    json_node_free(node);
+
+    if (app->journal_pending >= JOURNAL_COMPACT_EVERY)
+        save_chat_history(app);
+}
+
 /* Returns the new chat id */
 static int
 create_chat(AppState *app)
@@ -320,8 +461,11 @@ create_chat(AppState *app)
     strftime(ts, sizeof(ts), "%Y-%m-%dT%H:%M:%S", localtime(&now));
     json_object_set_string_member(chat, "timestamp", ts);
 
-    json_array_add_object_element(app->chats, chat);
-    save_chat_history(app);
+    JsonObject *rec = json_object_new();
+    json_object_set_string_member(rec, "op", "create");
+    json_object_set_object_member(rec, "chat", chat);
+    journal_commit(app, rec);
+    json_object_unref(rec);
 
     g_free(title);
     return id;
@@ -341,12 +485,6 @@ add_history_message(AppState *app, int chat_id, const gchar *sender, const gchar
     JsonObject *chat = get_chat(app, chat_id);
     if (!chat) return;
 
-    JsonArray *messages = jarr(chat, "messages");
-    if (!messages) {
-        messages = json_array_new();
-        json_object_set_array_member(chat, "messages", messages);
-    }
-
     JsonObject *msg = json_object_new();
     json_object_set_string_member(msg, "sender", sender);
     json_object_set_string_member(msg, "message", message);
@@ -356,23 +494,32 @@ add_history_message(AppState *app, int chat_id, const gchar *sender, const gchar
     strftime(ts, sizeof(ts), "%Y-%m-%dT%H:%M:%S", localtime(&now));
     json_object_set_string_member(msg, "timestamp", ts);
 
-    json_array_add_object_element(messages, msg);
+    JsonObject *rec = json_object_new();
+    json_object_set_string_member(rec, "op", "message");
+    json_object_set_int_member(rec, "chat_id", chat_id);
+    json_object_set_object_member(rec, "msg", msg);
+    journal_commit(app, rec);
+    json_object_unref(rec);
 
     /* Auto-title from first user message */
     if (g_strcmp0(sender, "You") == 0) {
-        guint msg_count = json_array_get_length(messages);
+        JsonArray *messages = jarr(chat, "messages");
+        guint msg_count = messages ? json_array_get_length(messages) : 0;
         if (msg_count <= 2) {
             gchar *title = g_strndup(message, 30);
             if (strlen(message) > 30) {
                 gchar *t2 = g_strdup_printf("%s...", title);
                 g_free(title); title = t2;
             }
-            json_object_set_string_member(chat, "title", title);
+            JsonObject *rename = json_object_new();
+            json_object_set_string_member(rename, "op", "rename");
+            json_object_set_int_member(rename, "chat_id", chat_id);
+            json_object_set_string_member(rename, "title", title);
+            journal_commit(app, rename);
+            json_object_unref(rename);
             g_free(title);
         }
     }
-
-    save_chat_history(app);
 }
 
 static void
@@ -381,18 +528,11 @@ delete_chat(AppState *app, int chat_id)
     guint len = json_array_get_length(app->chats);
     if (chat_id < 0 || (guint)chat_id >= len) return;
 
-    /* Build a new array without this element */
-    JsonArray *new_arr = json_array_new();
-    for (guint i = 0; i < len; i++) {
-        if ((int)i == chat_id) continue;
-        JsonObject *c = json_array_get_object_element(app->chats, i);
-        json_object_set_int_member(c, "id", (int)json_array_get_length(new_arr));
-        json_array_add_object_element(new_arr, json_object_ref(c));
-    }
-
-    json_array_unref(app->chats);
-    app->chats = new_arr;
-    save_chat_history(app);
+    JsonObject *rec = json_object_new();
+    json_object_set_string_member(rec, "op", "delete");
+    json_object_set_int_member(rec, "chat_id", chat_id);
+    journal_commit(app, rec);
+    json_object_unref(rec);
 }
 
 /* ═══════════════════════════════════════════════════════════════════════════ */
@@ -603,7 +743,64 @@ update_chat_title(AppState *app)
 
 /* ─── Riko async response callback ─── */
 
-typedef struct { AppState *app; gchar *message; } SendCtx;
+/* Writes Riko's header line; the reply text is streamed in after it */
+static void
+stream_begin(AppState *app, gint request_id)
+{
+    time_t now = time(NULL);
+    gchar ts[16];
+    strftime(ts, sizeof(ts), "%H:%M", localtime(&now));
+    gchar *ts_str = g_strdup_printf("[%s] ", ts);
+
+    GtkTextIter end;
+    gtk_text_buffer_get_end_iter(app->chat_buffer, &end);
+    gtk_text_buffer_insert_with_tags_by_name(app->chat_buffer, &end, ts_str, -1, "timestamp", NULL);
+    gtk_text_buffer_get_end_iter(app->chat_buffer, &end);
+    gtk_text_buffer_insert_with_tags_by_name(app->chat_buffer, &end, "Riko: ", -1, "riko", NULL);
+    g_free(ts_str);
+    scroll_to_bottom(app);
+
+    if (!app->stream_reply) app->stream_reply = g_string_new(NULL);
+    g_string_truncate(app->stream_reply, 0);
+    app->stream_request_id = request_id;
+    app->stream_chat_id    = app->current_chat_id;
+    app->stream_live       = TRUE;
+}
+
+/* Appends a chunk to the open reply, unless the user switched chats meanwhile */
+static void
+stream_append(AppState *app, const gchar *text)
+{
+    if (!app->stream_live) return;
+    GtkTextIter end;
+    gtk_text_buffer_get_end_iter(app->chat_buffer, &end);
+    gtk_text_buffer_insert_with_tags_by_name(app->chat_buffer, &end, text, -1, "content", NULL);
+    scroll_to_bottom(app);
+}
+
+/* Closes the open reply; it is only saved to history if it finished cleanly */
+static void
+stream_finish(AppState *app, const gchar *error)
+{
+    app->is_thinking = FALSE;
+    gtk_label_set_text(GTK_LABEL(app->status_label), "● Ready");
+    gtk_widget_remove_css_class(app->status_label, "status-thinking");
+    gtk_widget_add_css_class(app->status_label, "status-ready");
+
+    if (error) {
+        gchar *msg = g_strdup_printf("❌ %s", error);
+        stream_append(app, msg);
+        g_free(msg);
+    }
+    stream_append(app, "\n\n");
+    app->stream_live = FALSE;
+    app->stream_request_id = 0;
+
+    if (!error && app->stream_reply && app->stream_reply->len > 0) {
+        add_history_message(app, app->stream_chat_id, "Riko", app->stream_reply->str);
+        update_chat_title(app);
+    }
+}
 
 static void
 on_riko_response(GObject *src, GAsyncResult *res, gpointer user_data)
@@ -615,38 +812,48 @@ on_riko_response(GObject *src, GAsyncResult *res, gpointer user_data)
     gchar *line = g_data_input_stream_read_line_finish_utf8(
         G_DATA_INPUT_STREAM(src), res, &len, &err);
 
-    app->is_thinking = FALSE;
-    gtk_label_set_text(GTK_LABEL(app->status_label), "● Ready");
-    gtk_widget_remove_css_class(app->status_label, "status-thinking");
-    gtk_widget_add_css_class(app->status_label, "status-ready");
-
     if (err || !line) {
-        chat_append(app, "Riko", "❌ Connection to bridge lost. Try reopening the app.", TRUE);
+        stream_finish(app, "Connection to bridge lost. Try reopening the app.");
         if (err) g_error_free(err);
         return;
     }
 
-    /* Parse JSON reply: {"reply":"..."} or {"error":"..."} */
+    /* Parse JSON frame: {"id","delta"} / {"id","done"} / {"reply"} / {"error"} */
+    gboolean more = FALSE;
     JsonParser *parser = json_parser_new();
     if (json_parser_load_from_data(parser, line, -1, NULL)) {
         JsonObject *obj = json_node_get_object(json_parser_get_root(parser));
-        if (json_object_has_member(obj, "reply")) {
+        if (json_object_has_member(obj, "id") &&
+            jint(obj, "id", 0) != app->stream_request_id) {
+            /* Stale frame from an earlier request — skip it */
+            more = TRUE;
+        } else if (json_object_has_member(obj, "delta")) {
+            const gchar *delta = jstr(obj, "delta", "");
+            g_string_append(app->stream_reply, delta);
+            stream_append(app, delta);
+            more = TRUE;
+        } else if (json_object_has_member(obj, "done")) {
+            stream_finish(app, NULL);
+        } else if (json_object_has_member(obj, "reply")) {
             const gchar *reply = jstr(obj, "reply", "...");
-            chat_append(app, "Riko", reply, FALSE);
-            update_chat_title(app);
+            g_string_assign(app->stream_reply, reply);
+            stream_append(app, reply);
+            stream_finish(app, NULL);
         } else {
-            const gchar *e = jstr(obj, "error", "Unknown error");
-            gchar *msg = g_strdup_printf("❌ %s", e);
-            chat_append(app, "Riko", msg, TRUE);
-            g_free(msg);
+            stream_finish(app, jstr(obj, "error", "Unknown error"));
         }
     } else {
         /* Plain text fallback */
-        chat_append(app, "Riko", line, FALSE);
-        update_chat_title(app);
+        g_string_assign(app->stream_reply, line);
+        stream_append(app, line);
+        stream_finish(app, NULL);
     }
     g_object_unref(parser);
     g_free(line);
+
+    if (more)
+        g_data_input_stream_read_line_async(
+            app->riko_out, G_PRIORITY_DEFAULT, NULL, on_riko_response, app);
 }
 
 static void
@@ -668,8 +875,12 @@ send_to_bridge(AppState *app, const gchar *message)
         }
     }
 
-    /* Build JSON payload */
+    /* Build JSON payload (streamed reply, tagged with a request id) */
+    gint request_id = ++app->next_request_id;
     JsonObject *payload = json_object_new();
+    json_object_set_int_member(payload, "id", request_id);
+    json_object_set_boolean_member(payload, "stream", TRUE);
+    json_object_set_int_member(payload, "chat_id", app->current_chat_id);
     json_object_set_string_member(payload, "message", message);
     json_object_set_string_member(payload, "lang_prefix",
                                   *lang_prefix ? g_strdup_printf("[Respond in %s] ", lang_prefix) : "");
@@ -694,11 +905,44 @@ send_to_bridge(AppState *app, const gchar *message)
     json_node_free(node);
     json_object_unref(payload);
 
-    /* Start async read for response */
+    /* Start async read for the reply frames */
+    stream_begin(app, request_id);
     g_data_input_stream_read_line_async(
         app->riko_out, G_PRIORITY_DEFAULT, NULL, on_riko_response, app);
 }
 
+/* Tells the bridge a chat was deleted, so Riko stops recalling it.
+ * Its answer carries its own id and is skipped like any stale frame. */
+static void
+bridge_forget_chat(AppState *app, int chat_id)
+{
+    if (!app->riko_in) return;
+
+    JsonObject *payload = json_object_new();
+    json_object_set_int_member(payload, "id", ++app->next_request_id);
+    json_object_set_string_member(payload, "op", "forget");
+    json_object_set_int_member(payload, "chat_id", chat_id);
+
+    JsonNode *node = json_node_new(JSON_NODE_OBJECT);
+    json_node_set_object(node, payload);
+
+    JsonGenerator *gen = json_generator_new();
+    json_generator_set_root(gen, node);
+    gchar *line = json_generator_to_data(gen, NULL);
+    gchar *with_newline = g_strdup_printf("%s\n", line);
+
+    GError *err = NULL;
+    g_output_stream_write_all(app->riko_in,
+                              with_newline, strlen(with_newline), NULL, NULL, &err);
+    if (err) { g_warning("Bridge write: %s", err->message); g_error_free(err); }
+
+    g_free(with_newline);
+    g_free(line);
+    g_object_unref(gen);
+    json_node_free(node);
+    json_object_unref(payload);
+}
+
 /* ═══════════════════════════════════════════════════════════════════════════ */
 /*  Chat list sidebar                                                           */
 /* ═══════════════════════════════════════════════════════════════════════════ */
@@ -719,6 +963,7 @@ on_load_chat_clicked(GtkButton *btn, gpointer user_data)
     if (!chat) return;
 
     app->current_chat_id = chat_id;
+    app->stream_live = FALSE;
     gtk_text_buffer_set_text(app->chat_buffer, "", -1);
 
     JsonArray *messages = jarr(chat, "messages");
@@ -799,6 +1044,13 @@ on_delete_chat_confirm(GObject *src, GAsyncResult *res, gpointer user_data)
     int chat_id = d->chat_id;
 
     delete_chat(app, chat_id);
+    bridge_forget_chat(app, chat_id);
+
+    /* Keep a streaming reply pointed at the right chat after renumbering */
+    if (app->stream_chat_id == chat_id)
+        app->stream_chat_id = -1;
+    else if (app->stream_chat_id > chat_id)
+        app->stream_chat_id--;
 
     if (chat_id == app->current_chat_id) {
         on_new_chat(NULL, app);
@@ -858,6 +1110,7 @@ on_new_chat(GtkButton *btn, gpointer user_data)
     AppState *app = (AppState *)user_data;
 
     app->current_chat_id = create_chat(app);
+    app->stream_live = FALSE;
     gtk_text_buffer_set_text(app->chat_buffer, "", -1);
 
     const gchar *greeting = jstr(app->config, "greeting_message", "Hey! I'm Riko. 😊");
@@ -1075,7 +1328,7 @@ on_reset_confirmed(GObject *src, GAsyncResult *res, gpointer user_data)
     if (err) { g_error_free(err); return; }
     if (btn != 1) return;
 
-    const gchar *files[] = { HISTORY_FILE, MEMORY_FILE, MEMORY_FILE2, NULL };
+    const gchar *files[] = { HISTORY_FILE, JOURNAL_FILE, CACHE_FILE, RECALL_FILE, MEMORY_FILE, MEMORY_FILE2, NULL };
     for (int i = 0; files[i]; i++) remove(files[i]);
 
     /* Re-create empty placeholders */
@@ -1694,6 +1947,7 @@ on_reset_confirmed(GObject *src, GAsyncResult *res, gpointer user_data)
         {
             AppState app = {};
             app.current_chat_id = -1;
+    app.stream_chat_id  = -1;
 
             GtkApplication *gapp = gtk_application_new(
                 "com.riko.ai", G_APPLICATION_DEFAULT_FLAGS);
@@ -1709,6 +1963,7 @@ on_reset_confirmed(GObject *src, GAsyncResult *res, gpointer user_data)
             if (app.riko_out)  g_object_unref(app.riko_out);
             if (app.config)    json_object_unref(app.config);
             if (app.chats)     json_array_unref(app.chats);
+    if (app.stream_reply) g_string_free(app.stream_reply, TRUE);
             g_free(app.project_dir);
             g_object_unref(gapp);
 
@@ -1,15 +1,943 @@
 # riko.py
-from groq import Groq
+import asyncio
+import atexit
 import json
+import math
 import os
+import queue
+import random
+import re
+import sys
+import threading
+import time
+from collections import OrderedDict, deque
 from datetime import datetime
+from response_cache import ResponseCache, SemanticCache, cache_key
+from recall import RecallIndex, forget_chat
+from facts import (FactStore, FactExtractor, DEFAULT_FACTS_BATCH, DEFAULT_FACTS_K,
+                   DEFAULT_FACTS_TOKENS, DEFAULT_MAX_FACTS)
+
+
+CONFIG_FILE = "config.json"
+
+# Prompt tokens sent per request when config.json["api"] has no "context_tokens"
+DEFAULT_CONTEXT_TOKENS = 3000
+
+# Evicted turns collected before they are folded into the running summary
+DEFAULT_SUMMARY_BATCH = 6
+
+SUMMARY_PROMPT = """You maintain a running summary of a conversation between a user and Riko, an AI assistant.
+You get the current summary and some older messages that no longer fit in Riko's context.
+Fold the messages into the summary. Keep names, facts about the user, preferences, decisions
+and open questions; drop small talk. Write at most 150 words in the third person.
+Reply with the updated summary only."""
+
+
+# ── Shared Groq clients ──────────────────────────────────────────────────────
+#
+# Each client owns an HTTP connection pool with keep-alive, so they are
+# created once per API key and shared by every Riko in the process: a new
+# Riko (e.g. after the settings are saved) reuses the open connections
+# instead of paying for a new TLS handshake. The SDK's own retries are off;
+# KeyPool fails over and RetryPolicy retries instead.
+#
+# The SDK (httpx, pydantic...) takes a good part of start-up to import, so it
+# is only imported with the first client; the GUIs warm it up in the
+# background once their window is on screen.
+
+_clients       = {}      # api key -> Groq
+_async_clients = {}      # (api key, event loop) -> AsyncGroq
+_clients_lock  = threading.Lock()
+
+_loop      = None        # shared event loop, see get_loop()
+_loop_lock = threading.Lock()
+
+
+def get_client(api_key=None):
+    """The shared Groq client for `api_key` (default: $GROQ_API_KEY)."""
+    api_key = api_key or os.getenv("GROQ_API_KEY")
+    with _clients_lock:
+        client = _clients.get(api_key)
+        if client is None:
+            from groq import Groq
+            client = _clients[api_key] = Groq(api_key=api_key, max_retries=0)
+        return client
+
+
+def get_async_client(api_key=None):
+    """The shared AsyncGroq client for `api_key` on the running event loop.
+
+    Async connections belong to the loop that opened them, so there is one
+    client per loop; in practice a process only runs one.
+    """
+    api_key = api_key or os.getenv("GROQ_API_KEY")
+    key = (api_key, asyncio.get_running_loop())
+    with _clients_lock:
+        client = _async_clients.get(key)
+        if client is None:
+            from groq import AsyncGroq
+            client = _async_clients[key] = AsyncGroq(api_key=api_key, max_retries=0)
+        return client
+
+
+def get_loop():
+    """The process-wide event loop, started on a daemon thread on first use.
+
+    For callers that have no loop of their own (the GUIs); schedule work
+    on it with run_async().
+    """
+    global _loop
+    with _loop_lock:
+        if _loop is None:
+            _loop = asyncio.new_event_loop()
+            threading.Thread(target=_loop.run_forever, daemon=True).start()
+        return _loop
+
+
+def run_async(coro):
+    """Run `coro` on the shared loop; returns a concurrent.futures.Future."""
+    return asyncio.run_coroutine_threadsafe(coro, get_loop())
+
+
+# ── Key pool ─────────────────────────────────────────────────────────────────
+
+# Seconds a key is skipped after a 429 / 5xx that didn't say how long to wait
+RATE_LIMIT_COOLDOWN   = 10.0
+SERVER_ERROR_COOLDOWN = 5.0
+
+DURATION_RE = re.compile(r"([\d.]+)(ms|h|m|s)")
+DURATION_UNITS = {"h": 3600.0, "m": 60.0, "s": 1.0, "ms": 0.001}
+
+
+def parse_duration(text):
+    """Seconds in a Groq reset header such as "2m59.56s" or "120ms" (None if unreadable)."""
+    if not text:
+        return None
+    try:
+        return float(text)           # retry-after is plain seconds
+    except ValueError:
+        pass
+    parts = DURATION_RE.findall(text)
+    if not parts:
+        return None
+    return sum(float(value) * DURATION_UNITS[unit] for value, unit in parts)
+
+
+def load_api_keys():
+    """Keys for the pool as (label, key) pairs, the active one ($GROQ_API_KEY) first.
+
+    The other keys saved in config.json["groq_api_keys"] follow unless
+    config.json["api"]["key_pool"] is false.
+    """
+    active = os.getenv("GROQ_API_KEY")
+    keys = [("Active", active)] if active else []
+    try:
+        with open(CONFIG_FILE, "r") as f:
+            config = json.load(f)
+        if (config.get("api") or {}).get("key_pool", True):
+            for n, entry in enumerate(config.get("groq_api_keys", [])):
+                key = entry.get("key", "").strip()
+                if key and key not in [k for _, k in keys]:
+                    keys.append((entry.get("label") or f"Key {n + 1}", key))
+    except:
+        pass
+    return keys or [("Default", None)]
+
+
+class KeyState:
+    """What the pool knows about one API key, mostly from its x-ratelimit-* headers."""
+
+    def __init__(self, label, key):
+        self.label              = label
+        self.key                = key
+        self.remaining_requests = None    # None until the first response
+        self.remaining_tokens   = None
+        self.blocked_until      = 0.0     # time.monotonic() before which the key is skipped
+        self.in_flight          = 0
+
+    def load(self):
+        """Sort key: fewest requests in flight, then the most requests/tokens left."""
+        unknown = float("inf")
+        return (
+            self.in_flight,
+            -(unknown if self.remaining_tokens is None else self.remaining_tokens),
+            -(unknown if self.remaining_requests is None else self.remaining_requests),
+        )
+
+    def update(self, headers):
+        """Read the rate-limit headers of a response."""
+        for attr, name in (("remaining_requests", "x-ratelimit-remaining-requests"),
+                           ("remaining_tokens",   "x-ratelimit-remaining-tokens")):
+            value = headers.get(name)
+            if value is not None:
+                try:
+                    setattr(self, attr, int(float(value)))
+                except ValueError:
+                    pass
+
+        # Out of requests or tokens: rest until the window resets
+        waits = [parse_duration(headers.get(f"x-ratelimit-reset-{kind}"))
+                 for kind, left in (("requests", self.remaining_requests), ("tokens", self.remaining_tokens))
+                 if left == 0]
+        waits = [w for w in waits if w]
+        if waits:
+            self.blocked_until = time.monotonic() + max(waits)
+
+    def fail(self, error):
+        """Bench the key after a 429 or 5xx."""
+        headers = error.response.headers
+        wait = parse_duration(headers.get("retry-after"))
+        if wait is None and error.status_code == 429:
+            wait = max(filter(None, [parse_duration(headers.get("x-ratelimit-reset-requests")),
+                                     parse_duration(headers.get("x-ratelimit-reset-tokens"))]),
+                       default=RATE_LIMIT_COOLDOWN)
+        if wait is None:
+            wait = SERVER_ERROR_COOLDOWN
+        self.blocked_until = time.monotonic() + wait
+
+
+class KeyPool:
+    """Spreads chat completions over every configured API key.
+
+    Each request goes to the healthy key with the least load (fewest
+    requests in flight, then the most headroom left in its rate limits).
+    A key that answers 429 or 5xx is benched until its limits reset and
+    the request fails over to the next key; the error only surfaces once
+    every key has been tried.
+    """
+
+    def __init__(self, keys):
+        self.states = []
+        self._lock  = threading.Lock()
+        self.refresh(keys)
+
+    def refresh(self, keys):
+        """Switch to a new key list, keeping what is known about keys already in use."""
+        with self._lock:
+            known = {state.key: state for state in self.states}
+            self.states = [known.get(key) or KeyState(label, key) for label, key in keys]
+
+    def _pick(self, tried):
+        now = time.monotonic()
+        with self._lock:
+            healthy = [s for s in self.states if s not in tried and s.blocked_until <= now]
+            if not healthy:
+                if tried:
+                    return None
+                # Everything is benched: try the key that recovers first
+                healthy = [min(self.states, key=lambda s: s.blocked_until)]
+            state = min(healthy, key=KeyState.load)
+            state.in_flight += 1
+            if state.remaining_requests:
+                state.remaining_requests -= 1
+            return state
+
+    def _release(self, state, headers=None, error=None):
+        with self._lock:
+            state.in_flight -= 1
+            if headers is not None:
+                state.update(headers)
+            if error is not None:
+                state.fail(error)
+
+    def _fails_over(self, error):
+        return len(self.states) > 1 and (error.status_code == 429 or error.status_code >= 500)
+
+    def create(self, trace=None, **kwargs):
+        """chat.completions.create() on the least-loaded key, failing over on 429/5xx.
+
+        The label of the key that answered goes in `trace["key"]`, if given.
+        """
+        tried, error = [], None
+        while True:
+            state = self._pick(tried)
+            if state is None:
+                raise error
+            tried.append(state)
+
+            client = get_client(state.key)
+            from groq import APIStatusError
+            # Released on every exit, a hedge's cancellation (a BaseException) included
+            headers = failure = None
+            try:
+                raw = client.chat.completions.with_raw_response.create(**kwargs)
+                headers = raw.headers
+            except APIStatusError as e:
+                failure = e
+                if not self._fails_over(e):
+                    raise
+                error = e
+                continue
+            finally:
+                self._release(state, headers=headers, error=failure)
+
+            if trace is not None:
+                trace["key"] = state.label
+            return raw.parse()
+
+    async def acreate(self, trace=None, **kwargs):
+        """Async version of create(), on the running event loop."""
+        tried, error = [], None
+        while True:
+            state = self._pick(tried)
+            if state is None:
+                raise error
+            tried.append(state)
+
+            client = get_async_client(state.key)
+            from groq import APIStatusError
+            # Released on every exit, a hedge's cancellation (a BaseException) included
+            headers = failure = None
+            try:
+                raw = await client.chat.completions.with_raw_response.create(**kwargs)
+                headers = raw.headers
+            except APIStatusError as e:
+                failure = e
+                if not self._fails_over(e):
+                    raise
+                error = e
+                continue
+            finally:
+                self._release(state, headers=headers, error=failure)
+
+            if trace is not None:
+                trace["key"] = state.label
+            return await raw.parse()
+
+
+_key_pool = None
+
+
+def get_key_pool():
+    """The process-wide KeyPool, refreshed from config.json and $GROQ_API_KEY."""
+    global _key_pool
+    with _clients_lock:
+        if _key_pool is None:
+            _key_pool = KeyPool(load_api_keys())
+        else:
+            _key_pool.refresh(load_api_keys())
+        return _key_pool
+
+
+# ── Retries ──────────────────────────────────────────────────────────────────
+
+# Defaults for the RetryPolicy settings in config.json["api"]
+DEFAULT_RETRIES     = 2        # attempts after the first
+DEFAULT_TIMEOUT     = 30.0     # seconds per attempt
+DEFAULT_BACKOFF     = 0.5      # first backoff cap, doubled on every retry
+DEFAULT_MAX_BACKOFF = 8.0
+MAX_RETRY_AFTER     = 60.0     # a longer retry-after fails the request instead
+
+# Latencies kept for the hedging percentile, and how many are needed first
+LATENCY_SAMPLES     = 200
+HEDGE_MIN_SAMPLES   = 20
+
+
+class RetryPolicy:
+    """Timeouts, retries and hedging around KeyPool requests.
+
+    Each attempt gets its own timeout. Timeouts, connection errors, 408,
+    409, 429 and 5xx are retried with exponential backoff and full jitter,
+    or after the server's retry-after when it sends one. Only creating the
+    request is retried; a stream that breaks half way is not replayed.
+
+    With hedge_percentile set (e.g. 0.95), an async request that is still
+    waiting after that percentile of recent latencies gets a duplicate on
+    another key, and whichever answers first wins.
+
+    Settings come from config.json["api"]: "retries", "timeout", "backoff",
+    "max_backoff" and "hedge_percentile".
+    """
+
+    def __init__(self, retries=DEFAULT_RETRIES, timeout=DEFAULT_TIMEOUT, backoff=DEFAULT_BACKOFF,
+                 max_backoff=DEFAULT_MAX_BACKOFF, hedge_percentile=None):
+        self.retries          = retries
+        self.timeout          = timeout
+        self.backoff          = backoff
+        self.max_backoff      = max_backoff
+        self.hedge_percentile = hedge_percentile
+        # Streams are timed to their first byte, so they are kept apart
+        self.latencies        = {False: deque(maxlen=LATENCY_SAMPLES), True: deque(maxlen=LATENCY_SAMPLES)}
+
+    @classmethod
+    def from_config(cls, api_config):
+        return cls(
+            retries=api_config.get("retries", DEFAULT_RETRIES),
+            timeout=api_config.get("timeout", DEFAULT_TIMEOUT),
+            backoff=api_config.get("backoff", DEFAULT_BACKOFF),
+            max_backoff=api_config.get("max_backoff", DEFAULT_MAX_BACKOFF),
+            hedge_percentile=api_config.get("hedge_percentile"),
+        )
+
+    def retry_delay(self, attempt, error):
+        """Seconds to wait before retrying after `error`, or None to give up."""
+        from groq import APIConnectionError, APIStatusError
+        if attempt >= self.retries:
+            return None
+        if isinstance(error, APIStatusError):
+            if error.status_code not in (408, 409, 429) and error.status_code < 500:
+                return None
+            retry_after = parse_duration(error.response.headers.get("retry-after"))
+            if retry_after is not None:
+                return retry_after if retry_after <= MAX_RETRY_AFTER else None
+        elif not isinstance(error, APIConnectionError):
+            return None
+        return random.uniform(0, min(self.max_backoff, self.backoff * 2 ** attempt))
+
+    def hedge_after(self, stream):
+        """Seconds after which to send a hedge request, or None if hedging is off."""
+        samples = self.latencies[stream]
+        if not self.hedge_percentile or len(samples) < HEDGE_MIN_SAMPLES:
+            return None
+        ordered = sorted(samples)
+        return ordered[int(self.hedge_percentile * (len(ordered) - 1))]
+
+    def call(self, create, **kwargs):
+        """Run `create(**kwargs)` (e.g. KeyPool.create) with timeouts and retries.
+
+        A `trace` dict from RequestMetrics.begin() among the kwargs gets the
+        times the request first and last went out and the number of retries.
+        """
+        stream = bool(kwargs.get("stream"))
+        trace = kwargs.get("trace")
+        attempt = 0
+        while True:
+            start = time.monotonic()
+            if trace is not None:
+                trace["attempt"] = time.perf_counter()
+                trace["sent"] = trace["sent"] or trace["attempt"]
+            try:
+                result = create(timeout=self.timeout, **kwargs)
+            except Exception as e:
+                delay = self.retry_delay(attempt, e)
+                if delay is None:
+                    raise
+                attempt += 1
+                if trace is not None:
+                    trace["retries"] = attempt
+                time.sleep(delay)
+                continue
+            self.latencies[stream].append(time.monotonic() - start)
+            return result
+
+    async def acall(self, create, **kwargs):
+        """Async version of call(); also hedges slow requests."""
+        stream = bool(kwargs.get("stream"))
+        trace = kwargs.get("trace")
+        attempt = 0
+        while True:
+            start = time.monotonic()
+            if trace is not None:
+                trace["attempt"] = time.perf_counter()
+                trace["sent"] = trace["sent"] or trace["attempt"]
+            try:
+                result = await self._hedged(create, kwargs, self.hedge_after(stream))
+            except Exception as e:
+                delay = self.retry_delay(attempt, e)
+                if delay is None:
+                    raise
+                attempt += 1
+                if trace is not None:
+                    trace["retries"] = attempt
+                await asyncio.sleep(delay)
+                continue
+            self.latencies[stream].append(time.monotonic() - start)
+            return result
+
+    async def _hedged(self, create, kwargs, hedge_after):
+        first = asyncio.ensure_future(create(timeout=self.timeout, **kwargs))
+        if hedge_after is None:
+            return await first
+        done, _ = await asyncio.wait([first], timeout=hedge_after)
+        if done:
+            return first.result()
+
+        if kwargs.get("trace") is not None:
+            kwargs["trace"]["hedged"] = True
+
+        pending = {first, asyncio.ensure_future(create(timeout=self.timeout, **kwargs))}
+        error = None
+        while pending:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            winners = [task for task in done if task.exception() is None]
+            if winners:
+                for task in pending:
+                    task.cancel()
+                # Both may have landed together: close the spare stream
+                for task in winners[1:]:
+                    close = getattr(task.result(), "close", None)
+                    if close:
+                        asyncio.ensure_future(close())
+                return winners[0].result()
+            error = next(iter(done)).exception()
+        raise error
+
+
+def load_api_config():
+    """Read the "api" block of config.json, or {} if it can't be read."""
+    try:
+        with open(CONFIG_FILE, "r") as f:
+            return json.load(f).get("api", {}) or {}
+    except:
+        return {}
+
+
+# ── Metrics ──────────────────────────────────────────────────────────────────
+
+# Replies kept for the rolling percentiles of Riko.metrics()
+DEFAULT_METRICS_SAMPLES = 500
+
+METRIC_FIELDS = ("queue_ms", "ttft_ms", "total_ms", "tokens_per_sec", "prompt_tokens", "completion_tokens")
+
+
+def usage_of(response):
+    """(prompt_tokens, completion_tokens) of a completion or stream chunk, or None.
+
+    Groq sends a stream's usage with its last chunk, under x_groq.
+    """
+    usage = getattr(response, "usage", None) or getattr(getattr(response, "x_groq", None), "usage", None)
+    if usage is None:
+        return None
+    return usage.prompt_tokens, usage.completion_tokens
+
+
+def percentiles(values):
+    """p50/p95/p99 of a list of numbers (nearest rank), or None if it is empty."""
+    if not values:
+        return None
+    ordered = sorted(values)
+    return {f"p{p}": ordered[max(0, math.ceil(p / 100 * len(ordered)) - 1)] for p in (50, 95, 99)}
+
+
+class RequestMetrics:
+    """Timings of the last few hundred replies, for rolling percentiles.
+
+    begin() starts a trace for one reply; RetryPolicy and KeyPool fill in
+    when the request went out, its retries, whether it was hedged and which
+    key answered, and the reply methods when the first text arrived.
+    finish() turns it into a record:
+
+      queue_ms     until the request went out (prompt building, cache lookups)
+      ttft_ms      until the first text arrived; the whole reply unless streamed
+      total_ms     until the reply was complete
+      prompt_tokens, completion_tokens, tokens_per_sec    None when unknown
+      model, key, retries, hedged, stream, cached, error, time
+    """
+
+    def __init__(self, samples=DEFAULT_METRICS_SAMPLES):
+        self.records = deque(maxlen=samples)
+        self._lock   = threading.Lock()
+
+    @staticmethod
+    def begin():
+        return {"start": time.perf_counter(), "sent": None, "attempt": None, "first": None,
+                "retries": 0, "hedged": False, "key": None}
+
+    def finish(self, trace, model, stream, usage=None, cached=False, error=None):
+        """Record a finished reply; a trace is only recorded once."""
+        if trace.get("recorded"):
+            return None
+        trace["recorded"] = True
+        end   = time.perf_counter()
+        start = trace["start"]
+        sent  = trace["sent"] or end
+        first = trace["first"] or end
+        prompt_tokens, completion_tokens = usage or (None, None)
+        # A stream's speed is measured from its first token, a plain reply's from the attempt that answered
+        generating = end - (first if stream else trace["attempt"] or sent)
+        record = {
+            "time":              time.time(),
+            "queue_ms":          (sent - start) * 1000,
+            "ttft_ms":           (first - start) * 1000,
+            "total_ms":          (end - start) * 1000,
+            "prompt_tokens":     prompt_tokens,
+            "completion_tokens": completion_tokens,
+            "tokens_per_sec":    completion_tokens / generating if completion_tokens and generating > 0 else None,
+            "model":             model,
+            "key":               trace["key"],
+            "retries":           trace["retries"],
+            "hedged":            trace["hedged"],
+            "stream":            stream,
+            "cached":            cached,
+            "error":             str(error) if error is not None else None,
+        }
+        with self._lock:
+            self.records.append(record)
+        return record
+
+    def summary(self):
+        """Percentiles over the kept replies, with counts per model and key and the newest record.
+
+        Cached and failed replies are counted but left out of the percentiles,
+        which would otherwise mostly measure the cache or the error path.
+        """
+        with self._lock:
+            records = list(self.records)
+        timed = [r for r in records if not r["cached"] and not r["error"]]
+        summary = {
+            "replies": len(records),
+            "cached":  sum(r["cached"] for r in records),
+            "errors":  sum(r["error"] is not None for r in records),
+            "retries": sum(r["retries"] for r in records),
+            "hedged":  sum(r["hedged"] for r in records),
+            "models":  {},
+            "keys":    {},
+            "last":    records[-1] if records else None,
+        }
+        for r in timed:
+            summary["models"][r["model"]] = summary["models"].get(r["model"], 0) + 1
+            summary["keys"][r["key"]] = summary["keys"].get(r["key"], 0) + 1
+        for field in METRIC_FIELDS:
+            summary[field] = percentiles([r[field] for r in timed if r[field] is not None])
+        return summary
+
+    def clear(self):
+        with self._lock:
+            self.records.clear()
+
+
+def format_seconds(ms):
+    return f"{ms:.0f} ms" if ms < 1000 else f"{ms / 1000:.1f} s"
+
+
+def format_record(record):
+    """One line about one reply, e.g. "first text 240 ms · 1.1 s · 85 tok/s · llama-3.1-8b-instant · Active"."""
+    if record["cached"]:
+        return f"cached · {format_seconds(record['total_ms'])}"
+    if record["error"]:
+        parts = [f"failed after {format_seconds(record['total_ms'])}"]
+    else:
+        parts = [f"first text {format_seconds(record['ttft_ms'])}", format_seconds(record["total_ms"])]
+    if record["tokens_per_sec"]:
+        parts.append(f"{record['tokens_per_sec']:.0f} tok/s")
+    parts.append(record["model"] or "?")
+    if record["key"]:
+        parts.append(record["key"])
+    if record["retries"]:
+        parts.append(f"{record['retries']} retr{'y' if record['retries'] == 1 else 'ies'}")
+    return " · ".join(parts)
+
+
+def format_summary(summary):
+    """Compact readout of Riko.metrics(), e.g. "p50 1.2 s · p95 2.8 s · 85 tok/s" ("" before any reply)."""
+    total = summary["total_ms"]
+    if total is None:
+        return ""
+    parts = [f"p50 {format_seconds(total['p50'])}", f"p95 {format_seconds(total['p95'])}"]
+    if summary["tokens_per_sec"]:
+        parts.append(f"{summary['tokens_per_sec']['p50']:.0f} tok/s")
+    return " · ".join(parts)
+
+
+# ── Model routing ────────────────────────────────────────────────────────────
+
+# Used when config.json["api"] leaves them out
+DEFAULT_MODEL       = "llama-3.3-70b-versatile"
+DEFAULT_FAST_MODEL  = "llama-3.1-8b-instant"
+DEFAULT_TEMPERATURE = 0.8      # Slightly less random for more consistency
+DEFAULT_MAX_TOKENS  = 800
+
+# A turn is "simple" if it is this short and looks like small talk
+SIMPLE_MAX_WORDS = 12
+HARD_WORDS = {
+    "explain", "why", "code", "write", "debug", "error", "analyze", "analyse",
+    "compare", "calculate", "solve", "prove", "translate", "summarize", "summarise",
+    "plan", "design", "difference", "step", "steps", "list", "essay", "story",
+}
+LANG_PREFIX_RE = re.compile(r"^\[[^\]]*\]\s*")         # "[Respond in French] "
+CODE_OR_MATH_RE = re.compile(r"[`{}<>=]|\d\s*[-+*/^%]\s*\d")
+ROUTING_WORD_RE = re.compile(r"\w+")
+
+
+class ModelRouter:
+    """Chooses the model and sampling settings for each request.
+
+    Reads "model", "temperature" and "max_tokens" from config.json["api"].
+    With "routing" on (the default), short small-talk turns, chat titles and
+    summaries go to "fast_model" instead, which answers much sooner; anything
+    longer, or that asks for code, maths, explanations or writing, keeps the
+    main model.
+    """
+
+    def __init__(self, api_config):
+        self.model       = api_config.get("model", DEFAULT_MODEL)
+        self.fast_model  = api_config.get("fast_model", DEFAULT_FAST_MODEL)
+        self.temperature = api_config.get("temperature", DEFAULT_TEMPERATURE)
+        self.max_tokens  = api_config.get("max_tokens", DEFAULT_MAX_TOKENS)
+        self.routing     = api_config.get("routing", True)
+
+    def is_simple(self, text):
+        """Cheap guess at whether the small model can handle this turn."""
+        text = LANG_PREFIX_RE.sub("", text)
+        words = ROUTING_WORD_RE.findall(text.lower())
+        if len(words) > SIMPLE_MAX_WORDS or CODE_OR_MATH_RE.search(text):
+            return False
+        return not HARD_WORDS.intersection(words)
+
+    def for_turn(self, user_input):
+        """The model to answer `user_input` with."""
+        if self.routing and self.is_simple(user_input):
+            return self.fast_model
+        return self.model
+
+    def for_background(self):
+        """The model for titles, summaries and other housekeeping calls."""
+        return self.fast_model if self.routing else self.model
+
+
+# ── Memory file ──────────────────────────────────────────────────────────────
+
+MEMORY_FILE = "riko_memory.json"
+
+# Seconds a change to riko_memory.json may wait so later changes share its write
+DEFAULT_SAVE_INTERVAL = 2.0
+
+# Messages of the current session kept in memory["last_conversation"]
+LAST_CONVERSATION_KEEP = 50
+
+
+class MemoryWriter:
+    """Writes riko_memory.json from a background thread.
+
+    save() only marks the memory as changed; the thread writes at most once
+    per interval, so the several saves of one turn cost a single write. Each
+    write goes to a temp file that is fsynced and renamed over the old one,
+    so a crash leaves the old file or the new one, never half of one.
+    Pending changes are flushed at exit.
+    """
+
+    def __init__(self, path, snapshot, interval=DEFAULT_SAVE_INTERVAL):
+        self.path     = path
+        self.snapshot = snapshot       # returns the dict to write
+        self.interval = interval
+        self._dirty   = False
+        self._stopped = False
+        self._wake    = threading.Event()
+        self._lock    = threading.Lock()
+        threading.Thread(target=self._run, daemon=True).start()
+        atexit.register(self.flush)
+
+    def save(self):
+        self._dirty = True
+        self._wake.set()
+
+    def _run(self):
+        while not self._stopped:
+            self._wake.wait()
+            if self._stopped:
+                break
+            time.sleep(self.interval)     # let more changes pile up
+            self._wake.clear()
+            self.flush()
+
+    def flush(self):
+        """Write pending changes now."""
+        with self._lock:
+            if not self._dirty or self._stopped:
+                return
+            self._dirty = False
+            try:
+                data = json.dumps(self.snapshot())
+            except RuntimeError:
+                # Memory changed while it was being dumped; try again next round
+                self.save()
+                return
+
+            try:
+                tmp_file = self.path + ".tmp"
+                with open(tmp_file, "w") as f:
+                    f.write(data)
+                    f.flush()
+                    os.fsync(f.fileno())
+                os.replace(tmp_file, self.path)
+            except Exception as e:
+                print(f"Memory save error: {e}", file=sys.stderr)
+
+    def stop(self, flush=True):
+        """Stop writing; pending changes are written first unless `flush` is False."""
+        if flush:
+            self.flush()
+        self._stopped = True
+        self._wake.set()
+        atexit.unregister(self.flush)     # which would keep the memory alive until exit
+
+
+class ContextWindow:
+    """Packs the newest turns of a conversation into a prompt-token budget.
+
+    Token counts are estimated (~4 characters per token, plus a few tokens of
+    per-message overhead) and cached per message, so each message is only
+    counted once however many turns it stays in the window. The cache keeps
+    the most recently counted messages only: pinned facts and recalled
+    snippets change every turn and would otherwise pile up in it.
+    """
+
+    CHARS_PER_TOKEN  = 4
+    MESSAGE_OVERHEAD = 4
+    CACHE_ENTRIES    = 512
+
+    def __init__(self, max_tokens=DEFAULT_CONTEXT_TOKENS):
+        self.max_tokens    = max_tokens
+        self.evicted_count = 0       # turns left out by the last build()
+        self._token_cache  = OrderedDict()
+
+    def count(self, message):
+        """Return the (cached) token estimate for one message."""
+        key = (message["role"], message["content"])
+        tokens = self._token_cache.get(key)
+        if tokens is None:
+            tokens = len(message["content"]) // self.CHARS_PER_TOKEN + self.MESSAGE_OVERHEAD
+            self._token_cache[key] = tokens
+            if len(self._token_cache) > self.CACHE_ENTRIES:
+                self._token_cache.popitem(last=False)
+        else:
+            self._token_cache.move_to_end(key)
+        return tokens
+
+    def build(self, history, pinned=()):
+        """Return the messages to send: the system prompt plus the newest turns that fit.
+
+        `pinned` messages (e.g. the running summary) are always sent right
+        after the system prompt and count against the budget.
+        """
+        system, turns = history[:1] + list(pinned), history[1:]
+        budget = self.max_tokens - sum(self.count(m) for m in system)
+
+        kept = 0
+        for message in reversed(turns):
+            cost = self.count(message)
+            # The newest message is always sent, even if it alone is over budget
+            if kept and cost > budget:
+                break
+            budget -= cost
+            kept += 1
+
+        window = turns[len(turns) - kept:]
+        # Don't open the window on a reply whose question was cut off
+        while len(window) > 1 and window[0]["role"] == "assistant":
+            window = window[1:]
+
+        self.evicted_count = len(turns) - len(window)
+        return system + window
+
+    def clear(self):
+        self.evicted_count = 0
+        self._token_cache.clear()
+
+
+class RollingSummarizer:
+    """Folds turns that fell out of the context window into memory["summary"].
+
+    Evicted turns are handed over in batches and summarised on a worker
+    thread, so the extra Groq call never delays a reply.
+    """
+
+    def __init__(self, riko, batch_size=DEFAULT_SUMMARY_BATCH):
+        self.riko       = riko
+        self.batch_size = batch_size
+        self.folded     = 0          # leading turns of riko.history already summarised
+        self.generation = 0          # bumped by reset() so stale results are dropped
+        self._queue     = queue.Queue()
+        self._thread    = None
+
+    def update(self, history, evicted_count):
+        """Queue the newly evicted turns once there are enough for one batch."""
+        if evicted_count - self.folded < self.batch_size:
+            return
+        turns = history[1 + self.folded:1 + evicted_count]
+        self.folded = evicted_count
+        self._queue.put((self.generation, turns))
+
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, daemon=True)
+            self._thread.start()
+
+    def reset(self):
+        self.folded = 0
+        self.generation += 1
+
+    def stop(self, wait=True):
+        """End the worker thread, after the queued batches unless `wait` is False, which drops them."""
+        if not wait:
+            self.generation += 1
+        if self._thread is not None:
+            self._queue.put(None)
+            if wait:
+                self._thread.join()
+            self._thread = None
+
+    def pinned(self):
+        """The summary as a system message to send after the system prompt."""
+        summary = self.riko.memory.get("summary")
+        if not summary:
+            return []
+        return [{"role": "system", "content": f"Summary of the earlier conversation:\n{summary}"}]
+
+    def _run(self):
+        stopping = False
+        while not stopping:
+            batch = self._queue.get()
+            if batch is None:
+                return
+            generation, turns = batch
+            # Fold everything that piled up meanwhile into a single call
+            while not self._queue.empty():
+                batch = self._queue.get()
+                if batch is None:
+                    stopping = True       # once this batch is done
+                    break
+                next_generation, more = batch
+                if next_generation != generation:
+                    generation, turns = next_generation, []
+                turns = turns + more
+
+            if generation != self.generation:
+                continue
+            try:
+                summary = self._summarize(self.riko.memory.get("summary") or "", turns)
+            except Exception as e:
+                print(f"Summary error: {e}", file=sys.stderr)
+                continue
+
+            if generation == self.generation and summary:
+                self.riko.memory["summary"] = summary
+                self.riko.save_memory()
+
+    def _summarize(self, summary, turns):
+        transcript = "\n".join(
+            f"{'User' if m['role'] == 'user' else 'Riko'}: {m['content']}" for m in turns
+        )
+        return self.riko.complete([
+            {"role": "system", "content": SUMMARY_PROMPT},
+            {"role": "user", "content": f"Current summary:\n{summary or '(none)'}\n\nMessages:\n{transcript}"}
+        ], max_completion_tokens=300, background=True).strip()
 
 
 class Riko:
-    def __init__(self, system_prompt=None):
-        self.client = Groq()
-        self.memory_file = "riko_memory.json"
+    def __init__(self, system_prompt=None, memory_file=MEMORY_FILE, api_config=None):
+        """Memory lives in `memory_file`; `api_config` stands in for config.json["api"].
+
+        Both let one process hold several Rikos, e.g. one per server session.
+        """
+        self.keys = get_key_pool()
+        self.memory_file = memory_file
         self.memory = self.load_memory()
+        self.memory_writer = MemoryWriter(self.memory_file, lambda: self.memory)
+
+        # Only the newest turns that fit this budget are sent with each request
+        self.api_config = load_api_config() if api_config is None else api_config
+        self.context = ContextWindow(self.api_config.get("context_tokens", DEFAULT_CONTEXT_TOKENS))
+        self.summarizer = RollingSummarizer(self, self.api_config.get("summary_batch", DEFAULT_SUMMARY_BATCH))
+        self.facts = FactStore(self.memory.setdefault("facts", []),
+                               self.api_config.get("max_facts", DEFAULT_MAX_FACTS))
+        self.extractor = FactExtractor(self, self.facts, self.api_config.get("facts_batch", DEFAULT_FACTS_BATCH))
+        self.recall = RecallIndex.from_config(self.api_config)        # None without NumPy
+        self.router = ModelRouter(self.api_config)
+        self.retry = RetryPolicy.from_config(self.api_config)
+        self.cache = ResponseCache.from_config(self.api_config)      # None unless enabled
+        self.semantic = SemanticCache.from_config(self.api_config)   # None unless enabled
+        self.turn_metrics = RequestMetrics(self.api_config.get("metrics_samples", DEFAULT_METRICS_SAMPLES))
+        self.chat_id = None
 
         # Use custom system prompt if provided, otherwise fall back to default
         prompt = system_prompt.strip() if system_prompt and system_prompt.strip() else self.get_personality_prompt()
@@ -25,6 +953,7 @@ class Riko:
         # Load previous conversation if exists
         if self.memory.get("last_conversation"):
             self.history.extend(self.memory["last_conversation"][-6:])  # Last 6 messages
+        self.extractor.reset(len(self.history))   # facts in those were extracted last time
 
     def get_personality_prompt(self):
         """Define Riko's personality."""
@@ -63,7 +992,13 @@ IMPORTANT:
             try:
                 with open(self.memory_file, "r") as f:
                     return json.load(f)
-            except:
+            except Exception as e:
+                # Keep the unreadable file for inspection instead of silently losing it
+                print(f"Memory load error: {e}; moved to {self.memory_file}.bad", file=sys.stderr)
+                try:
+                    os.replace(self.memory_file, self.memory_file + ".bad")
+                except OSError:
+                    pass
                 return self.default_memory()
         return self.default_memory()
 
@@ -72,6 +1007,7 @@ IMPORTANT:
         return {
             "user_name": None,
             "facts": [],
+            "summary": "",
             "last_conversation": [],
             "stats": {
                 "total_messages": 0,
@@ -80,69 +1016,364 @@ IMPORTANT:
         }
 
     def save_memory(self):
-        """Save memory to file."""
-        try:
-            with open(self.memory_file, "w") as f:
-                json.dump(self.memory, f, indent=2)
-        except Exception as e:
-            print(f"Memory save error: {e}")
-
-    def remember_name(self, user_input):
-        """Try to extract and remember user's name."""
-        lower_input = user_input.lower()
-
-        # Check for name patterns
-        if "my name is" in lower_input or "i'm" in lower_input or "i am" in lower_input:
-            # Simple name extraction
-            if "my name is" in lower_input:
-                name = user_input.split("my name is", 1)[1].strip().split()[0]
-                self.memory["user_name"] = name.capitalize()
-                self.save_memory()
-            elif "i'm" in lower_input:
-                parts = user_input.split("i'm", 1)[1].strip().split()
-                if parts and len(parts[0]) > 1:
-                    name = parts[0].strip(',.!?')
-                    if name[0].isupper():  # Likely a name
-                        self.memory["user_name"] = name
-                        self.save_memory()
-
-    def reply(self, user_input):
-        """Get Riko's response."""
-        # Try to remember user's name
-        self.remember_name(user_input)
+        """Mark memory as changed; it is written to file in the background."""
+        self.memory_writer.save()
+
+    def flush_memory(self):
+        """Write any pending memory changes to file now."""
+        self.memory_writer.flush()
+
+    def close(self, save=True):
+        """Stop the background work and writing memory and recalled chats to file.
 
+        With `save`, queued summaries and fact extraction finish and pending
+        memory is written first; without it they are dropped.
+        """
+        self.summarizer.stop(wait=save)
+        self.extractor.stop(wait=save)
+        self.memory_writer.stop(flush=save)
+        if self.recall is not None:
+            self.recall.close()
+
+    def _begin_turn(self, user_input):
+        """Record the user's message before asking Groq for a reply; returns it for _drop_turn()."""
         # Add user message to history
-        self.history.append({
+        turn = {
             "role": "user",
             "content": user_input
+        }
+        self.history.append(turn)
+        return turn
+
+    def _drop_turn(self, turn):
+        """Take back a user message that will get no reply, so history keeps alternating."""
+        if self.history and self.history[-1] is turn:
+            self.history.pop()
+
+    def build_messages(self):
+        """Messages for the next request: system prompt, summary, facts, recalled snippets and the newest turns."""
+        pinned = self.summarizer.pinned() + self.pinned_facts()
+        if self.recall is None:
+            return self.context.build(self.history, pinned)
+        # Snippets of what is still in the window would only repeat it
+        window = self.context.build(self.history, pinned)
+        return self.context.build(self.history, pinned + self.pinned_recall([m["content"] for m in window]))
+
+    def pinned_facts(self):
+        """The remembered facts that matter for the newest message, as a system message."""
+        facts = self.facts.relevant(
+            self.history[-1]["content"],
+            self.api_config.get("facts_k", DEFAULT_FACTS_K),
+            self.api_config.get("facts_tokens", DEFAULT_FACTS_TOKENS),
+        )
+        if not facts:
+            return []
+        return [{"role": "system", "content": "What you remember about the user:\n" +
+                 "\n".join(f"- {fact}" for fact in facts)}]
+
+    def pinned_recall(self, skip=()):
+        """Exchanges from past chats that resemble the newest message, as a system message."""
+        found = self.recall.search(self.history[-1]["content"], skip)
+        if not found:
+            return []
+        return [{"role": "system", "content": "Possibly relevant parts of earlier chats:\n" +
+                 "\n".join(f"- User: {user}\n  Riko: {reply}" for user, reply, _ in found)}]
+
+    def _commit_turn(self, reply):
+        """Record Riko's finished reply in history and memory."""
+        # Add assistant response to history
+        self.history.append({
+            "role": "assistant",
+            "content": reply
         })
 
+        # Update memory
+        self.memory["stats"]["total_messages"] += 1
+        self.memory["last_conversation"] = self.history[1:][-LAST_CONVERSATION_KEEP:]  # Exclude system message
+        self.save_memory()
+
+        # Turns that no longer fit are summarised in the background
+        self.summarizer.update(self.history, self.context.evicted_count)
+        # ...and facts about the user are picked out of finished turns
+        self.extractor.update(self.history)
+        if self.recall is not None:
+            self.recall.add(self.chat_id, self.history[-2]["content"], reply)
+
+    def _chat_args(self, stream=False):
+        """Request arguments for the next chat turn."""
+        return dict(
+            model=self.router.for_turn(self.history[-1]["content"]),
+            messages=self.build_messages(),
+            temperature=self.router.temperature,
+            max_completion_tokens=self.router.max_tokens,
+            stream=stream
+        )
+
+    def _error_text(self, error):
+        return f"❌ Error: {str(error)}\n\nMake sure you have GROQ_API_KEY set in your environment!"
+
+    def set_chat(self, chat_id):
+        """Tell Riko which chat the next turns belong to (for per-chat settings)."""
+        self.chat_id = chat_id
+
+    def forget_chat(self, chat_id, renumber=False):
+        """Stop recalling a deleted chat.
+
+        `renumber` is for chat ids that are list positions (the JSON chat
+        store): the later chats, and the current one, move down one id.
+        """
+        if self.recall is not None:
+            self.recall.forget(chat_id, renumber)
+        else:
+            forget_chat(chat_id, renumber)
+        if self.chat_id == chat_id:
+            self.chat_id = None
+        elif renumber and self.chat_id is not None and self.chat_id > chat_id:
+            self.chat_id -= 1
+
+    def _semantic_scope(self):
+        """Near-duplicates only match with the same model, system prompt and preceding reply."""
+        previous = self.history[-2]["content"] if len(self.history) > 2 else ""
+        return hash((self.router.model, self.history[0]["content"], previous))
+
+    def _cached(self, request, user_input=None):
+        """A cached reply for `request` (or a near-duplicate of `user_input`), or None."""
+        reply = None
+        if self.cache is not None:
+            reply = self.cache.get(cache_key(request))
+        if reply is None and self.semantic is not None and user_input is not None:
+            reply = self.semantic.lookup(self._semantic_scope(), user_input, self.chat_id)
+        return reply
+
+    def _cache_reply(self, request, reply, user_input=None):
+        if not reply:
+            return
+        if self.cache is not None:
+            self.cache.put(cache_key(request), reply)
+        if self.semantic is not None and user_input is not None:
+            self.semantic.add(self._semantic_scope(), user_input, reply, self.chat_id)
+
+    def _record(self, trace, request, usage=None, cached=False, error=None):
+        """Add a finished (or failed) reply to the metrics."""
+        model = request["model"] if request else None
+        stream = bool(request and request["stream"])
+        self.turn_metrics.finish(trace, model, stream, usage, cached, error)
+
+    def metrics(self):
+        """Rolling latency and token statistics of recent replies (see RequestMetrics.summary())."""
+        return self.turn_metrics.summary()
+
+    def reply(self, user_input, raise_errors=False):
+        """Get Riko's response.
+
+        A failed request comes back as an error message in place of the reply,
+        or is raised with `raise_errors`.
+        """
+        trace = RequestMetrics.begin()
+        turn = self._begin_turn(user_input)
+
         # Get response from Groq
+        request = None
         try:
-            response = self.client.chat.completions.create(
-                model="llama-3.3-70b-versatile",
-                messages=self.history,
-                temperature=0.8,  # Slightly less random for more consistency
-                max_completion_tokens=800
-            )
-
-            reply = response.choices[0].message.content
+            request = self._chat_args()
+            reply = self._cached(request, user_input)
+            if reply is not None:
+                self._record(trace, request, cached=True)
+            else:
+                response = self.retry.call(self.keys.create, trace=trace, **request)
+                reply = response.choices[0].message.content
+                self._record(trace, request, usage_of(response))
+                self._cache_reply(request, reply, user_input)
+            self._commit_turn(reply)
+            return reply
 
-            # Add assistant response to history
-            self.history.append({
-                "role": "assistant",
-                "content": reply
-            })
+        except Exception as e:
+            self._drop_turn(turn)
+            self._record(trace, request, error=e)
+            if raise_errors:
+                raise
+            return self._error_text(e)
+        except BaseException:
+            self._drop_turn(turn)     # cancelled or interrupted
+            raise
 
-            # Update memory
-            self.memory["stats"]["total_messages"] += 1
-            self.memory["last_conversation"] = self.history[1:]  # Exclude system message
-            self.save_memory()
+    async def areply(self, user_input, raise_errors=False):
+        """Get Riko's response without blocking the running event loop."""
+        trace = RequestMetrics.begin()
+        turn = self._begin_turn(user_input)
 
+        request = None
+        try:
+            request = self._chat_args()
+            reply = self._cached(request, user_input)
+            if reply is not None:
+                self._record(trace, request, cached=True)
+            else:
+                response = await self.retry.acall(self.keys.acreate, trace=trace, **request)
+                reply = response.choices[0].message.content
+                self._record(trace, request, usage_of(response))
+                self._cache_reply(request, reply, user_input)
+            self._commit_turn(reply)
             return reply
 
         except Exception as e:
-            return f"❌ Error: {str(e)}\n\nMake sure you have GROQ_API_KEY set in your environment!"
+            self._drop_turn(turn)
+            self._record(trace, request, error=e)
+            if raise_errors:
+                raise
+            return self._error_text(e)
+        except BaseException:
+            self._drop_turn(turn)     # cancelled or interrupted
+            raise
+
+    def reply_stream(self, user_input, raise_errors=False):
+        """Get Riko's response as a stream of text deltas.
+
+        History and memory are only updated once the stream has finished,
+        so a reply that is abandoned half way never ends up in memory.
+        A cached reply comes back as a single delta. A failed request ends
+        the stream with an error message, or is raised with `raise_errors`.
+        """
+        trace = RequestMetrics.begin()
+        turn = self._begin_turn(user_input)
+
+        request, parts, usage = None, [], None
+        try:
+            request = self._chat_args(stream=True)
+            reply = self._cached(request, user_input)
+            if reply is not None:
+                self._record(trace, request, cached=True)
+                yield reply
+                self._commit_turn(reply)
+                return
+
+            stream = self.retry.call(self.keys.create, trace=trace, **request)
+
+            for chunk in stream:
+                usage = usage_of(chunk) or usage
+                if not chunk.choices:
+                    continue
+                delta = chunk.choices[0].delta.content
+                if delta:
+                    if not parts:
+                        trace["first"] = time.perf_counter()
+                    parts.append(delta)
+                    yield delta
+
+        except Exception as e:
+            self._drop_turn(turn)
+            self._record(trace, request, usage, error=e)
+            if raise_errors:
+                raise
+            prefix = "\n\n" if parts else ""
+            yield prefix + self._error_text(e)
+            return
+        except BaseException:
+            # Abandoned by its consumer (GeneratorExit) or cancelled
+            self._drop_turn(turn)
+            raise
+
+        self._record(trace, request, usage)
+        reply = "".join(parts)
+        self._cache_reply(request, reply, user_input)
+        self._commit_turn(reply)
+
+    async def areply_stream(self, user_input, raise_errors=False):
+        """Async version of reply_stream(), for use on an event loop."""
+        trace = RequestMetrics.begin()
+        turn = self._begin_turn(user_input)
+
+        request, parts, usage = None, [], None
+        try:
+            request = self._chat_args(stream=True)
+            reply = self._cached(request, user_input)
+            if reply is not None:
+                self._record(trace, request, cached=True)
+                yield reply
+                self._commit_turn(reply)
+                return
+
+            stream = await self.retry.acall(self.keys.acreate, trace=trace, **request)
+
+            async for chunk in stream:
+                usage = usage_of(chunk) or usage
+                if not chunk.choices:
+                    continue
+                delta = chunk.choices[0].delta.content
+                if delta:
+                    if not parts:
+                        trace["first"] = time.perf_counter()
+                    parts.append(delta)
+                    yield delta
+
+        except Exception as e:
+            self._drop_turn(turn)
+            self._record(trace, request, usage, error=e)
+            if raise_errors:
+                raise
+            prefix = "\n\n" if parts else ""
+            yield prefix + self._error_text(e)
+            return
+        except BaseException:
+            # Abandoned by its consumer (GeneratorExit) or cancelled
+            self._drop_turn(turn)
+            raise
+
+        self._record(trace, request, usage)
+        reply = "".join(parts)
+        self._cache_reply(request, reply, user_input)
+        self._commit_turn(reply)
+
+    def _complete_args(self, messages, max_completion_tokens, background):
+        return dict(
+            model=self.router.for_background() if background else self.router.model,
+            messages=messages,
+            temperature=self.router.temperature,
+            max_completion_tokens=max_completion_tokens or self.router.max_tokens
+        )
+
+    def complete(self, messages, max_completion_tokens=None, background=False):
+        """One-shot completion over `messages`; history and memory are untouched.
+
+        `background` requests (titles, summaries) may go to the fast model.
+        """
+        request = self._complete_args(messages, max_completion_tokens, background)
+        reply = self._cached(request)
+        if reply is None:
+            response = self.retry.call(self.keys.create, **request)
+            reply = response.choices[0].message.content
+            self._cache_reply(request, reply)
+        return reply
+
+    async def acomplete(self, messages, max_completion_tokens=None, background=False):
+        """Async version of complete()."""
+        request = self._complete_args(messages, max_completion_tokens, background)
+        reply = self._cached(request)
+        if reply is None:
+            response = await self.retry.acall(self.keys.acreate, **request)
+            reply = response.choices[0].message.content
+            self._cache_reply(request, reply)
+        return reply
+
+    def _title_messages(self, user_input):
+        return [
+            {
+                "role": "system",
+                "content": "Write a title of at most five words for a chat that starts with the "
+                           "user's message. Reply with the title only, no quotes."
+            },
+            {"role": "user", "content": user_input}
+        ]
+
+    def generate_title(self, user_input):
+        """Suggest a short chat title for the first message of a chat."""
+        title = self.complete(self._title_messages(user_input), max_completion_tokens=16, background=True)
+        return title.strip().strip('"').strip()
+
+    async def agenerate_title(self, user_input):
+        """Async version of generate_title()."""
+        title = await self.acomplete(self._title_messages(user_input), max_completion_tokens=16, background=True)
+        return title.strip().strip('"').strip()
 
     def get_stats(self):
         """Get conversation statistics."""
@@ -151,10 +1382,15 @@ IMPORTANT:
     def clear_memory(self):
         """Clear conversation history but keep user info."""
         user_name = self.memory.get("user_name")
+        facts = self.memory.get("facts", [])
         self.memory = self.default_memory()
         if user_name:
             self.memory["user_name"] = user_name
+        self.memory["facts"] = facts
         self.save_memory()
+        self.context.clear()
+        self.summarizer.reset()
+        self.extractor.reset()
 
         # Reset conversation
         self.history = [
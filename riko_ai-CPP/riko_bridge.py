@@ -5,58 +5,199 @@ riko_bridge.py — Long-running subprocess bridge between the C++ GUI and Riko A
 Protocol (both directions are single JSON lines terminated by \n):
   C++ → Python:  {"message": "user text", "lang_prefix": "[Respond in French] "}
   Python → C++:  {"reply": "riko response"}  |  {"error": "error message"}
+
+Streaming mode (request carries an id and "stream": true):
+  C++ → Python:  {"id": 7, "message": "user text", "lang_prefix": "", "stream": true}
+  Python → C++:  {"id": 7, "delta": "partial text"}   (zero or more)
+                 {"id": 7, "done": true}              (end of reply)
+                 {"id": 7, "error": "error message"}  (ends the request instead of done)
+
+Requests without "stream" keep the single-line reply above; an "id", if
+given, is echoed back on it.  Chat requests may also carry the GUI's
+"chat_id", which selects that chat's settings (e.g. its semantic cache).
+
+Stateless requests (run next to a chat without touching its history):
+  C++ → Python:  {"id": 8, "op": "title", "message": "first user message"}
+                 {"id": 9, "op": "complete", "messages": [{"role": ..., "content": ...}]}
+  Python → C++:  {"id": 8, "reply": "..."}  |  {"id": 8, "error": "..."}
+
+A deleted chat is forgotten by recall; the GUI's chat ids are list
+positions, so the chats after it move down one id:
+  C++ → Python:  {"id": 10, "op": "forget", "chat_id": 3}
+  Python → C++:  {"id": 10, "done": true}
+
+Requests are handled concurrently (up to config.json["api"]["max_concurrency"]
+at once) and answered as soon as each one finishes, so replies can arrive out
+of submission order — use "id" to match them up.  "chat" requests share Riko's
+history and are therefore still answered one after another.
+
+Everything runs on one event loop with Riko's async methods, which share a
+single keep-alive connection pool to Groq.
 """
 
 import sys
 import os
 import json
+import asyncio
+import threading
+
+DEFAULT_MAX_CONCURRENCY = 4
+
+# Longest request line read from the GUI; StreamReader's default is 64 KiB
+MAX_LINE_BYTES = 16 * 1024 * 1024
+
+
+# The GUI reads frames from the real stdout; main() points sys.stdout at
+# stderr, so a stray print() anywhere in Riko cannot get in between them
+PROTOCOL_OUT = sys.stdout
+
+
+def send(frame):
+    """Write one JSON frame to the GUI."""
+    PROTOCOL_OUT.write(json.dumps(frame) + "\n")
+    PROTOCOL_OUT.flush()
+
+
+class Bridge:
+    """Reads tagged requests from stdin and runs them concurrently."""
+
+    def __init__(self, riko, max_concurrency, loop):
+        self.riko      = riko
+        self.loop      = loop
+        self.semaphore = asyncio.Semaphore(max_concurrency)
+        self.chat_lock = asyncio.Lock()      # chat turns share Riko.history
+        self.tasks     = set()
+
+    async def serve(self):
+        reader = asyncio.StreamReader(limit=MAX_LINE_BYTES)
+        await self.loop.connect_read_pipe(
+            lambda: asyncio.StreamReaderProtocol(reader), sys.stdin)
+
+        while True:
+            try:
+                raw_line = await reader.readline()
+            except ValueError:
+                # readline() has dropped the overlong line; keep serving the next ones
+                send({"error": f"Request longer than {MAX_LINE_BYTES} bytes"})
+                continue
+            if not raw_line:
+                break
+            raw_line = raw_line.decode("utf-8", errors="replace").strip()
+            if not raw_line:
+                continue
+
+            try:
+                payload = json.loads(raw_line)
+            except json.JSONDecodeError:
+                send({"error": "Invalid JSON from GUI"})
+                continue
+
+            task = asyncio.ensure_future(self.handle(payload))
+            self.tasks.add(task)
+            task.add_done_callback(self.tasks.discard)
+
+        # stdin closed: let in-flight requests finish before exiting
+        if self.tasks:
+            await asyncio.gather(*self.tasks, return_exceptions=True)
+
+    async def handle(self, payload):
+        req_id = payload.get("id")
+        try:
+            op = payload.get("op", "chat")
+            if op == "chat":
+                async with self.chat_lock:
+                    async with self.semaphore:
+                        await self.handle_chat(req_id, payload)
+            elif op in ("title", "complete"):
+                async with self.semaphore:
+                    await self.handle_stateless(req_id, op, payload)
+            elif op == "forget":
+                # After the chat turn in flight, whose exchange still carries the old ids
+                async with self.chat_lock:
+                    self.riko.forget_chat(payload["chat_id"], renumber=True)
+                send({"id": req_id, "done": True})
+            else:
+                raise ValueError(f"Unknown op: {op}")
+
+        except Exception as e:
+            frame = {"error": str(e)}
+            if req_id is not None:
+                frame["id"] = req_id
+            send(frame)
+
+    async def handle_chat(self, req_id, payload):
+        message     = payload.get("message", "").strip()
+        lang_prefix = payload.get("lang_prefix", "").strip()
+
+        if not message:
+            raise ValueError("Empty message")
+
+        full_message = f"{lang_prefix}{message}" if lang_prefix else message
+        if "chat_id" in payload:
+            self.riko.set_chat(payload["chat_id"])
+
+        if payload.get("stream"):
+            # A failure ends the stream with an error frame, so the GUI doesn't save it as the reply
+            async for delta in self.riko.areply_stream(full_message, raise_errors=True):
+                send({"id": req_id, "delta": delta})
+            send({"id": req_id, "done": True})
+        else:
+            reply = await self.riko.areply(full_message, raise_errors=True)
+            frame = {"reply": reply}
+            if req_id is not None:
+                frame["id"] = req_id
+            send(frame)
+
+    async def handle_stateless(self, req_id, op, payload):
+        if op == "title":
+            reply = await self.riko.agenerate_title(payload.get("message", "").strip())
+        else:
+            reply = await self.riko.acomplete(payload.get("messages", []))
+        send({"id": req_id, "reply": reply})
+
 
 def main():
+    sys.stdout = sys.stderr
+
     # Change to script's directory so relative file paths (config.json etc.) work
     os.chdir(os.path.dirname(os.path.abspath(__file__)))
 
-    # Read system_prompt from config.json
-    system_prompt = None
+    # run.py --profile=cpu|mem asks for this through the environment
+    import profiling
+    profiling.start_from_env(f"bridge-{os.getpid()}")
+
+    # Read system_prompt and the concurrency cap from config.json
+    system_prompt   = None
+    max_concurrency = DEFAULT_MAX_CONCURRENCY
     try:
         with open("config.json", "r") as f:
             config = json.load(f)
         sp = config.get("system_prompt", "").strip()
         if sp:
             system_prompt = sp
+        max_concurrency = max(1, int(config.get("api", {}).get("max_concurrency", max_concurrency)))
     except Exception as e:
-        print(json.dumps({"error": f"Config read failed: {e}"}), flush=True)
+        send({"error": f"Config read failed: {e}"})
 
     # Initialise Riko
     try:
         from riko import Riko
         riko = Riko(system_prompt=system_prompt)
     except Exception as e:
-        print(json.dumps({"error": f"Riko init failed: {e}"}), flush=True)
+        send({"error": f"Riko init failed: {e}"})
         sys.exit(1)
 
-    # Message loop
-    for raw_line in sys.stdin:
-        raw_line = raw_line.strip()
-        if not raw_line:
-            continue
-
-        try:
-            payload = json.loads(raw_line)
-            message     = payload.get("message", "").strip()
-            lang_prefix = payload.get("lang_prefix", "").strip()
-
-            if not message:
-                continue
-
-            full_message = f"{lang_prefix}{message}" if lang_prefix else message
-            reply = riko.reply(full_message)
-            print(json.dumps({"reply": reply}), flush=True)
-
-        except json.JSONDecodeError:
-            print(json.dumps({"error": "Invalid JSON from GUI"}), flush=True)
-        except Exception as e:
-            print(json.dumps({"error": str(e)}), flush=True)
+    # Riko imports the Groq SDK on first use; load it while the GUI starts up instead
+    threading.Thread(target=lambda: __import__("groq"), daemon=True).start()
 
+    loop = asyncio.new_event_loop()
+    asyncio.set_event_loop(loop)
+    try:
+        loop.run_until_complete(Bridge(riko, max_concurrency, loop).serve())
+    finally:
+        loop.close()
+        # Queued summaries, facts and recall changes (a forgotten chat too) are written out
+        riko.close()
 
 if __name__ == "__main__":
     main()
@@ -2,19 +2,27 @@
 """
 Riko AI - Main Runner
 Compiles the C GUI if needed, then launches it.
-Falls back to terminal mode with --terminal flag.
+Falls back to terminal mode with --terminal flag; --serve runs the HTTP server.
 """
 
 import os
 import sys
 import json
 import subprocess
+from datetime import datetime
 
 PROJECT_DIR = os.path.dirname(os.path.abspath(__file__))
 CONFIG_FILE = os.path.join(PROJECT_DIR, "config.json")
 GUI_BINARY  = os.path.join(PROJECT_DIR, "riko_gui")
 GUI_SOURCE  = os.path.join(PROJECT_DIR, "gui.cpp")
 
+# Timed by --profile-startup: what the bridge loads before it answers the GUI
+STARTUP_MODULES = [
+    ("riko_bridge", "bridge start-up"),
+    ("riko", "before the first request"),
+    ("groq", "in the background, or on the first request"),
+]
+
 
 def load_key_from_config():
     try:
@@ -88,25 +96,54 @@ def run_gui():
 
 
 def run_python_gui():
+    import profiling
+    profiling.start_from_env()
     try:
         import gi
         gi.require_version("Gtk", "4.0")
         from gui import RikoApp
-        RikoApp().run(sys.argv)
+        RikoApp().run(sys.argv[:1])      # GTK would reject run.py's own options
     except Exception as e:
         print(f"Python GUI failed: {e}")
 
 
-def run_terminal():
+METRIC_ROWS = [
+    ("queue_ms", "queue wait (ms)"),
+    ("ttft_ms", "first text (ms)"),
+    ("total_ms", "total (ms)"),
+    ("tokens_per_sec", "tokens/sec"),
+    ("prompt_tokens", "prompt tokens"),
+    ("completion_tokens", "reply tokens"),
+]
+
+
+def print_metrics(riko):
+    """Print Riko.metrics(): rolling percentiles over the recent replies."""
+    summary = riko.metrics()
+    print(f"\nReplies: {summary['replies']} ({summary['cached']} cached, {summary['errors']} failed, "
+          f"{summary['retries']} retries, {summary['hedged']} hedged)")
+    for field, label in METRIC_ROWS:
+        p = summary[field]
+        if p:
+            print(f"  {label:<17} p50 {p['p50']:9.1f}   p95 {p['p95']:9.1f}   p99 {p['p99']:9.1f}")
+    for what in ("models", "keys"):
+        if summary[what]:
+            print(f"  {what}: " + ", ".join(f"{name} x{n}" for name, n in summary[what].items()))
+    print()
+
+
+def run_terminal(show_metrics=False):
     os.chdir(PROJECT_DIR)
     if not os.getenv("GROQ_API_KEY"):
         print("No API key set. Add one via Settings or edit config.json.")
         return
-    from riko import Riko
+    import profiling
+    profiling.start_from_env()
+    from riko import Riko, format_record
     print("\n" + "=" * 60)
     print("RIKO AI - Terminal Mode")
     print("=" * 60)
-    print("Commands: exit / quit / clear")
+    print("Commands: exit / quit / clear / metrics")
     print("=" * 60 + "\n")
     riko = Riko()
     while True:
@@ -116,23 +153,147 @@ def run_terminal():
                 continue
             if user_input.lower() in ("exit", "quit", "bye"):
                 print("\nRiko: Bye!\n")
+                if show_metrics:
+                    print_metrics(riko)
                 break
             if user_input.lower() == "clear":
                 riko.clear_memory()
                 print("\nMemory cleared!\n")
                 continue
+            if user_input.lower() == "metrics":
+                print_metrics(riko)
+                continue
             print(f"Riko: {riko.reply(user_input)}\n")
+            if show_metrics:
+                print(f"   [{format_record(riko.metrics()['last'])}]\n")
         except KeyboardInterrupt:
             print("\n\nRiko: Bye\n")
+            if show_metrics:
+                print_metrics(riko)
             break
         except Exception as e:
             print(f"\nError: {e}\n")
 
 
+def option(name):
+    """The value given as --name=value on the command line, or None."""
+    prefix = f"--{name}="
+    for arg in sys.argv:
+        if arg.startswith(prefix):
+            return arg[len(prefix):]
+    return None
+
+
+def run_server():
+    """Serve Riko over HTTP (see server.py); --host= and --port= override config.json."""
+    os.chdir(PROJECT_DIR)
+    if not os.getenv("GROQ_API_KEY"):
+        print("No API key set. Add one via Settings or edit config.json.")
+        return
+    import profiling
+    profiling.start_from_env()
+    from server import serve
+    serve(host=option("host"), port=option("port"))
+
+
+def profile_startup(out_dir):
+    """Print where start-up time goes, timing each of STARTUP_MODULES in a fresh interpreter.
+
+    The report goes to startup.txt in `out_dir`, next to each module's raw
+    -X importtime output (which tuna and similar tools can read).
+    """
+    os.chdir(PROJECT_DIR)
+    report = []
+    for module, what in STARTUP_MODULES:
+        result = subprocess.run(
+            [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+            capture_output=True, text=True, cwd=PROJECT_DIR
+        )
+        with open(os.path.join(out_dir, f"importtime-{module}.txt"), "w", encoding="utf-8") as f:
+            f.write(result.stderr)
+        if result.returncode != 0:
+            error = result.stderr.strip().splitlines()
+            report.append(f"import {module}: failed ({error[-1] if error else result.returncode})\n")
+            continue
+
+        # Lines look like "import time:  self [us] | cumulative | <indent>package",
+        # with two more spaces of indent per level of nesting
+        rows = []
+        for line in result.stderr.splitlines():
+            parts = line[len("import time:"):].split("|")
+            if not line.startswith("import time:") or len(parts) != 3 or not parts[0].strip().isdigit():
+                continue
+            name = parts[2].rstrip()
+            depth = (len(name) - len(name.lstrip()) - 1) // 2
+            rows.append((name.strip(), depth, int(parts[0]), int(parts[1])))
+
+        # The module's own subtree: from after the previous top-level import to its line
+        end = max(i for i, row in enumerate(rows) if row[0] == module and row[1] == 0)
+        start = max([i + 1 for i, row in enumerate(rows[:end]) if row[1] == 0] or [0])
+        subtree = rows[start:end + 1]
+
+        report.append(f"import {module}: {rows[end][3] / 1000:.0f} ms  ({what})")
+        report.append("  direct imports (cumulative):")
+        for name, _, _, cumulative in sorted((r for r in subtree if r[1] == 1), key=lambda r: -r[3])[:10]:
+            report.append(f"    {cumulative / 1000:8.1f} ms  {name}")
+        report.append("  slowest modules (self):")
+        for name, _, self_us, _ in sorted(subtree, key=lambda r: -r[2])[:10]:
+            report.append(f"    {self_us / 1000:8.1f} ms  {name}")
+        report.append("")
+
+    print("\n".join(report))
+    with open(os.path.join(out_dir, "startup.txt"), "w", encoding="utf-8") as f:
+        f.write("\n".join(report) + "\n")
+    print(f"Saved to {out_dir}")
+
+
+def profile_mode():
+    """The mode asked for with --profile=cpu|mem|startup (or --profile-startup), or None."""
+    for arg in sys.argv:
+        if arg == "--profile-startup":
+            return "startup"
+        if arg.startswith("--profile"):
+            return arg.partition("=")[2]
+    return None
+
+
+def profile_dir(mode):
+    """A new timestamped directory for this run's profile, under profiles/."""
+    path = os.path.join(PROJECT_DIR, "profiles", f"{datetime.now():%Y%m%d-%H%M%S}-{mode}")
+    os.makedirs(path, exist_ok=True)
+    return path
+
+
+def start_profiling(mode):
+    """Profile this run (cpu or mem) into a new directory under profiles/.
+
+    The choice goes in the environment: the terminal loop and the Python GUI
+    pick it up through profiling.start_from_env(), and the C++ GUI passes it
+    on to riko_bridge.py, which profiles itself into a bridge-<pid> subdirectory.
+    """
+    if mode not in ("cpu", "mem"):
+        print("Usage: python run.py --profile=cpu|mem|startup [--terminal | --serve]")
+        return False
+    out_dir = profile_dir(mode)
+    os.environ["RIKO_PROFILE"] = mode
+    os.environ["RIKO_PROFILE_DIR"] = out_dir
+    print(f"Profiling ({mode}) to {out_dir}\n")
+    return True
+
+
 def main():
+    mode = profile_mode()
+    if mode == "startup":
+        profile_startup(profile_dir(mode))
+        return
+    if mode is not None and not start_profiling(mode):
+        return
+
     load_key_from_config()
-    if "--terminal" in sys.argv or "-t" in sys.argv:
-        run_terminal()
+    if "--serve" in sys.argv:
+        run_server()
+    elif "--terminal" in sys.argv or "-t" in sys.argv:
+        run_terminal(show_metrics="--metrics" in sys.argv)
     elif "--python-gui" in sys.argv:
         os.chdir(PROJECT_DIR)
         run_python_gui()
@@ -0,0 +1,370 @@
+"""
+server.py — Riko over HTTP, for many users at once.
+
+run.py --serve starts it. Every session (one user of an internal tool)
+gets its own Riko, with its own memory file under sessions/, and all of
+them share one event loop, the Groq key pool with its keep-alive
+connections, and the response cache.
+
+Endpoints (JSON in and out):
+  GET  /health                     {"status": "ok", "loaded": 12, "memory_mb": 1.9,
+                                    "loads": 40, "evictions": 28}
+  POST /chat                       {"session_id": "alice", "message": "hi"}
+                                   -> {"session_id": "alice", "reply": "..."}
+  POST /chat/stream                same body -> text/event-stream:
+                                     data: {"delta": "partial text"}         (zero or more)
+                                     data: {"done": true, "session_id": ...}  (end of reply)
+                                     data: {"error": "..."}                   (ends it instead)
+  POST /clear                      {"session_id": "alice"} -> {"session_id": "alice", "cleared": true}
+  GET  /metrics?session_id=alice   Riko.metrics() of that session
+
+A chat request without a session_id starts a new session; its id comes
+back in the reply and in the X-Session-Id header, to send with the next
+requests. Turns of one session are answered in order; different sessions
+run concurrently, up to "max_concurrency" Groq requests at a time.
+
+Sessions are kept by a SessionManager (session_manager.py): the most
+recently used stay loaded, the rest wait in their files under sessions/.
+
+Settings come from config.json["server"]: "host", "port", "sessions_dir",
+"max_sessions" and "max_sessions_mb" (the caps on loaded sessions),
+"max_concurrency" and "token" (when set, requests other than /health
+need "Authorization: Bearer <token>"). run.py's --host and --port win
+over the first two.
+"""
+
+import asyncio
+import hmac
+import json
+import re
+import signal
+import traceback
+import uuid
+from urllib.parse import parse_qs, urlsplit
+
+from riko import Riko, CONFIG_FILE
+from response_cache import ResponseCache
+from session_manager import SessionManager
+
+
+DEFAULT_HOST            = "127.0.0.1"
+DEFAULT_PORT            = 8080
+DEFAULT_MAX_CONCURRENCY = 64        # Groq requests in flight at once
+
+MAX_BODY_BYTES    = 1 << 20
+MAX_HEADER_LINES  = 100
+MAX_MESSAGE_CHARS = 20000
+IDLE_TIMEOUT      = 60.0            # seconds a kept-alive connection may wait for its next request
+BACKLOG           = 1024
+
+SESSION_ID_RE = re.compile(r"^[A-Za-z0-9_-]{1,64}$")
+
+REASONS = {
+    200: "OK", 400: "Bad Request", 401: "Unauthorized", 404: "Not Found",
+    405: "Method Not Allowed", 408: "Request Timeout", 413: "Payload Too Large",
+    431: "Request Header Fields Too Large", 500: "Internal Server Error", 502: "Bad Gateway",
+}
+
+# path -> (method, RikoServer handler)
+ROUTES = {
+    "/health":      ("GET",  "health"),
+    "/chat":        ("POST", "chat"),
+    "/chat/stream": ("POST", "chat_stream"),
+    "/clear":       ("POST", "clear"),
+    "/metrics":     ("GET",  "metrics"),
+}
+
+
+class HTTPError(Exception):
+    """Ends a request with `status` and {"error": message}."""
+
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+
+
+# ── HTTP/1.1 ─────────────────────────────────────────────────────────────────
+
+class Request:
+    def __init__(self, method, target, version, headers, body):
+        url = urlsplit(target)
+        self.method  = method
+        self.path    = url.path
+        self.query   = {name: values[-1] for name, values in parse_qs(url.query).items()}
+        self.version = version
+        self.headers = headers              # lower-case names
+        self.body    = body
+        self.started = False                # a streamed response has begun
+
+    @property
+    def keep_alive(self):
+        connection = self.headers.get("connection", "").lower()
+        if self.version == "HTTP/1.1":
+            return connection != "close"
+        return connection == "keep-alive"
+
+    def json(self):
+        """The body as a JSON object ({} if empty)."""
+        if not self.body:
+            return {}
+        try:
+            data = json.loads(self.body)
+        except ValueError:
+            raise HTTPError(400, "The body is not valid JSON")
+        if not isinstance(data, dict):
+            raise HTTPError(400, "The body must be a JSON object")
+        return data
+
+
+async def read_request(reader):
+    """The next request on a connection, or None once the client has closed it."""
+    try:
+        line = await reader.readline()
+        if not line:
+            return None
+        parts = line.decode("latin-1").split()
+        if len(parts) != 3 or not parts[2].startswith("HTTP/"):
+            raise HTTPError(400, "Malformed request line")
+
+        headers = {}
+        while True:
+            line = await reader.readline()
+            if line in (b"\r\n", b"\n", b""):
+                break
+            if len(headers) >= MAX_HEADER_LINES:
+                raise HTTPError(431, "Too many headers")
+            name, _, value = line.decode("latin-1").partition(":")
+            headers[name.strip().lower()] = value.strip()
+    except ValueError:
+        # StreamReader.readline() gives up on lines longer than its limit
+        raise HTTPError(431, "Request line or header too long")
+
+    try:
+        length = int(headers.get("content-length") or 0)
+    except ValueError:
+        raise HTTPError(400, "Bad Content-Length")
+    if length > MAX_BODY_BYTES:
+        raise HTTPError(413, f"The body may be at most {MAX_BODY_BYTES} bytes")
+    body = await reader.readexactly(length) if length > 0 else b""
+    return Request(parts[0].upper(), parts[1], parts[2], headers, body)
+
+
+def response_head(status, headers):
+    lines = [f"HTTP/1.1 {status} {REASONS.get(status, '')}"]
+    lines += [f"{name}: {value}" for name, value in headers.items()]
+    return ("\r\n".join(lines) + "\r\n\r\n").encode("latin-1")
+
+
+async def send_json(writer, status, body, keep_alive, headers=None):
+    data = json.dumps(body).encode("utf-8")
+    head = {
+        "Content-Type": "application/json",
+        "Content-Length": len(data),
+        "Connection": "keep-alive" if keep_alive else "close",
+    }
+    head.update(headers or {})
+    writer.write(response_head(status, head) + data)
+    await writer.drain()
+
+
+def event(data):
+    """One server-sent event."""
+    return f"data: {json.dumps(data)}\n\n".encode("utf-8")
+
+
+# ── Server ───────────────────────────────────────────────────────────────────
+
+def check_session_id(session_id):
+    if not isinstance(session_id, str) or not SESSION_ID_RE.match(session_id):
+        raise HTTPError(400, "session_id must be 1-64 letters, digits, '-' or '_'")
+    return session_id
+
+
+class RikoServer:
+    """Routes requests to per-session Rikos on the running event loop."""
+
+    def __init__(self, api_config, server_config, system_prompt=None):
+        self.system_prompt = system_prompt
+        self.token         = server_config.get("token") or None
+        self.semaphore     = asyncio.Semaphore(
+            max(1, int(server_config.get("max_concurrency", DEFAULT_MAX_CONCURRENCY))))
+        self.sessions      = SessionManager.from_config(self._new_riko, server_config)
+
+        # Recall searches the desktop user's past chats and near-duplicate
+        # answers could cross from one user to another, so sessions go
+        # without both. The exact-match cache only answers identical
+        # prompts, so one copy of it is shared.
+        self.cache = ResponseCache.from_config(api_config)
+        self.session_config = dict(api_config, recall={"enabled": False},
+                                   semantic_cache=None, response_cache=False)
+
+    def _new_riko(self, session_id, memory_file):
+        riko = Riko(system_prompt=self.system_prompt, memory_file=memory_file, api_config=self.session_config)
+        riko.cache = self.cache
+        return riko
+
+    def existing_session_id(self, session_id):
+        """`session_id`, checked, if that session is loaded or saved."""
+        if not self.sessions.exists(check_session_id(session_id)):
+            raise HTTPError(404, "No such session")
+        return session_id
+
+    def close(self):
+        """Write every session's pending memory."""
+        self.sessions.close()
+
+    # ── connections ──────────────────────────────────────────────────────────
+
+    async def handle(self, reader, writer):
+        """Serve the requests of one connection until either side closes it."""
+        try:
+            while True:
+                try:
+                    request = await asyncio.wait_for(read_request(reader), IDLE_TIMEOUT)
+                except HTTPError as e:
+                    await send_json(writer, e.status, {"error": str(e)}, keep_alive=False)
+                    break
+                if request is None or not await self.respond(request, writer):
+                    break
+        except (asyncio.TimeoutError, asyncio.IncompleteReadError, ConnectionError):
+            pass
+        finally:
+            writer.close()
+
+    async def respond(self, request, writer):
+        """Answer one request; returns whether the connection stays open."""
+        try:
+            route = ROUTES.get(request.path)
+            if route is None:
+                raise HTTPError(404, "No such endpoint")
+            method, handler = route
+            if request.method != method:
+                raise HTTPError(405, f"Use {method} for {request.path}")
+            if self.token and handler != "health":
+                self.authorize(request)
+            return await getattr(self, handler)(request, writer)
+        except HTTPError as e:
+            await send_json(writer, e.status, {"error": str(e)}, request.keep_alive)
+            return request.keep_alive
+        except ConnectionError:
+            raise
+        except Exception:
+            print(f"Error answering {request.method} {request.path}:")
+            traceback.print_exc()
+            # Once a stream's 200 is out there is no status left to send; the connection just ends
+            if not request.started:
+                await send_json(writer, 500, {"error": "Internal server error"}, keep_alive=False)
+            return False
+
+    def authorize(self, request):
+        scheme, _, token = request.headers.get("authorization", "").partition(" ")
+        if scheme.lower() != "bearer" or not hmac.compare_digest(token.strip(), self.token):
+            raise HTTPError(401, "Missing or wrong bearer token")
+
+    # ── endpoints ────────────────────────────────────────────────────────────
+
+    async def health(self, request, writer):
+        body = dict(status="ok", **self.sessions.stats())
+        await send_json(writer, 200, body, request.keep_alive)
+        return request.keep_alive
+
+    def chat_request(self, request):
+        """(session id, message) of a chat request; no session_id starts a new session."""
+        data = request.json()
+        message = data.get("message")
+        if not isinstance(message, str) or not message.strip():
+            raise HTTPError(400, "message must be a non-empty string")
+        if len(message) > MAX_MESSAGE_CHARS:
+            raise HTTPError(413, f"message may be at most {MAX_MESSAGE_CHARS} characters")
+        session_id = data.get("session_id")
+        return uuid.uuid4().hex if session_id is None else check_session_id(session_id), message.strip()
+
+    async def chat(self, request, writer):
+        session_id, message = self.chat_request(request)
+        headers = {"X-Session-Id": session_id}
+        async with self.sessions.use(session_id) as session, session.lock, self.semaphore:
+            try:
+                reply = await session.riko.areply(message, raise_errors=True)
+            except Exception as e:
+                await send_json(writer, 502, {"session_id": session_id, "error": str(e)},
+                                request.keep_alive, headers)
+                return request.keep_alive
+        await send_json(writer, 200, {"session_id": session_id, "reply": reply}, request.keep_alive, headers)
+        return request.keep_alive
+
+    async def chat_stream(self, request, writer):
+        session_id, message = self.chat_request(request)
+        async with self.sessions.use(session_id) as session, session.lock, self.semaphore:
+            writer.write(response_head(200, {
+                "Content-Type": "text/event-stream",
+                "Cache-Control": "no-cache",
+                "Connection": "close",
+                "X-Session-Id": session.id,
+            }))
+            request.started = True
+            stream = session.riko.areply_stream(message, raise_errors=True)
+            try:
+                async for delta in stream:
+                    writer.write(event({"delta": delta}))
+                    await writer.drain()
+                writer.write(event({"done": True, "session_id": session.id}))
+            except ConnectionError:
+                raise                   # the client left; the half reply stays out of memory
+            except Exception as e:
+                writer.write(event({"error": str(e)}))
+            finally:
+                await stream.aclose()
+            await writer.drain()
+        return False
+
+    async def clear(self, request, writer):
+        session_id = self.existing_session_id(request.json().get("session_id"))
+        async with self.sessions.use(session_id) as session, session.lock:
+            session.riko.clear_memory()
+        await send_json(writer, 200, {"session_id": session_id, "cleared": True}, request.keep_alive)
+        return request.keep_alive
+
+    async def metrics(self, request, writer):
+        session_id = self.existing_session_id(request.query.get("session_id"))
+        async with self.sessions.use(session_id) as session:
+            summary = session.riko.metrics()
+        await send_json(writer, 200, summary, request.keep_alive)
+        return request.keep_alive
+
+
+def load_config():
+    try:
+        with open(CONFIG_FILE, "r") as f:
+            return json.load(f)
+    except Exception:
+        return {}
+
+
+async def run(host=None, port=None):
+    config   = load_config()
+    settings = config.get("server") or {}
+    host     = host or settings.get("host", DEFAULT_HOST)
+    port     = int(port or settings.get("port", DEFAULT_PORT))
+
+    server = RikoServer(config.get("api") or {}, settings,
+                        system_prompt=(config.get("system_prompt") or "").strip() or None)
+    listener = await asyncio.start_server(server.handle, host, port, backlog=BACKLOG)
+    try:
+        # Service managers stop with SIGTERM; save memory as on Ctrl+C
+        asyncio.get_running_loop().add_signal_handler(signal.SIGTERM, asyncio.current_task().cancel)
+    except NotImplementedError:         # Windows
+        pass
+    print(f"Riko server on http://{host}:{port} (Ctrl+C to stop)", flush=True)
+    try:
+        async with listener:
+            await listener.serve_forever()
+    finally:
+        server.close()
+
+
+def serve(host=None, port=None):
+    """Run the server until interrupted."""
+    try:
+        asyncio.run(run(host, port))
+    except (KeyboardInterrupt, asyncio.CancelledError):
+        pass
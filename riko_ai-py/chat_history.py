@@ -0,0 +1,627 @@
+# chat_history.py
+"""
+Chat history storage.
+
+chat_history.json is a snapshot. Every change made after it (new chat,
+message, rename, delete) is appended to chat_history.jsonl as one small
+JSON record, so saving a message costs the same however long the history
+gets. On load the journal is replayed on top of the snapshot, and every
+COMPACT_EVERY records it is folded back into a fresh snapshot.
+
+Journal records:
+  {"seq": 1, "op": "create",  "chat": {"id", "title", "timestamp", "messages"}}
+  {"seq": 2, "op": "message", "chat_id": 0, "msg": {"sender", "message", "timestamp"}}
+  {"seq": 3, "op": "rename",  "chat_id": 0, "title": "..."}
+  {"seq": 4, "op": "delete",  "chat_id": 0}
+
+With config.json {"storage": {"backend": "sqlite"}} chats live in
+chat_history.db instead (WAL mode, stable chat ids, messages indexed by
+chat and time). The existing JSON history is imported into it once, the
+first time the database is opened.
+
+Both stores can be searched with ChatHistoryManager.search(): SQLite through
+an FTS5 index kept in sync by triggers, JSON through an in-memory inverted
+index that add_message() updates as it goes.
+"""
+
+import bisect
+import json
+import math
+import os
+import re
+import sqlite3
+from collections import Counter
+from datetime import datetime
+
+
+CONFIG_FILE  = "config.json"
+HISTORY_FILE = "chat_history.json"
+JOURNAL_FILE = "chat_history.jsonl"
+DB_FILE      = "chat_history.db"
+MEMORY_FILE  = "riko_memory.json"
+
+# Journal records written before they are folded into a new snapshot
+COMPACT_EVERY = 500
+
+# Characters of context shown on each side of a search hit
+SNIPPET_RADIUS = 40
+
+# Most words a trailing search prefix expands to
+PREFIX_TERMS = 50
+
+WORD_RE = re.compile(r"\w+")
+
+
+def tokenize(text):
+    return WORD_RE.findall(text.lower())
+
+
+def make_snippet(text, terms):
+    """Cut a short excerpt of `text` around the first query term it contains."""
+    lower = text.lower()
+    hits  = [i for i in (lower.find(t) for t in terms) if i >= 0]
+    start = max(0, min(hits) - SNIPPET_RADIUS) if hits else 0
+    end   = min(len(text), start + 2 * SNIPPET_RADIUS + 20)
+    snippet = " ".join(text[start:end].split())
+    return ("…" if start > 0 else "") + snippet + ("…" if end < len(text) else "")
+
+
+class InvertedIndex:
+    """Word → message postings over the JSON history, for ranked search.
+
+    Each message gets an integer doc number pointing at its (chat_id,
+    message index). Adding a message is incremental; deleting a chat
+    renumbers ids, so it only marks the index stale and it is rebuilt on
+    the next search.
+    """
+
+    def __init__(self):
+        self.postings = {}       # term -> {doc: term count}
+        self.docs     = []       # doc -> (chat_id, msg_idx)
+        self.lengths  = []       # doc -> number of terms
+        self.vocab    = []       # sorted terms, for prefix matches
+        self.stale    = True
+
+    def rebuild(self, chats):
+        self.postings.clear()
+        self.docs.clear()
+        self.lengths.clear()
+        for chat in chats:
+            for i, msg in enumerate(chat["messages"]):
+                self.add(chat["id"], i, msg["message"])
+        self.vocab = sorted(self.postings)
+        self.stale = False
+
+    def add(self, chat_id, msg_idx, text):
+        terms = tokenize(text)
+        doc = len(self.docs)
+        self.docs.append((chat_id, msg_idx))
+        self.lengths.append(len(terms))
+        for term, count in Counter(terms).items():
+            postings = self.postings.get(term)
+            if postings is None:
+                postings = self.postings[term] = {}
+                if not self.stale:
+                    bisect.insort(self.vocab, term)
+            postings[doc] = count
+
+    def expand(self, term):
+        """Indexed terms starting with `term`, the most common PREFIX_TERMS of them."""
+        i = bisect.bisect_left(self.vocab, term)
+        matches = []
+        while i < len(self.vocab) and self.vocab[i].startswith(term):
+            matches.append(self.vocab[i])
+            i += 1
+        if len(matches) > PREFIX_TERMS:
+            matches.sort(key=lambda t: len(self.postings[t]), reverse=True)
+            del matches[PREFIX_TERMS:]
+        return matches
+
+    def search(self, terms, limit):
+        """Messages containing every term (the last one as a prefix), best tf-idf first."""
+        total = len(self.docs) or 1
+        scored = None
+        for n, term in enumerate(terms):
+            variants = self.expand(term) if n == len(terms) - 1 else [term]
+            term_scores = {}
+            for variant in variants:
+                postings = self.postings.get(variant, {})
+                idf = math.log(1 + total / (1 + len(postings)))
+                for doc, count in postings.items():
+                    if scored is None or doc in scored:
+                        term_scores[doc] = term_scores.get(doc, 0.0) + idf * count / (self.lengths[doc] + 1)
+            if scored is None:
+                scored = term_scores
+            else:
+                scored = {k: v + term_scores[k] for k, v in scored.items() if k in term_scores}
+            if not scored:
+                return []
+        best = sorted(scored.items(), key=lambda kv: kv[1], reverse=True)[:limit]
+        return [(self.docs[doc], score) for doc, score in best]
+
+
+def get_storage_backend():
+    """Return the chat store selected in config.json: "json" (default) or "sqlite"."""
+    try:
+        with open(CONFIG_FILE, "r") as f:
+            return json.load(f).get("storage", {}).get("backend", "json")
+    except:
+        return "json"
+
+
+# ──────────────────────────────────────────────────────────────────────────────
+#  JSON snapshot + journal store
+# ──────────────────────────────────────────────────────────────────────────────
+
+class JsonChatStore:
+    """Chats in chat_history.json plus the chat_history.jsonl journal; ids are list positions."""
+
+    def __init__(self):
+        self.history_file = HISTORY_FILE
+        self.journal_file = JOURNAL_FILE
+        self.seq          = 0     # last journal record applied
+        self.pending      = 0     # journal records since the last snapshot
+        self.index        = InvertedIndex()
+        self.history      = self.load_history()
+
+    # ── loading ──────────────────────────────────────────────────────────────
+
+    def load_history(self):
+        history = {"chats": []}
+        if os.path.exists(self.history_file):
+            try:
+                with open(self.history_file, "r") as f:
+                    data = json.load(f)
+                if "chats" in data:
+                    history = data
+            except:
+                pass
+
+        self.seq = history.pop("journal_seq", 0)
+        self.pending = 0
+        self._replay(history)
+        return history
+
+    def _replay(self, history):
+        """Apply the journal on top of the snapshot, dropping a torn last record."""
+        if not os.path.exists(self.journal_file):
+            return
+
+        valid = 0
+        with open(self.journal_file, "rb") as f:
+            for raw in f:
+                if not raw.endswith(b"\n"):
+                    break                       # write cut short by a crash
+                try:
+                    record = json.loads(raw.decode("utf-8"))
+                except ValueError:
+                    break
+                valid += len(raw)
+                self.pending += 1
+                # Records already in the snapshot (crash during compaction) are skipped
+                if record.get("seq", 0) > self.seq:
+                    self._apply(history, record)
+                    self.seq = record["seq"]
+
+        if valid < os.path.getsize(self.journal_file):
+            # Cut the torn tail so new records start on a clean line
+            with open(self.journal_file, "r+b") as f:
+                f.truncate(valid)
+
+    @staticmethod
+    def _apply(history, record):
+        chats = history["chats"]
+        op    = record.get("op")
+        if op == "create":
+            chats.append(record["chat"])
+        elif op == "message":
+            chats[record["chat_id"]]["messages"].append(record["msg"])
+        elif op == "rename":
+            chats[record["chat_id"]]["title"] = record["title"]
+        elif op == "delete":
+            chats.pop(record["chat_id"])
+            for i, chat in enumerate(chats):
+                chat["id"] = i
+
+    # ── saving ───────────────────────────────────────────────────────────────
+
+    def _commit(self, record):
+        """Apply one change in memory and append it to the journal."""
+        self.seq += 1
+        record["seq"] = self.seq
+        self._apply(self.history, record)
+        self._update_index(record)
+
+        try:
+            with open(self.journal_file, "a", encoding="utf-8") as f:
+                f.write(json.dumps(record) + "\n")
+        except Exception as e:
+            print(f"Error saving history: {e}")
+            return
+
+        self.pending += 1
+        if self.pending >= COMPACT_EVERY:
+            self.save_history()
+
+    def _update_index(self, record):
+        if self.index.stale:
+            return
+        if record["op"] == "message":
+            chat_id = record["chat_id"]
+            msg_idx = len(self.history["chats"][chat_id]["messages"]) - 1
+            self.index.add(chat_id, msg_idx, record["msg"]["message"])
+        elif record["op"] == "delete":
+            self.index.stale = True
+
+    def save_history(self):
+        """Write a full snapshot (atomically) and start a new, empty journal."""
+        try:
+            snapshot = dict(self.history, journal_seq=self.seq)
+            tmp_file = self.history_file + ".tmp"
+            with open(tmp_file, "w") as f:
+                json.dump(snapshot, f, indent=2)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp_file, self.history_file)
+
+            open(self.journal_file, "w").close()
+            self.pending = 0
+        except Exception as e:
+            print(f"Error saving history: {e}")
+
+    # ── chats ────────────────────────────────────────────────────────────────
+
+    def create_chat(self):
+        chat = {
+            "id": len(self.history["chats"]),
+            "title": f"Chat {len(self.history['chats']) + 1}",
+            "timestamp": datetime.now().isoformat(),
+            "messages": []
+        }
+        self._commit({"op": "create", "chat": chat})
+        return chat["id"]
+
+    def add_message(self, chat_id, sender, message):
+        if chat_id < len(self.history["chats"]):
+            self._commit({
+                "op": "message", "chat_id": chat_id,
+                "msg": {
+                    "sender": sender, "message": message,
+                    "timestamp": datetime.now().isoformat()
+                }
+            })
+            if sender == "You" and len(self.history["chats"][chat_id]["messages"]) <= 2:
+                title = message[:30] + ("..." if len(message) > 30 else "")
+                self._commit({"op": "rename", "chat_id": chat_id, "title": title})
+
+    def get_chat(self, chat_id):
+        if chat_id < len(self.history["chats"]):
+            return self.history["chats"][chat_id]
+        return None
+
+    def get_title(self, chat_id):
+        chat = self.get_chat(chat_id)
+        return chat["title"] if chat else None
+
+    def get_messages(self, chat_id, before, limit):
+        chat = self.get_chat(chat_id)
+        if chat is None:
+            return None
+        messages = chat["messages"]
+        end   = len(messages) if before is None else min(before, len(messages))
+        start = max(0, end - limit)
+        return start, messages[start:end]
+
+    def delete_chat(self, chat_id):
+        if chat_id < len(self.history["chats"]):
+            self._commit({"op": "delete", "chat_id": chat_id})
+            return True
+        return False
+
+    def get_all_chats(self):
+        return self.history["chats"]
+
+    def search(self, query, limit):
+        terms = tokenize(query)
+        if not terms:
+            return []
+        if self.index.stale:
+            self.index.rebuild(self.history["chats"])
+
+        results = []
+        for (chat_id, msg_idx), score in self.index.search(terms, limit):
+            chat = self.history["chats"][chat_id]
+            msg  = chat["messages"][msg_idx]
+            results.append({
+                "chat_id": chat_id, "title": chat["title"],
+                "sender": msg["sender"], "timestamp": msg.get("timestamp", ""),
+                "snippet": make_snippet(msg["message"], terms), "score": score
+            })
+        return results
+
+
+# ──────────────────────────────────────────────────────────────────────────────
+#  SQLite store
+# ──────────────────────────────────────────────────────────────────────────────
+
+class SQLiteChatStore:
+    """Chats in chat_history.db; ids are stable and survive deletes."""
+
+    SCHEMA = """
+    CREATE TABLE IF NOT EXISTS chats (
+        id        INTEGER PRIMARY KEY AUTOINCREMENT,
+        title     TEXT NOT NULL,
+        timestamp TEXT NOT NULL
+    );
+    CREATE TABLE IF NOT EXISTS messages (
+        id      INTEGER PRIMARY KEY AUTOINCREMENT,
+        chat_id INTEGER NOT NULL REFERENCES chats(id) ON DELETE CASCADE,
+        sender  TEXT NOT NULL,
+        message TEXT NOT NULL,
+        ts      TEXT NOT NULL
+    );
+    CREATE INDEX IF NOT EXISTS messages_chat_ts ON messages(chat_id, ts);
+    CREATE TABLE IF NOT EXISTS meta (
+        key   TEXT PRIMARY KEY,
+        value TEXT
+    );
+    """
+
+    FTS_SCHEMA = """
+    CREATE VIRTUAL TABLE messages_fts USING fts5(message, content='messages', content_rowid='id');
+    CREATE TRIGGER messages_fts_ai AFTER INSERT ON messages BEGIN
+        INSERT INTO messages_fts(rowid, message) VALUES (new.id, new.message);
+    END;
+    CREATE TRIGGER messages_fts_ad AFTER DELETE ON messages BEGIN
+        INSERT INTO messages_fts(messages_fts, rowid, message) VALUES ('delete', old.id, old.message);
+    END;
+    INSERT INTO messages_fts(messages_fts) VALUES ('rebuild');
+    """
+
+    def __init__(self, db_file=DB_FILE):
+        self.db_file = db_file
+        self.db = sqlite3.connect(db_file)
+        self.db.row_factory = sqlite3.Row
+        self.db.execute("PRAGMA journal_mode=WAL")
+        self.db.execute("PRAGMA synchronous=NORMAL")
+        self.db.execute("PRAGMA foreign_keys=ON")
+        self.db.executescript(self.SCHEMA)
+        self.has_fts = self._ensure_fts()
+        self._import_json_once()
+
+    def _ensure_fts(self):
+        """Create the FTS5 index (indexing existing messages) if SQLite supports it."""
+        if self.db.execute("SELECT 1 FROM sqlite_master WHERE name = 'messages_fts'").fetchone():
+            return True
+        try:
+            with self.db:
+                self.db.executescript(self.FTS_SCHEMA)
+            return True
+        except sqlite3.OperationalError as e:
+            print(f"FTS5 unavailable, search will scan messages: {e}")
+            return False
+
+    def _import_json_once(self):
+        """Copy the JSON history (snapshot + journal) into an empty database, once."""
+        if self.db.execute("SELECT 1 FROM meta WHERE key = 'imported_json'").fetchone():
+            return
+
+        chats = JsonChatStore().get_all_chats() if os.path.exists(HISTORY_FILE) \
+            or os.path.exists(JOURNAL_FILE) else []
+        with self.db:
+            for chat in chats:
+                cur = self.db.execute(
+                    "INSERT INTO chats (title, timestamp) VALUES (?, ?)",
+                    (chat.get("title", "Chat"), chat.get("timestamp", datetime.now().isoformat()))
+                )
+                self.db.executemany(
+                    "INSERT INTO messages (chat_id, sender, message, ts) VALUES (?, ?, ?, ?)",
+                    [(cur.lastrowid, m.get("sender", "Riko"), m.get("message", ""), m.get("timestamp", ""))
+                     for m in chat.get("messages", [])]
+                )
+            self.db.execute("INSERT INTO meta (key, value) VALUES ('imported_json', ?)",
+                            (datetime.now().isoformat(),))
+        if chats:
+            print(f"Imported {len(chats)} chats from {HISTORY_FILE} into {self.db_file}")
+
+    def create_chat(self):
+        with self.db:
+            cur = self.db.execute(
+                "INSERT INTO chats (title, timestamp) VALUES ('', ?)", (datetime.now().isoformat(),)
+            )
+            chat_id = cur.lastrowid
+            count = self.db.execute("SELECT COUNT(*) FROM chats").fetchone()[0]
+            self.db.execute("UPDATE chats SET title = ? WHERE id = ?", (f"Chat {count}", chat_id))
+        return chat_id
+
+    def add_message(self, chat_id, sender, message):
+        with self.db:
+            if not self.db.execute("SELECT 1 FROM chats WHERE id = ?", (chat_id,)).fetchone():
+                return
+            self.db.execute(
+                "INSERT INTO messages (chat_id, sender, message, ts) VALUES (?, ?, ?, ?)",
+                (chat_id, sender, message, datetime.now().isoformat())
+            )
+            if sender == "You":
+                count = self.db.execute(
+                    "SELECT COUNT(*) FROM (SELECT 1 FROM messages WHERE chat_id = ? LIMIT 3)", (chat_id,)
+                ).fetchone()[0]
+                if count <= 2:
+                    title = message[:30] + ("..." if len(message) > 30 else "")
+                    self.db.execute("UPDATE chats SET title = ? WHERE id = ?", (title, chat_id))
+
+    def get_chat(self, chat_id):
+        row = self.db.execute("SELECT id, title, timestamp FROM chats WHERE id = ?", (chat_id,)).fetchone()
+        if row is None:
+            return None
+        chat = dict(row)
+        chat["messages"] = [
+            {"sender": m["sender"], "message": m["message"], "timestamp": m["ts"]}
+            for m in self.db.execute(
+                "SELECT sender, message, ts FROM messages WHERE chat_id = ? ORDER BY ts, id", (chat_id,)
+            )
+        ]
+        return chat
+
+    def get_title(self, chat_id):
+        row = self.db.execute("SELECT title FROM chats WHERE id = ?", (chat_id,)).fetchone()
+        return row["title"] if row else None
+
+    def get_messages(self, chat_id, before, limit):
+        if not self.db.execute("SELECT 1 FROM chats WHERE id = ?", (chat_id,)).fetchone():
+            return None
+        if before is None:
+            before = self.db.execute(
+                "SELECT COUNT(*) FROM messages WHERE chat_id = ?", (chat_id,)
+            ).fetchone()[0]
+        start = max(0, before - limit)
+        rows = self.db.execute(
+            "SELECT sender, message, ts FROM messages WHERE chat_id = ? "
+            "ORDER BY ts, id LIMIT ? OFFSET ?",
+            (chat_id, before - start, start)
+        )
+        return start, [{"sender": m["sender"], "message": m["message"], "timestamp": m["ts"]} for m in rows]
+
+    def delete_chat(self, chat_id):
+        with self.db:
+            return self.db.execute("DELETE FROM chats WHERE id = ?", (chat_id,)).rowcount > 0
+
+    def get_all_chats(self):
+        """Chat summaries (id, title, timestamp), oldest first; messages are not loaded."""
+        return [dict(row) for row in self.db.execute("SELECT id, title, timestamp FROM chats ORDER BY id")]
+
+    def search(self, query, limit):
+        terms = tokenize(query)
+        if not terms:
+            return []
+
+        if self.has_fts:
+            # Every word must match; the last one may be unfinished (prefix match)
+            match = " ".join(f'"{t}"' for t in terms) + "*"
+            rows = self.db.execute(
+                "SELECT m.chat_id, c.title, m.sender, m.ts, m.message, bm25(messages_fts) AS rank "
+                "FROM messages_fts "
+                "JOIN messages m ON m.id = messages_fts.rowid "
+                "JOIN chats c ON c.id = m.chat_id "
+                "WHERE messages_fts MATCH ? ORDER BY rank LIMIT ?",
+                (match, limit)
+            ).fetchall()
+        else:
+            where = " AND ".join("m.message LIKE ?" for _ in terms)
+            rows = self.db.execute(
+                "SELECT m.chat_id, c.title, m.sender, m.ts, m.message, 0 AS rank "
+                "FROM messages m JOIN chats c ON c.id = m.chat_id "
+                f"WHERE {where} ORDER BY m.ts DESC LIMIT ?",
+                [f"%{t}%" for t in terms] + [limit]
+            ).fetchall()
+
+        return [{
+            "chat_id": row["chat_id"], "title": row["title"],
+            "sender": row["sender"], "timestamp": row["ts"],
+            "snippet": make_snippet(row["message"], terms), "score": -row["rank"]
+        } for row in rows]
+
+    def close(self):
+        self.db.close()
+
+
+# ──────────────────────────────────────────────────────────────────────────────
+#  Manager used by the GUIs
+# ──────────────────────────────────────────────────────────────────────────────
+
+class ChatHistoryManager:
+    def __init__(self, backend=None):
+        self.backend     = backend or get_storage_backend()
+        self.memory_file = MEMORY_FILE
+        self.store       = SQLiteChatStore() if self.backend == "sqlite" else JsonChatStore()
+
+    def create_chat(self):
+        return self.store.create_chat()
+
+    def add_message(self, chat_id, sender, message):
+        self.store.add_message(chat_id, sender, message)
+
+    def get_chat(self, chat_id):
+        return self.store.get_chat(chat_id)
+
+    def get_title(self, chat_id):
+        return self.store.get_title(chat_id)
+
+    def get_messages(self, chat_id, before=None, limit=50):
+        """One page of a chat: the `limit` messages just before index `before`.
+
+        `before=None` means the end of the chat. Returns (start, messages),
+        where `start` is the index of the first message returned and the
+        `before` to pass for the next older page, or None if the chat does
+        not exist.
+        """
+        return self.store.get_messages(chat_id, before, limit)
+
+    def delete_chat(self, chat_id, riko=None):
+        """Delete a chat, clear Riko's conversation memory and stop recalling the chat.
+
+        Pass the running Riko, if there is one: its memory is cleared and
+        written through its own writer, which would otherwise write the old
+        conversation back over the file, and its recall index forgets the chat.
+        """
+        if self.store.delete_chat(chat_id):
+            renumber = self.backend != "sqlite"      # JSON ids are positions
+            if riko is not None:
+                riko.clear_memory()
+                riko.flush_memory()
+                riko.forget_chat(chat_id, renumber)
+            else:
+                self._clear_riko_memory()
+                self._forget_recall(chat_id, renumber)
+
+    def id_after_delete(self, chat_id, deleted_id):
+        """The id chat `chat_id` has once `deleted_id` is deleted; None for that chat itself.
+
+        The JSON store numbers chats by position, so the later ones move down by one.
+        """
+        if chat_id is None or chat_id == deleted_id:
+            return None
+        if self.backend != "sqlite" and chat_id > deleted_id:
+            return chat_id - 1
+        return chat_id
+
+    def _forget_recall(self, chat_id, renumber):
+        try:
+            from recall import forget_chat
+        except ImportError:
+            return
+        try:
+            forget_chat(chat_id, renumber)
+        except sqlite3.Error as e:
+            print(f"Error forgetting chat in recall: {e}")
+
+    def _clear_riko_memory(self):
+        try:
+            if os.path.exists(self.memory_file):
+                with open(self.memory_file, "r") as f:
+                    memory = json.load(f)
+                user_name = memory.get("user_name")
+                memory["last_conversation"] = []
+                memory["summary"] = ""
+                memory.setdefault("stats", {})["total_messages"] = 0
+                if user_name:
+                    memory["user_name"] = user_name
+                tmp_file = self.memory_file + ".tmp"
+                with open(tmp_file, "w") as f:
+                    json.dump(memory, f)
+                    f.flush()
+                    os.fsync(f.fileno())
+                os.replace(tmp_file, self.memory_file)
+        except Exception as e:
+            print(f"Error clearing memory: {e}")
+
+    def get_all_chats(self):
+        return self.store.get_all_chats()
+
+    def search(self, query, limit=20):
+        """Search every chat's messages.
+
+        Returns up to `limit` hits, best first, as dicts with chat_id, title,
+        sender, timestamp, snippet and score.
+        """
+        return self.store.search(query, limit)
@@ -1,15 +1,22 @@
 import gi
 gi.require_version("Gtk", "4.0")
-from gi.repository import Gtk, GLib, Pango
+from gi.repository import Gtk, Gio, GLib, GObject, Pango
 import json
 import os
 import threading
 from datetime import datetime
-from riko import Riko
+from chat_history import ChatHistoryManager
+# riko (and through it the Groq SDK and NumPy) is imported on a background
+# thread once the window is up; see RikoGUI._warm_up()
 
 
 CONFIG_FILE = "config.json"
 
+# Messages shown when a chat is opened; older pages load when scrolled to the top
+CHAT_PAGE_SIZE = 50
+# Messages inserted per idle callback while a page is being filled in
+FILL_CHUNK = 10
+
 
 # ──────────────────────────────────────────────────────────────────────────────
 #  Helpers
@@ -33,87 +40,6 @@ def apply_active_key(config):
         os.environ.pop("GROQ_API_KEY", None)
 
 
-# ──────────────────────────────────────────────────────────────────────────────
-#  Chat history
-# ──────────────────────────────────────────────────────────────────────────────
-
-class ChatHistoryManager:
-    def __init__(self):
-        self.history_file = "chat_history.json"
-        self.memory_file  = "riko_memory.json"
-        self.history      = self.load_history()
-
-    def load_history(self):
-        if os.path.exists(self.history_file):
-            try:
-                with open(self.history_file, "r") as f:
-                    data = json.load(f)
-                return data if "chats" in data else {"chats": []}
-            except:
-                return {"chats": []}
-        return {"chats": []}
-
-    def save_history(self):
-        try:
-            with open(self.history_file, "w") as f:
-                json.dump(self.history, f, indent=2)
-        except Exception as e:
-            print(f"Error saving history: {e}")
-
-    def create_chat(self):
-        chat = {
-            "id": len(self.history["chats"]),
-            "title": f"Chat {len(self.history['chats']) + 1}",
-            "timestamp": datetime.now().isoformat(),
-            "messages": []
-        }
-        self.history["chats"].append(chat)
-        self.save_history()
-        return chat["id"]
-
-    def add_message(self, chat_id, sender, message):
-        if chat_id < len(self.history["chats"]):
-            self.history["chats"][chat_id]["messages"].append({
-                "sender": sender, "message": message,
-                "timestamp": datetime.now().isoformat()
-            })
-            if sender == "You" and len(self.history["chats"][chat_id]["messages"]) <= 2:
-                title = message[:30] + ("..." if len(message) > 30 else "")
-                self.history["chats"][chat_id]["title"] = title
-            self.save_history()
-
-    def get_chat(self, chat_id):
-        if chat_id < len(self.history["chats"]):
-            return self.history["chats"][chat_id]
-        return None
-
-    def delete_chat(self, chat_id):
-        if chat_id < len(self.history["chats"]):
-            self.history["chats"].pop(chat_id)
-            for i, chat in enumerate(self.history["chats"]):
-                chat["id"] = i
-            self.save_history()
-            self._clear_riko_memory()
-
-    def _clear_riko_memory(self):
-        try:
-            if os.path.exists(self.memory_file):
-                with open(self.memory_file, "r") as f:
-                    memory = json.load(f)
-                user_name = memory.get("user_name")
-                memory["last_conversation"] = []
-                memory.setdefault("stats", {})["total_messages"] = 0
-                if user_name:
-                    memory["user_name"] = user_name
-                with open(self.memory_file, "w") as f:
-                    json.dump(memory, f, indent=2)
-        except Exception as e:
-            print(f"Error clearing memory: {e}")
-
-    def get_all_chats(self):
-        return self.history["chats"]
-
-
 # ──────────────────────────────────────────────────────────────────────────────
 #  Key row widget  (one per saved API key)
 # ──────────────────────────────────────────────────────────────────────────────
@@ -182,6 +108,20 @@ class KeyRow(Gtk.Box):
         return self.radio.get_active()
 
 
+# ──────────────────────────────────────────────────────────────────────────────
+#  Chat list item  (one per row of the sidebar list model)
+# ──────────────────────────────────────────────────────────────────────────────
+
+class ChatItem(GObject.Object):
+    """A chat in the sidebar; search hits also carry a snippet."""
+
+    def __init__(self, chat_id, title, snippet=""):
+        super().__init__()
+        self.chat_id = chat_id
+        self.title   = title
+        self.snippet = snippet
+
+
 # ──────────────────────────────────────────────────────────────────────────────
 #  Settings window
 # ──────────────────────────────────────────────────────────────────────────────
@@ -529,7 +469,12 @@ class SettingsWindow(Gtk.Window):
         except:
             return
 
-        files = ["chat_history.json", "riko_memory.json", "memory.json"]
+        files = [
+            "chat_history.json", "chat_history.jsonl",
+            "chat_history.db", "chat_history.db-wal", "chat_history.db-shm",
+            "response_cache.db", "recall.db",
+            "riko_memory.json", "memory.json",
+        ]
         wiped = []
         for fname in files:
             if os.path.exists(fname):
@@ -605,10 +550,16 @@ class RikoGUI(Gtk.ApplicationWindow):
         self.config      = self.load_config()
         self.chat_history = ChatHistoryManager()
         self.riko        = None
-        self._init_riko()
+        self._riko_lock  = threading.Lock()
 
         self.current_chat_id = None
         self.is_thinking     = False
+        self._stream_chat_id = None
+        self._stream_parts   = []
+        self._stream_live    = False
+        self._oldest_loaded  = 0      # index of the first message shown
+        self._page_loading   = False
+        self._page_generation = 0
 
         self.setup_ui()
         self.apply_theme()
@@ -618,6 +569,9 @@ class RikoGUI(Gtk.ApplicationWindow):
         else:
             self.load_chat(self.chat_history.get_all_chats()[-1]["id"])
 
+        # Idle callbacks run after the first frame is drawn
+        GLib.idle_add(self._warm_up)
+
     # ── config ───────────────────────────────────────────────────────────────
 
     def load_config(self):
@@ -650,9 +604,23 @@ class RikoGUI(Gtk.ApplicationWindow):
 
     # ── Riko core ────────────────────────────────────────────────────────────
 
+    def _warm_up(self):
+        """Create Riko and the Groq client off the main thread, so the first send is quick."""
+        def work():
+            self._init_riko()
+            if self.riko is not None:
+                from riko import get_client
+                get_client()
+        threading.Thread(target=work, daemon=True).start()
+        return False
+
     def _init_riko(self):
-        if os.getenv("GROQ_API_KEY"):
+        # Also called on send, in case the warm-up hasn't finished (it then waits for it)
+        with self._riko_lock:
+            if self.riko is not None or not os.getenv("GROQ_API_KEY"):
+                return
             try:
+                from riko import Riko
                 prompt = self.config.get("system_prompt", "") if hasattr(self, "config") else ""
                 self.riko = Riko(system_prompt=prompt or None)
             except Exception as e:
@@ -689,13 +657,23 @@ class RikoGUI(Gtk.ApplicationWindow):
         history_label.set_halign(Gtk.Align.START)
         sidebar.append(history_label)
 
+        self.search_entry = Gtk.SearchEntry()
+        self.search_entry.set_placeholder_text("Search chats...")
+        self.search_entry.connect("search-changed", lambda w: self.refresh_chat_list())
+        sidebar.append(self.search_entry)
+
         scroll = Gtk.ScrolledWindow()
         scroll.set_vexpand(True)
         scroll.set_policy(Gtk.PolicyType.NEVER, Gtk.PolicyType.AUTOMATIC)
         sidebar.append(scroll)
 
-        self.chat_list_box = Gtk.Box(orientation=Gtk.Orientation.VERTICAL, spacing=5)
-        scroll.set_child(self.chat_list_box)
+        # Only the visible rows get widgets; changes go through the model
+        factory = Gtk.SignalListItemFactory()
+        factory.connect("setup", self._on_chat_row_setup)
+        factory.connect("bind",  self._on_chat_row_bind)
+        self.chat_store = Gio.ListStore(item_type=ChatItem)
+        self.chat_list_view = Gtk.ListView(model=Gtk.NoSelection(model=self.chat_store), factory=factory)
+        scroll.set_child(self.chat_list_view)
 
         self._setup_personality_section(sidebar)
 
@@ -784,6 +762,11 @@ class RikoGUI(Gtk.ApplicationWindow):
         header_box.append(self.key_indicator)
         self._update_key_indicator()
 
+        # Rolling reply latency, filled in once the first reply has finished
+        self.metrics_label = Gtk.Label(label="")
+        self.metrics_label.add_css_class("dim-label")
+        header_box.append(self.metrics_label)
+
         self.status_label = Gtk.Label(label="● Ready")
         self.status_label.add_css_class("status-ready")
         header_box.append(self.status_label)
@@ -791,6 +774,7 @@ class RikoGUI(Gtk.ApplicationWindow):
         scroll = Gtk.ScrolledWindow()
         scroll.set_vexpand(True)
         scroll.set_policy(Gtk.PolicyType.NEVER, Gtk.PolicyType.AUTOMATIC)
+        scroll.connect("edge-reached", self.on_chat_edge_reached)
         chat_box.append(scroll)
 
         self.chat_view = Gtk.TextView()
@@ -895,85 +879,248 @@ class RikoGUI(Gtk.ApplicationWindow):
         lang = self.config.get("language", "en")
         prefix = f"[Respond in {lang_names.get(lang, 'English')}] " if lang != "en" else ""
 
-        def get_response():
+        self.riko.set_chat(self.current_chat_id)
+        self.begin_response()
+
+        # Runs on Riko's shared event loop; the UI is only touched via idle_add
+        async def get_response():
             try:
-                reply = self.riko.reply(prefix + message)
-                GLib.idle_add(self.display_response, reply)
+                async for delta in self.riko.areply_stream(prefix + message):
+                    GLib.idle_add(self.display_response, delta)
             except Exception as e:
                 GLib.idle_add(self.display_response, f"❌ Error: {e}")
+            GLib.idle_add(self.finish_response)
+
+        from riko import run_async
+        run_async(get_response())
+
+    def begin_response(self):
+        """Write Riko's header line; the reply text is streamed in after it."""
+        self._stream_chat_id = self.current_chat_id
+        self._stream_parts   = []
+        self._stream_live    = True
 
-        threading.Thread(target=get_response, daemon=True).start()
+        end_iter  = self.chat_buffer.get_end_iter()
+        timestamp = datetime.now().strftime("%H:%M")
+        self.chat_buffer.insert_with_tags_by_name(end_iter, f"[{timestamp}] ", "timestamp")
+        end_iter = self.chat_buffer.get_end_iter()
+        self.chat_buffer.insert_with_tags_by_name(end_iter, "Riko: ", "riko")
+
+    def display_response(self, delta):
+        """Append one streamed chunk of Riko's reply to the chat view."""
+        self._stream_parts.append(delta)
+        # The user may have switched chats while the reply is streaming
+        if self._stream_live:
+            end_iter = self.chat_buffer.get_end_iter()
+            self.chat_buffer.insert_with_tags_by_name(end_iter, delta, "content")
+            mark = self.chat_buffer.create_mark(None, self.chat_buffer.get_end_iter(), False)
+            self.chat_view.scroll_to_mark(mark, 0.0, True, 0.0, 1.0)
+        return False
 
-    def display_response(self, reply):
+    def finish_response(self):
+        """Close the streamed reply and save it once the stream has ended."""
         self.is_thinking = False
         self.status_label.set_label("● Ready")
         self.status_label.remove_css_class("status-thinking")
         self.status_label.add_css_class("status-ready")
-        self.add_chat_message("Riko", reply)
+
+        if self._stream_live:
+            end_iter = self.chat_buffer.get_end_iter()
+            self.chat_buffer.insert_with_tags_by_name(end_iter, "\n\n", "content")
+        self._stream_live = False
+
+        reply = "".join(self._stream_parts)
+        if reply and self._stream_chat_id is not None:      # None: its chat was deleted meanwhile
+            self.chat_history.add_message(self._stream_chat_id, "Riko", reply)
         self.update_chat_title()
+        self._update_metrics_label()
         return False
 
+    def _update_metrics_label(self):
+        """Show rolling reply latency in the header; the last reply's details go in its tooltip."""
+        if self.riko is None:
+            return
+        from riko import format_record, format_summary
+        summary = self.riko.metrics()
+        self.metrics_label.set_label(format_summary(summary))
+        self.metrics_label.set_tooltip_text(f"Last reply: {format_record(summary['last'])}" if summary["last"] else None)
+
     # ── Chat list ────────────────────────────────────────────────────────────
 
     def refresh_chat_list(self):
-        child = self.chat_list_box.get_first_child()
-        while child:
-            nxt = child.get_next_sibling()
-            self.chat_list_box.remove(child)
-            child = nxt
-        for chat in reversed(self.chat_history.get_all_chats()):
-            self._add_chat_to_list(chat)
-
-    def _add_chat_to_list(self, chat):
+        """Reload the whole list: every chat, newest first, or the search hits."""
+        query = self.search_entry.get_text().strip()
+        if query:
+            items = [ChatItem(hit["chat_id"], hit["title"], f"{hit['sender']}: {hit['snippet']}")
+                     for hit in self.chat_history.search(query)]
+        else:
+            items = [ChatItem(chat["id"], chat["title"])
+                     for chat in reversed(self.chat_history.get_all_chats())]
+        self.chat_store.splice(0, self.chat_store.get_n_items(), items)
+
+    def _on_chat_row_setup(self, factory, list_item):
         row = Gtk.Box(orientation=Gtk.Orientation.HORIZONTAL, spacing=5)
         row.set_margin_top(3); row.set_margin_bottom(3)
 
-        btn = Gtk.Button(label=chat["title"][:25])
-        btn.set_hexpand(True)
-        btn.connect("clicked", lambda w: self.load_chat(chat["id"]))
-        if chat["id"] == self.current_chat_id:
-            btn.add_css_class("current-chat")
-        row.append(btn)
+        row.chat_btn = Gtk.Button()
+        row.chat_btn.set_hexpand(True)
+        row.chat_btn.connect("clicked", lambda w: self.load_chat(list_item.get_item().chat_id))
+        row.append(row.chat_btn)
+
+        box = Gtk.Box(orientation=Gtk.Orientation.VERTICAL, spacing=2)
+        row.chat_btn.set_child(box)
+
+        row.title_label = Gtk.Label()
+        row.title_label.set_halign(Gtk.Align.START)
+        box.append(row.title_label)
+
+        row.snippet_label = Gtk.Label()
+        row.snippet_label.add_css_class("trait-value")
+        row.snippet_label.set_halign(Gtk.Align.START)
+        row.snippet_label.set_wrap(True)
+        row.snippet_label.set_xalign(0)
+        box.append(row.snippet_label)
+
+        row.del_btn = Gtk.Button(label="🗑")
+        row.del_btn.connect("clicked", lambda w: self.delete_chat(list_item.get_item().chat_id))
+        row.append(row.del_btn)
+
+        list_item.set_child(row)
+
+    def _on_chat_row_bind(self, factory, list_item):
+        item = list_item.get_item()
+        row  = list_item.get_child()
+        row.title_label.set_label(item.title[:25])
+        row.snippet_label.set_label(item.snippet)
+        row.snippet_label.set_visible(bool(item.snippet))
+        row.del_btn.set_visible(not item.snippet)
+        if item.chat_id == self.current_chat_id:
+            row.chat_btn.add_css_class("current-chat")
+        else:
+            row.chat_btn.remove_css_class("current-chat")
 
-        del_btn = Gtk.Button(label="🗑")
-        del_btn.connect("clicked", lambda w: self.delete_chat(chat["id"]))
-        row.append(del_btn)
+    def _find_chat_item(self, chat_id):
+        for pos in range(self.chat_store.get_n_items()):
+            if self.chat_store.get_item(pos).chat_id == chat_id:
+                return pos
+        return None
+
+    def _rebind_chat_item(self, chat_id):
+        pos = self._find_chat_item(chat_id)
+        if pos is not None:
+            self.chat_store.items_changed(pos, 1, 1)
+
+    def _set_current_chat(self, chat_id):
+        """Switch the current chat and re-highlight just the two affected rows."""
+        previous = self.current_chat_id
+        self.current_chat_id = chat_id
+        self._rebind_chat_item(previous)
+        self._rebind_chat_item(chat_id)
+
+    def _remove_chat_item(self, chat_id):
+        if self.search_entry.get_text().strip():
+            self.refresh_chat_list()
+            return
 
-        self.chat_list_box.append(row)
+        pos = self._find_chat_item(chat_id)
+        if pos is not None:
+            self.chat_store.remove(pos)
+
+        # The JSON store renumbers the chats after a delete; pick up the new ids
+        chats = list(reversed(self.chat_history.get_all_chats()))
+        if len(chats) != self.chat_store.get_n_items():
+            self.refresh_chat_list()
+            return
+        for pos, chat in enumerate(chats):
+            self.chat_store.get_item(pos).chat_id = chat["id"]
 
     def on_new_chat(self, widget):
-        self.current_chat_id = self.chat_history.create_chat()
+        self._stream_live = False
+        self._page_generation += 1
+        self._page_loading = False
+        self._oldest_loaded = 0
+
+        chat_id = self.chat_history.create_chat()
+        if not self.search_entry.get_text().strip():
+            self.chat_store.insert(0, ChatItem(chat_id, self.chat_history.get_title(chat_id)))
+        self._set_current_chat(chat_id)
+
         self.chat_buffer.set_text("")
         greeting = self.config.get("greeting_message", "Hey! I'm Riko. 😊")
         self.add_chat_message("Riko", greeting, is_system=True)
-        self.refresh_chat_list()
         self.update_chat_title()
 
     def load_chat(self, chat_id):
-        self.current_chat_id = chat_id
-        chat = self.chat_history.get_chat(chat_id)
-        if not chat:
+        self._set_current_chat(chat_id)
+        page = self.chat_history.get_messages(chat_id, limit=CHAT_PAGE_SIZE)
+        if page is None:
             return
 
+        self._stream_live = False
+        self._page_generation += 1
         self.chat_buffer.set_text("")
-        for msg in chat["messages"]:
-            end_iter = self.chat_buffer.get_end_iter()
-            ts_parts = msg.get("timestamp", "")[:16].split("T")
-            time_str = ts_parts[1] if len(ts_parts) == 2 else "00:00"
-
-            self.chat_buffer.insert_with_tags_by_name(end_iter, f"[{time_str}] ", "timestamp")
-            sender = msg["sender"]
-            if sender == "You":
-                end_iter = self.chat_buffer.get_end_iter()
-                self.chat_buffer.insert_with_tags_by_name(end_iter, f"{msg['message']}\n\n", "content")
-            else:
-                end_iter = self.chat_buffer.get_end_iter()
-                self.chat_buffer.insert_with_tags_by_name(end_iter, f"{sender}: ", "riko")
-                end_iter = self.chat_buffer.get_end_iter()
-                self.chat_buffer.insert_with_tags_by_name(end_iter, f"{msg['message']}\n\n", "content")
+        self._oldest_loaded, messages = page
+        self._prepend_messages(messages, scroll_to_end=True)
 
         self.update_chat_title()
-        self.refresh_chat_list()
+
+    def on_chat_edge_reached(self, scroll, pos):
+        """Load the previous page of the chat when it is scrolled to the top."""
+        if pos != Gtk.PositionType.TOP or self._page_loading or not self._oldest_loaded:
+            return
+        page = self.chat_history.get_messages(
+            self.current_chat_id, before=self._oldest_loaded, limit=CHAT_PAGE_SIZE
+        )
+        if page:
+            self._oldest_loaded, messages = page
+            self._prepend_messages(messages, scroll_to_end=False)
+
+    def _prepend_messages(self, messages, scroll_to_end):
+        """Insert a page of messages above what is shown, FILL_CHUNK at a time.
+
+        The newest chunk goes in straight away and the rest from idle
+        callbacks, so a long page never blocks the main loop. The view stays
+        on the bottom for a freshly opened chat, and on the previously first
+        message when an older page is added.
+        """
+        buf    = self.chat_buffer
+        anchor = buf.create_mark(None, buf.get_start_iter(), False)
+        chunks = [messages[i:i + FILL_CHUNK] for i in range(0, len(messages), FILL_CHUNK)]
+        generation = self._page_generation
+        self._page_loading = True
+
+        def fill():
+            if generation != self._page_generation:
+                # Another chat was opened in the meantime
+                buf.delete_mark(anchor)
+                return False
+            if chunks:
+                mark = buf.create_mark(None, buf.get_start_iter(), False)
+                for msg in chunks.pop():
+                    self._insert_history_message(mark, msg)
+                buf.delete_mark(mark)
+            self.chat_view.scroll_to_mark(anchor, 0.0, True, 0.0, 1.0 if scroll_to_end else 0.0)
+            if chunks:
+                return True
+            buf.delete_mark(anchor)
+            self._page_loading = False
+            return False
+
+        if fill():
+            GLib.idle_add(fill)
+
+    def _insert_history_message(self, mark, msg):
+        """Insert a saved message at `mark`, which moves past the inserted text."""
+        ts_parts = msg.get("timestamp", "")[:16].split("T")
+        time_str = ts_parts[1] if len(ts_parts) == 2 else "00:00"
+
+        pieces = [(f"[{time_str}] ", "timestamp")]
+        if msg["sender"] != "You":
+            pieces.append((f"{msg['sender']}: ", "riko"))
+        pieces.append((f"{msg['message']}\n\n", "content"))
+
+        for text, tag in pieces:
+            self.chat_buffer.insert_with_tags_by_name(self.chat_buffer.get_iter_at_mark(mark), text, tag)
 
     def delete_chat(self, chat_id):
         dialog = Gtk.AlertDialog()
@@ -987,22 +1134,33 @@ class RikoGUI(Gtk.ApplicationWindow):
     def on_delete_confirm(self, dialog, result, chat_id):
         try:
             if dialog.choose_finish(result) == 1:
-                self.chat_history.delete_chat(chat_id)
-                if chat_id == self.current_chat_id:
+                self.chat_history.delete_chat(chat_id, self.riko)
+                # Ids may have moved down; a reply still streaming must be saved to its chat's new id
+                self.current_chat_id = self.chat_history.id_after_delete(self.current_chat_id, chat_id)
+                self._stream_chat_id = self.chat_history.id_after_delete(self._stream_chat_id, chat_id)
+                self._remove_chat_item(chat_id)
+                if self.current_chat_id is None:
                     self.on_new_chat(None)
-                else:
-                    self.refresh_chat_list()
         except:
             pass
 
     def update_chat_title(self):
-        chat = self.chat_history.get_chat(self.current_chat_id)
-        if chat:
-            self.chat_title_label.set_label(f"💬 {chat['title']}")
+        title = self.chat_history.get_title(self.current_chat_id)
+        if title:
+            self.chat_title_label.set_label(f"💬 {title}")
+
+            # Chats are renamed after their first message
+            pos = self._find_chat_item(self.current_chat_id)
+            if pos is not None and self.chat_store.get_item(pos).title != title:
+                self.chat_store.get_item(pos).title = title
+                self.chat_store.items_changed(pos, 1, 1)
 
     # ── Settings ─────────────────────────────────────────────────────────────
 
     def show_settings(self, widget):
+        # Write memory now, so a reset from the settings isn't overwritten later
+        if self.riko:
+            self.riko.flush_memory()
         SettingsWindow(self, self.config, self.on_settings_saved).present()
 
     def on_settings_saved(self, new_config):
@@ -1010,7 +1168,10 @@ class RikoGUI(Gtk.ApplicationWindow):
         apply_active_key(self.config)
         self.save_config()
         self.apply_theme()
-        self.riko = None          # force re-init with potentially new key
+        with self._riko_lock:     # waits for a warm-up still creating the old one
+            if self.riko:
+                self.riko.close(save=False)
+            self.riko = None      # force re-init with potentially new key
         self._init_riko()
         self._update_banner()
         self._update_key_indicator()
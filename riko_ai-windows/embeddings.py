@@ -0,0 +1,137 @@
+"""
+embeddings.py — Small CPU-only text embeddings and a vector matrix to search them.
+
+Texts become L2-normalised float32 vectors, so a dot product is their cosine
+similarity. The default embedder hashes words, word pairs and character
+trigrams into a fixed number of buckets (the "hashing trick"): it needs only
+NumPy, has no model to download and gives the same vectors in every run. If
+sentence-transformers is installed, a named model can be used instead.
+
+NumPy is optional for Riko as a whole; without it get_embedder() returns None
+and the features built on it switch themselves off.
+"""
+
+import re
+import sys
+import threading
+import zlib
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+
+DEFAULT_DIM = 256
+
+WORD_RE = re.compile(r"\w+")
+
+
+class HashedNgramEmbedder:
+    """Signed feature hashing of words, word bigrams and character trigrams."""
+
+    def __init__(self, dim=DEFAULT_DIM):
+        self.dim = dim
+
+    def features(self, text):
+        words = WORD_RE.findall(text.lower())
+        feats = list(words)
+        feats += [f"{a} {b}" for a, b in zip(words, words[1:])]
+        for word in words:
+            padded = f" {word} "
+            feats += [padded[i:i + 3] for i in range(len(padded) - 2)]
+        return feats
+
+    def embed(self, texts):
+        """One unit vector per text, as an (n, dim) float32 array."""
+        out = np.zeros((len(texts), self.dim), dtype=np.float32)
+        for row, text in enumerate(texts):
+            for feat in self.features(text):
+                h = zlib.crc32(feat.encode("utf-8"))
+                # The top bit picks the sign, so collisions tend to cancel out
+                out[row, h % self.dim] += 1.0 if h & 0x80000000 else -1.0
+        norms = np.linalg.norm(out, axis=1, keepdims=True)
+        norms[norms == 0] = 1.0
+        return out / norms
+
+
+class SentenceEmbedder:
+    """A sentence-transformers model, e.g. "all-MiniLM-L6-v2"."""
+
+    def __init__(self, model_name):
+        from sentence_transformers import SentenceTransformer
+        self.model = SentenceTransformer(model_name, device="cpu")
+        self.dim   = self.model.get_sentence_embedding_dimension()
+
+    def embed(self, texts):
+        return self.model.encode(list(texts), normalize_embeddings=True).astype(np.float32)
+
+
+def get_embedder(model_name=None):
+    """The embedder for `model_name` (hashed n-grams if None), or None without NumPy."""
+    if np is None:
+        return None
+    if model_name:
+        try:
+            return SentenceEmbedder(model_name)
+        except Exception as e:
+            print(f"Embedding model {model_name} unavailable ({e}); using hashed n-grams", file=sys.stderr)
+    return HashedNgramEmbedder()
+
+
+class VectorMatrix:
+    """Unit vectors in one growable NumPy matrix, searched by brute force.
+
+    Rows are only ever appended or overwritten in place, so a row number
+    stays a stable handle for whatever the caller stores next to it.
+    """
+
+    def __init__(self, dim, capacity=1024):
+        self.dim     = dim
+        self.vectors = np.zeros((capacity, dim), dtype=np.float32)
+        self.count   = 0
+        self.lock    = threading.Lock()
+
+    def __len__(self):
+        return self.count
+
+    def add(self, vector):
+        """Append a vector and return its row."""
+        with self.lock:
+            if self.count == len(self.vectors):
+                grown = np.zeros((2 * len(self.vectors), self.dim), dtype=np.float32)
+                grown[:self.count] = self.vectors[:self.count]
+                self.vectors = grown
+            self.vectors[self.count] = vector
+            self.count += 1
+            return self.count - 1
+
+    def replace(self, row, vector):
+        with self.lock:
+            self.vectors[row] = vector
+
+    def search(self, query, k, rows=None):
+        """Top-k rows by cosine similarity to `query`, best first, as (rows, scores).
+
+        `rows` restricts the search to a subset (an array of row numbers).
+        """
+        with self.lock:
+            if rows is None:
+                scores = self.vectors[:self.count] @ query
+            elif len(rows) > self.count // 4:
+                # Cheaper to score everything than to copy out most of the matrix
+                scores = (self.vectors[:self.count] @ query)[rows]
+            else:
+                scores = self.vectors[rows] @ query
+        if len(scores) == 0:
+            return np.zeros(0, dtype=np.int64), scores
+
+        k = min(k, len(scores))
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top])]
+        found = top if rows is None else rows[top]
+        return found, scores[top]
+
+    def clear(self):
+        with self.lock:
+            self.count = 0
@@ -4,7 +4,9 @@ import json
 import os
 import threading
 from datetime import datetime
-from riko import Riko
+from chat_history import ChatHistoryManager
+# riko (and through it the Groq SDK and NumPy) is imported on a background
+# thread once the window is up; see RikoGUI.warm_up()
 
 
 CONFIG_FILE = "config.json"
@@ -32,87 +34,6 @@ def apply_active_key(config):
         os.environ.pop("GROQ_API_KEY", None)
 
 
-# ──────────────────────────────────────────────────────────────────────────────
-#  Chat history
-# ──────────────────────────────────────────────────────────────────────────────
-
-class ChatHistoryManager:
-    def __init__(self):
-        self.history_file = "chat_history.json"
-        self.memory_file  = "riko_memory.json"
-        self.history      = self.load_history()
-
-    def load_history(self):
-        if os.path.exists(self.history_file):
-            try:
-                with open(self.history_file, "r") as f:
-                    data = json.load(f)
-                return data if "chats" in data else {"chats": []}
-            except:
-                return {"chats": []}
-        return {"chats": []}
-
-    def save_history(self):
-        try:
-            with open(self.history_file, "w") as f:
-                json.dump(self.history, f, indent=2)
-        except Exception as e:
-            print(f"Error saving history: {e}")
-
-    def create_chat(self):
-        chat = {
-            "id": len(self.history["chats"]),
-            "title": f"Chat {len(self.history['chats']) + 1}",
-            "timestamp": datetime.now().isoformat(),
-            "messages": []
-        }
-        self.history["chats"].append(chat)
-        self.save_history()
-        return chat["id"]
-
-    def add_message(self, chat_id, sender, message):
-        if chat_id < len(self.history["chats"]):
-            self.history["chats"][chat_id]["messages"].append({
-                "sender": sender, "message": message,
-                "timestamp": datetime.now().isoformat()
-            })
-            if sender == "You" and len(self.history["chats"][chat_id]["messages"]) <= 2:
-                title = message[:30] + ("..." if len(message) > 30 else "")
-                self.history["chats"][chat_id]["title"] = title
-            self.save_history()
-
-    def get_chat(self, chat_id):
-        if chat_id < len(self.history["chats"]):
-            return self.history["chats"][chat_id]
-        return None
-
-    def delete_chat(self, chat_id):
-        if chat_id < len(self.history["chats"]):
-            self.history["chats"].pop(chat_id)
-            for i, chat in enumerate(self.history["chats"]):
-                chat["id"] = i
-            self.save_history()
-            self._clear_riko_memory()
-
-    def _clear_riko_memory(self):
-        try:
-            if os.path.exists(self.memory_file):
-                with open(self.memory_file, "r") as f:
-                    memory = json.load(f)
-                user_name = memory.get("user_name")
-                memory["last_conversation"] = []
-                memory.setdefault("stats", {})["total_messages"] = 0
-                if user_name:
-                    memory["user_name"] = user_name
-                with open(self.memory_file, "w") as f:
-                    json.dump(memory, f, indent=2)
-        except Exception as e:
-            print(f"Error clearing memory: {e}")
-
-    def get_all_chats(self):
-        return self.history["chats"]
-
-
 # ──────────────────────────────────────────────────────────────────────────────
 #  Settings Window
 # ──────────────────────────────────────────────────────────────────────────────
@@ -306,7 +227,12 @@ IMPORTANT:
     def on_reset(self):
         if messagebox.askyesno("Reset Everything?", 
                                "This will permanently delete:\n• All chat history\n• Riko's memory\n\nThis cannot be undone."):
-            files = ["chat_history.json", "riko_memory.json", "memory.json"]
+            files = [
+                "chat_history.json", "chat_history.jsonl",
+                "chat_history.db", "chat_history.db-wal", "chat_history.db-shm",
+                "response_cache.db", "recall.db",
+                "riko_memory.json", "memory.json",
+            ]
             for fname in files:
                 if os.path.exists(fname):
                     try:
@@ -366,10 +292,13 @@ class RikoApp:
         self.config = self.load_config()
         self.chat_history = ChatHistoryManager()
         self.riko = None
-        self.init_riko()
+        self.riko_lock = threading.Lock()
 
         self.current_chat_id = None
         self.is_thinking = False
+        self.stream_chat_id = None
+        self.stream_parts = []
+        self.stream_live = False
 
         self.setup_ui()
         self.apply_theme()
@@ -379,6 +308,9 @@ class RikoApp:
         else:
             self.load_chat(self.chat_history.get_all_chats()[-1]["id"])
 
+        # Idle callbacks run once the window has been drawn
+        self.root.after_idle(self.warm_up)
+
     def load_config(self):
         try:
             with open(CONFIG_FILE, "r") as f:
@@ -401,9 +333,22 @@ class RikoApp:
         except Exception as e:
             print(f"Config save error: {e}")
 
+    def warm_up(self):
+        """Create Riko and the Groq client off the main thread, so the first send is quick."""
+        def work():
+            self.init_riko()
+            if self.riko is not None:
+                from riko import get_client
+                get_client()
+        threading.Thread(target=work, daemon=True).start()
+
     def init_riko(self):
-        if os.getenv("GROQ_API_KEY"):
+        # Also called on send, in case the warm-up hasn't finished (it then waits for it)
+        with self.riko_lock:
+            if self.riko is not None or not os.getenv("GROQ_API_KEY"):
+                return
             try:
+                from riko import Riko
                 prompt = self.config.get("system_prompt", "")
                 self.riko = Riko(system_prompt=prompt or None)
             except Exception as e:
@@ -454,6 +399,10 @@ class RikoApp:
         self.status_label = ttk.Label(header, text="● Ready", foreground="green")
         self.status_label.pack(side="right", padx=10)
 
+        # Rolling reply latency, filled in once the first reply has finished
+        self.metrics_label = ttk.Label(header, text="", foreground="gray")
+        self.metrics_label.pack(side="right")
+
         # No key banner
         self.banner = ttk.Frame(chat_area)
         banner_label = ttk.Label(self.banner, text="⚠️ No API key set — Riko can't reply yet.", foreground="red")
@@ -519,6 +468,7 @@ class RikoApp:
                 self.load_chat(chats[index]["id"])
 
     def on_new_chat(self):
+        self.stream_live = False
         self.current_chat_id = self.chat_history.create_chat()
         self.chat_display.config(state=tk.NORMAL)
         self.chat_display.delete("1.0", tk.END)
@@ -534,6 +484,7 @@ class RikoApp:
         if not chat:
             return
 
+        self.stream_live = False
         self.chat_display.config(state=tk.NORMAL)
         self.chat_display.delete("1.0", tk.END)
 
@@ -556,7 +507,10 @@ class RikoApp:
     def delete_current_chat(self):
         if self.current_chat_id is not None:
             if messagebox.askyesno("Delete Chat", "Delete this chat permanently?"):
-                self.chat_history.delete_chat(self.current_chat_id)
+                deleted_id = self.current_chat_id
+                self.chat_history.delete_chat(deleted_id, self.riko)
+                # Ids may have moved down; a reply still streaming must be saved to its chat's new id
+                self.stream_chat_id = self.chat_history.id_after_delete(self.stream_chat_id, deleted_id)
                 self.on_new_chat()
 
     def add_chat_message(self, sender, message, is_system=False):
@@ -614,21 +568,72 @@ class RikoApp:
         lang = self.config.get("language", "en")
         prefix = f"[Respond in {lang_names.get(lang, 'English')}] " if lang != "en" else ""
 
+        self.riko.set_chat(self.current_chat_id)
+        self.begin_response()
+
         def get_response():
             try:
-                reply = self.riko.reply(prefix + message)
-                self.root.after(0, lambda: self.display_response(reply))
+                for delta in self.riko.reply_stream(prefix + message):
+                    self.root.after(0, self.display_response, delta)
             except Exception as e:
-                self.root.after(0, lambda: self.display_response(f"❌ Error: {e}"))
+                self.root.after(0, self.display_response, f"❌ Error: {e}")
+            self.root.after(0, self.finish_response)
 
         threading.Thread(target=get_response, daemon=True).start()
 
-    def display_response(self, reply):
+    def begin_response(self):
+        """Write Riko's header line; the reply text is streamed in after it."""
+        self.stream_chat_id = self.current_chat_id
+        self.stream_parts = []
+        self.stream_live = True
+
+        self.chat_display.config(state=tk.NORMAL)
+        timestamp = datetime.now().strftime("%H:%M")
+        self.chat_display.insert(tk.END, f"[{timestamp}] ", "timestamp")
+        self.chat_display.insert(tk.END, "Riko: ", "riko")
+        self.chat_display.config(state=tk.DISABLED)
+
+    def display_response(self, delta):
+        """Append one streamed chunk of Riko's reply to the chat display."""
+        self.stream_parts.append(delta)
+        # The user may have switched chats while the reply is streaming
+        if self.stream_live:
+            self.chat_display.config(state=tk.NORMAL)
+            self.chat_display.insert(tk.END, delta, "message")
+            self.chat_display.see(tk.END)
+            self.chat_display.config(state=tk.DISABLED)
+
+    def finish_response(self):
+        """Close the streamed reply and save it once the stream has ended."""
         self.is_thinking = False
         self.status_label.config(text="● Ready", foreground="green")
-        self.add_chat_message("Riko", reply)
+
+        if self.stream_live:
+            self.chat_display.config(state=tk.NORMAL)
+            self.chat_display.insert(tk.END, "\n\n", "message")
+            self.chat_display.config(state=tk.DISABLED)
+        self.stream_live = False
+
+        reply = "".join(self.stream_parts)
+        if reply and self.stream_chat_id is not None:      # None: its chat was deleted meanwhile
+            self.chat_history.add_message(self.stream_chat_id, "Riko", reply)
+            chat = self.chat_history.get_chat(self.current_chat_id)
+            if chat:
+                self.chat_title.config(text=f"💬 {chat['title']}")
+            self.refresh_chat_list()
+        self.update_metrics_label()
+
+    def update_metrics_label(self):
+        """Show rolling reply latency in the header."""
+        if self.riko is None:
+            return
+        from riko import format_summary
+        self.metrics_label.config(text=format_summary(self.riko.metrics()))
 
     def show_settings(self):
+        # Write memory now, so a reset from the settings isn't overwritten later
+        if self.riko:
+            self.riko.flush_memory()
         SettingsWindow(self.root, self.config, self.on_settings_saved)
 
     def on_settings_saved(self, new_config):
@@ -636,7 +641,10 @@ class RikoApp:
         apply_active_key(self.config)
         self.save_config()
         self.apply_theme()
-        self.riko = None
+        with self.riko_lock:     # waits for a warm-up still creating the old one
+            if self.riko:
+                self.riko.close(save=False)
+            self.riko = None
         self.init_riko()
         self.update_banner()
         
@@ -0,0 +1,371 @@
+"""
+profiling.py — CPU and memory profiling for a whole Riko run.
+
+run.py --profile=cpu|mem picks a timestamped directory and passes it on in
+$RIKO_PROFILE / $RIKO_PROFILE_DIR, so the process it starts (the GUI, the
+terminal loop or riko_bridge.py behind the C/C++ GUI) calls
+start_from_env() and profiles itself. Results are rewritten every
+PROFILE_INTERVAL seconds and at exit, so a process that is killed (the
+bridge is, when the settings change) still leaves a recent profile.
+
+cpu   cProfile over every thread:
+        cpu.pstats     for pstats / snakeviz
+        cpu.txt        the top functions by cumulative and own time
+        cpu.collapsed  "outer;inner;leaf microseconds" lines for flamegraph.pl
+                       or speedscope
+mem   tracemalloc snapshots, diffed against the previous one and the first:
+        mem-NNN.txt    growth by the line of Riko's own code that allocated
+                       (e.g. an append to Riko.history or
+                       ChatHistoryManager.history), by allocating line, and
+                       the largest live allocation sites
+"""
+
+import atexit
+import cProfile
+import heapq
+import io
+import linecache
+import os
+import pstats
+import sys
+import threading
+import time
+import tracemalloc
+
+
+PROFILE_ENV     = "RIKO_PROFILE"
+PROFILE_DIR_ENV = "RIKO_PROFILE_DIR"
+MODES           = ("cpu", "mem")
+
+# Seconds between rewrites of the results ($RIKO_PROFILE_INTERVAL overrides it)
+PROFILE_INTERVAL = 30.0
+
+# Functions listed in cpu.txt, and the smallest stack kept in cpu.collapsed
+TOP_FUNCTIONS     = 40
+MIN_STACK_SECONDS = 0.0005
+MAX_STACK_DEPTH   = 64
+
+# Frames kept per allocation, and lines listed per section of mem-NNN.txt
+TRACE_FRAMES = 16
+TOP_SITES    = 20
+
+PROJECT_DIR = os.path.dirname(os.path.abspath(__file__))
+
+
+def start_from_env(name=None):
+    """Start the profiler $RIKO_PROFILE asks for, or do nothing (returns None).
+
+    `name` puts the results in a subdirectory, for processes that share the
+    run's directory (e.g. "bridge-<pid>").
+    """
+    mode, out_dir = os.getenv(PROFILE_ENV), os.getenv(PROFILE_DIR_ENV)
+    if mode not in MODES or not out_dir:
+        return None
+    if name:
+        out_dir = os.path.join(out_dir, name)
+    try:
+        interval = float(os.getenv("RIKO_PROFILE_INTERVAL", PROFILE_INTERVAL))
+    except ValueError:
+        interval = PROFILE_INTERVAL
+    return start(mode, out_dir, interval)
+
+
+def start(mode, out_dir, interval=PROFILE_INTERVAL):
+    """Profile this process from now on, writing to `out_dir`."""
+    os.makedirs(out_dir, exist_ok=True)
+    profiler = CpuProfiler(out_dir, interval) if mode == "cpu" else MemoryProfiler(out_dir, interval)
+    profiler.start()
+    return profiler
+
+
+class Profiler:
+    """Dumps its results every `interval` seconds from a daemon thread, and at exit."""
+
+    def __init__(self, out_dir, interval):
+        self.out_dir  = out_dir
+        self.interval = interval
+        self._stop    = threading.Event()
+        self._lock    = threading.Lock()
+
+    def start(self):
+        threading.Thread(target=self._run, daemon=True).start()
+        atexit.register(self.stop)
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            self._dump()
+
+    def stop(self):
+        if not self._stop.is_set():
+            self._stop.set()
+            self._dump()
+
+    def _dump(self):
+        with self._lock:
+            try:
+                self.dump()
+            except Exception as e:
+                print(f"Profile write error: {e}", file=sys.stderr)
+
+    def dump(self):
+        raise NotImplementedError
+
+
+# ── CPU ──────────────────────────────────────────────────────────────────────
+
+class _Snapshot:
+    """Stats already taken from a running profile, in the form pstats.Stats() loads."""
+
+    def __init__(self, stats):
+        self.stats = stats
+
+    def create_stats(self):
+        pass
+
+
+class CpuProfiler(Profiler):
+    """cProfile on every thread.
+
+    Before Python 3.12 a profile only sees the thread that enabled it, so each
+    thread started from now on gets its own and they are merged when dumped.
+    """
+
+    def __init__(self, out_dir, interval):
+        super().__init__(out_dir, interval)
+        self.profiles = []
+
+    def start(self):
+        super().start()               # the dump thread itself isn't profiled
+        self._profile_thread()
+        if sys.version_info < (3, 12):
+            threading.setprofile(self._thread_started)
+
+    def _thread_started(self, frame, event, arg):
+        # Runs on a new thread's first call; enabling the profile replaces this hook
+        self._profile_thread()
+
+    def _profile_thread(self):
+        profile = cProfile.Profile()
+        profile.enable()
+        with self._lock:
+            self.profiles.append(profile)
+
+    def stats(self):
+        """pstats.Stats over all threads so far; the profiles keep running."""
+        snapshots = []
+        for profile in list(self.profiles):
+            profile.snapshot_stats()  # reads the counters without disabling the profile
+            snapshots.append(_Snapshot(profile.stats))
+        stats = pstats.Stats(snapshots[0])
+        for snapshot in snapshots[1:]:
+            stats.add(snapshot)
+        return stats
+
+    def stop(self):
+        threading.setprofile(None)
+        super().stop()
+        # An enabled profile that is freed during interpreter shutdown complains
+        for profile in self.profiles:
+            profile.disable()
+
+    def dump(self):
+        stats = self.stats()
+        stats.dump_stats(os.path.join(self.out_dir, "cpu.pstats"))
+
+        text = io.StringIO()
+        stats.stream = text
+        stats.sort_stats("cumulative").print_stats(TOP_FUNCTIONS)
+        stats.sort_stats("tottime").print_stats(TOP_FUNCTIONS)
+        with open(os.path.join(self.out_dir, "cpu.txt"), "w", encoding="utf-8") as f:
+            f.write(text.getvalue())
+
+        with open(os.path.join(self.out_dir, "cpu.collapsed"), "w", encoding="utf-8") as f:
+            for stack, seconds in sorted(collapsed_stacks(stats.stats).items()):
+                f.write(f"{';'.join(stack)} {round(seconds * 1e6)}\n")
+
+
+def frame_label(func):
+    """A pstats function key as "name (file.py:line)"."""
+    filename, line, name = func
+    if filename == "~":               # built-ins: name is "<built-in method ...>"
+        return name.replace(";", ",")
+    return f"{name} ({os.path.basename(filename)}:{line})".replace(";", ",")
+
+
+def collapsed_stacks(stats):
+    """{stack tuple: seconds of own time} from pstats data, for a flame graph.
+
+    cProfile records caller -> callee edges rather than whole stacks, so a
+    function's time is split over the ways it was reached in proportion to
+    the time each call edge took. A function repeated in a stack
+    (recursion) ends it, and stacks under MIN_STACK_SECONDS are dropped.
+    """
+    callees = {}
+    for func, (_, _, _, _, callers) in stats.items():
+        for caller, edge in callers.items():
+            callees.setdefault(caller, []).append((func, edge[3]))
+
+    stacks = {}
+
+    def walk(func, stack, share):
+        _, _, own, total, _ = stats[func]
+        stack = stack + (frame_label(func),)
+        if own * share > 0:
+            stacks[stack] = stacks.get(stack, 0.0) + own * share
+        if len(stack) >= MAX_STACK_DEPTH:
+            return
+        for callee, edge_time in callees.get(func, ()):
+            callee_total = stats[callee][3]
+            if callee_total <= 0 or frame_label(callee) in stack:
+                continue
+            callee_share = share * min(1.0, edge_time / callee_total)
+            if callee_total * callee_share >= MIN_STACK_SECONDS:
+                walk(callee, stack, callee_share)
+
+    # Thread entry points, and whatever was running when profiling started
+    for func, (_, _, _, _, callers) in stats.items():
+        if not callers:
+            walk(func, (), 1.0)
+    return stacks
+
+
+# ── Memory ───────────────────────────────────────────────────────────────────
+
+class MemoryUse:
+    """Live memory in one tracemalloc snapshot, summed three ways.
+
+    sites       {(file, line): bytes} charged to the newest frame in Riko's own
+                code, so a json.load() or list growth inside the standard
+                library shows up at the line of riko.py or chat_history.py
+                that asked for it
+    lines       {(file, line): (bytes, blocks)} by the line that allocated
+    tracebacks  the largest live allocation sites, as (bytes, blocks, frames)
+
+    Allocations made under this module (the profiler's own) are left out.
+    """
+
+    def __init__(self, snapshot):
+        self.sites      = {}
+        self.lines      = {}
+        self.total      = 0
+        by_traceback    = {}          # frames, newest first -> (bytes, blocks)
+        kinds           = {}          # filename -> PROJECT, PROFILER or None
+
+        # Most traces share their traceback with many others, so they are
+        # summed per traceback first and each one's frames walked only once
+        per_traceback = {}
+        for trace in snapshot.traces:
+            traceback = trace.traceback
+            old = per_traceback.get(traceback, (0, 0))
+            per_traceback[traceback] = (old[0] + trace.size, old[1] + 1)
+
+        for traceback, (size, blocks) in per_traceback.items():
+            frames = tuple((frame.filename, frame.lineno) for frame in reversed(traceback))
+            site = None
+            for filename, line in frames:
+                kind = kinds.get(filename, 0)
+                if kind == 0:
+                    kind = kinds[filename] = frame_kind(filename)
+                if kind is PROFILER:
+                    break
+                if kind is PROJECT and site is None:
+                    site = (os.path.basename(filename), line)
+            else:
+                self.total += size
+                if site is not None:
+                    self.sites[site] = self.sites.get(site, 0) + size
+                if frames:
+                    old = self.lines.get(frames[0], (0, 0))
+                    self.lines[frames[0]] = (old[0] + size, old[1] + blocks)
+                    old = by_traceback.get(frames, (0, 0))
+                    by_traceback[frames] = (old[0] + size, old[1] + blocks)
+
+        largest = heapq.nlargest(5, by_traceback.items(), key=lambda item: item[1][0])
+        self.tracebacks = [(size, blocks, frames) for frames, (size, blocks) in largest]
+
+
+PROJECT, PROFILER = "project", "profiler"
+
+
+def frame_kind(filename):
+    """PROJECT for Riko's own modules, PROFILER for this one, else None."""
+    if filename.startswith("<"):          # <frozen ...>, <unknown>, <string>
+        return None
+    # Modules found through a relative sys.path entry have relative names
+    path = os.path.abspath(filename)
+    if path == os.path.abspath(__file__) or path == os.path.abspath(linecache.__file__):
+        return PROFILER
+    return PROJECT if path.startswith(PROJECT_DIR + os.sep) else None
+
+
+class MemoryProfiler(Profiler):
+    """tracemalloc snapshots every `interval` seconds, each diffed against the last and the first."""
+
+    def __init__(self, out_dir, interval):
+        super().__init__(out_dir, interval)
+        self.count    = 0
+        self.first    = None
+        self.previous = None
+
+    def start(self):
+        tracemalloc.start(TRACE_FRAMES)
+        self.first = self.previous = MemoryUse(tracemalloc.take_snapshot())
+        super().start()
+
+    def stop(self):
+        super().stop()
+        tracemalloc.stop()
+
+    def dump(self):
+        if not tracemalloc.is_tracing():
+            return
+        use = MemoryUse(tracemalloc.take_snapshot())
+        current, peak = tracemalloc.get_traced_memory()
+        self.count += 1
+
+        lines = [f"Snapshot {self.count} at {time.strftime('%Y-%m-%d %H:%M:%S')}",
+                 f"Traced memory: {format_size(current)} now, {format_size(peak)} at peak, "
+                 f"{format_size(use.total - self.previous.total)} since the previous snapshot", ""]
+
+        lines.append("Growth since the previous snapshot, by the project line that allocated:")
+        lines += format_growth(use.sites, self.previous.sites)
+        lines.append("")
+        lines.append("Growth since profiling started, by the project line that allocated:")
+        lines += format_growth(use.sites, self.first.sites)
+        lines.append("")
+        lines.append("Growth since the previous snapshot, by allocating line:")
+        sizes = {(short_name(f), line): size for (f, line), (size, _) in use.lines.items()}
+        before = {(short_name(f), line): size for (f, line), (size, _) in self.previous.lines.items()}
+        lines += format_growth(sizes, before)
+        lines.append("")
+        lines.append("Largest live allocation sites (newest frame first):")
+        for size, blocks, frames in use.tracebacks:
+            lines.append(f"  {format_size(size)} in {blocks} blocks")
+            lines += [f"    {short_name(filename)}:{line}" for filename, line in frames[:8]]
+
+        with open(os.path.join(self.out_dir, f"mem-{self.count:03d}.txt"), "w", encoding="utf-8") as f:
+            f.write("\n".join(lines) + "\n")
+        self.previous = use
+
+
+def short_name(filename):
+    """"package/module.py" for a module's path."""
+    return "/".join(filename.replace(os.sep, "/").split("/")[-2:])
+
+
+def format_growth(sizes, before):
+    growth = heapq.nlargest(TOP_SITES, ((size - before.get(key, 0), key) for key, size in sizes.items()))
+    lines = []
+    for grown, (filename, line) in growth:
+        if grown <= 0:
+            break
+        lines.append(f"  {filename}:{line}: +{format_size(grown)} ({format_size(sizes[(filename, line)])} live)")
+    return lines or ["  (none)"]
+
+
+def format_size(size):
+    for unit in ("B", "KiB", "MiB"):
+        if abs(size) < 1024:
+            return f"{size:.0f} {unit}" if unit == "B" else f"{size:.1f} {unit}"
+        size /= 1024
+    return f"{size:.1f} GiB"
@@ -0,0 +1,452 @@
+"""
+recall.py — Long-term memory: snippets of past chats found by similarity.
+
+Every finished exchange (the user's message and Riko's reply) becomes a
+chunk in recall.db, with its embedding (see embeddings.py). The first time
+the database is opened, every chat already saved in the chat history is
+chunked into it too. For each new message the most similar chunks are
+looked up and sent with the request, within a small token budget. When
+a chat is deleted its chunks are deleted too (RecallIndex.forget()).
+
+The vectors are loaded into one NumPy matrix and searched by brute force.
+Past `ivf_min_chunks` chunks an IVF index is trained as well: the vectors
+are grouped under k-means centroids and a query only scores the groups of
+its `nprobe` closest centroids, which keeps a lookup at a million chunks
+in the low milliseconds. Loading, embedding, writing and training all run
+on a worker thread; until the vectors are loaded nothing is recalled.
+
+Settings come from config.json["api"]["recall"]: "enabled" (on by default
+when NumPy is installed), "k", "tokens", "min_score", "embedding_model",
+"ivf_min_chunks" and "nprobe".
+"""
+
+import hashlib
+import json
+import os
+import queue
+import sqlite3
+import sys
+import threading
+from array import array
+
+from embeddings import HashedNgramEmbedder, VectorMatrix, get_embedder, np
+
+
+RECALL_DB = "recall.db"
+
+DEFAULT_K              = 3          # snippets sent with a request at most
+DEFAULT_TOKENS         = 300        # prompt tokens they may take
+DEFAULT_MIN_SCORE      = 0.3        # cosine similarity a snippet needs
+DEFAULT_IVF_MIN_CHUNKS = 50000      # below this brute force is fast enough
+DEFAULT_NPROBE         = 16         # IVF lists scored per query
+
+CHUNK_CHARS      = 400      # of each message kept in a chunk
+CHARS_PER_TOKEN  = 4
+EMBED_BATCH      = 512
+CLOSE_TIMEOUT    = 5        # seconds close() waits for queued chunks to be written
+
+# k-means training for the IVF index
+KMEANS_ITERATIONS = 8
+KMEANS_SAMPLE     = 32      # training vectors per centroid
+MAX_LISTS         = 4096
+
+HISTORY_FILE = "chat_history.json"
+JOURNAL_FILE = "chat_history.jsonl"
+HISTORY_DB   = "chat_history.db"
+
+
+def past_chats():
+    """Every saved chat as (chat_id, messages), from the store chat_history.py is set to use.
+
+    This runs on the worker thread while the app is writing chats, so the
+    history is only read: a torn journal line is skipped, not cut off, and
+    the database is opened read-only.
+    """
+    try:
+        from chat_history import get_storage_backend
+    except ImportError:
+        return _past_chats_from_json()
+    if get_storage_backend() == "sqlite":
+        return _past_chats_from_sqlite()
+    return _past_chats_from_json()
+
+
+def _past_chats_from_json():
+    """The JSON snapshot with its journal replayed (the record format of chat_history.py)."""
+    history = {"chats": []}
+    try:
+        with open(HISTORY_FILE, "r") as f:
+            history = json.load(f)
+    except (OSError, ValueError):
+        pass
+    chats, seq = history.get("chats", []), history.get("journal_seq", 0)
+
+    if os.path.exists(JOURNAL_FILE):
+        with open(JOURNAL_FILE, "r", encoding="utf-8") as f:
+            for line in f:
+                if not line.endswith("\n"):
+                    break                       # torn, or still being written
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    break
+                if record.get("seq", 0) <= seq:
+                    continue
+                op = record.get("op")
+                if op == "create":
+                    chats.append(record["chat"])
+                elif op == "message" and record["chat_id"] < len(chats):
+                    chats[record["chat_id"]]["messages"].append(record["msg"])
+                elif op == "delete" and record["chat_id"] < len(chats):
+                    chats.pop(record["chat_id"])
+    return [(i, chat.get("messages", [])) for i, chat in enumerate(chats)]
+
+
+def _past_chats_from_sqlite():
+    """The chats in chat_history.db, opened read-only."""
+    if not os.path.exists(HISTORY_DB):
+        return []
+    db = sqlite3.connect(f"file:{HISTORY_DB}?mode=ro", uri=True)
+    try:
+        chats = {chat_id: [] for (chat_id,) in db.execute("SELECT id FROM chats ORDER BY id")}
+        for chat_id, sender, message in db.execute(
+                "SELECT chat_id, sender, message FROM messages ORDER BY chat_id, ts, id"):
+            if chat_id in chats:
+                chats[chat_id].append({"sender": sender, "message": message})
+    finally:
+        db.close()
+    return list(chats.items())
+
+
+def forget_chat(chat_id, renumber=False, db_file=RECALL_DB):
+    """RecallIndex.forget() for when no index is open: straight on recall.db, now."""
+    if not os.path.exists(db_file):
+        return
+    db = sqlite3.connect(db_file)
+    try:
+        with db:
+            delete_chunks(db, chat_id, renumber)
+    finally:
+        db.close()
+
+
+def delete_chunks(db, chat_id, renumber):
+    """Delete a chat's chunks, moving later chats down one id with `renumber`; returns the chunk ids."""
+    gone = [row[0] for row in db.execute("SELECT id FROM chunks WHERE chat_id = ?", (chat_id,))]
+    db.execute("DELETE FROM chunks WHERE chat_id = ?", (chat_id,))
+    if renumber:
+        db.execute("UPDATE chunks SET chat_id = chat_id - 1 WHERE chat_id > ?", (chat_id,))
+    return gone
+
+
+def exchanges(messages):
+    """(user, reply) pairs from chat_history messages ({"sender", "message"})."""
+    pairs, question = [], None
+    for msg in messages:
+        if msg.get("sender") == "You":
+            question = msg.get("message", "")
+        elif question is not None:
+            pairs.append((question, msg.get("message", "")))
+            question = None
+    return pairs
+
+
+class IVFIndex:
+    """Rows of a VectorMatrix grouped under their closest k-means centroid."""
+
+    def __init__(self, matrix, count):
+        self.matrix = matrix
+        self.nlist  = int(min(MAX_LISTS, max(16, np.sqrt(count))))
+        self.count  = count           # rows covered when trained
+        self.centroids = self._kmeans(matrix.vectors[:count])
+        self.lists  = self._assign(matrix.vectors[:count])
+        self.extra  = [[] for _ in range(self.nlist)]    # rows added since training
+        self._lock  = threading.Lock()
+
+    def _kmeans(self, vectors):
+        rng = np.random.default_rng(0)
+        sample = vectors[rng.choice(len(vectors), min(len(vectors), self.nlist * KMEANS_SAMPLE), replace=False)]
+        centroids = sample[rng.choice(len(sample), self.nlist, replace=False)].copy()
+        for _ in range(KMEANS_ITERATIONS):
+            nearest = np.argmax(sample @ centroids.T, axis=1)
+            order = np.argsort(nearest, kind="stable")
+            used, starts = np.unique(nearest[order], return_index=True)
+            sums = np.add.reduceat(sample[order], starts, axis=0)
+            norms = np.linalg.norm(sums, axis=1, keepdims=True)
+            norms[norms == 0] = 1.0
+            # Centroids nobody picked keep their old position
+            centroids[used] = sums / norms
+        return centroids
+
+    def _assign(self, vectors, block=65536):
+        nearest = np.concatenate([
+            np.argmax(vectors[i:i + block] @ self.centroids.T, axis=1)
+            for i in range(0, len(vectors), block)
+        ]) if len(vectors) else np.zeros(0, dtype=np.int64)
+        order = np.argsort(nearest, kind="stable")
+        bounds = np.searchsorted(nearest[order], np.arange(self.nlist + 1))
+        return [order[bounds[c]:bounds[c + 1]] for c in range(self.nlist)]
+
+    def add(self, row, vector):
+        with self._lock:
+            self.extra[int(np.argmax(self.centroids @ vector))].append(row)
+
+    def candidates(self, query, nprobe):
+        """Rows in the `nprobe` lists whose centroids are closest to `query`."""
+        nprobe = min(nprobe, self.nlist)
+        probe = np.argpartition(-(self.centroids @ query), nprobe - 1)[:nprobe]
+        with self._lock:
+            parts = [self.lists[c] for c in probe]
+            parts += [np.array(self.extra[c], dtype=np.int64) for c in probe if self.extra[c]]
+        return np.concatenate(parts)
+
+
+class Forget:
+    """A deleted chat, queued for the worker in order with the exchanges around it."""
+
+    def __init__(self, chat_id, renumber):
+        self.chat_id  = chat_id
+        self.renumber = renumber
+
+
+class RecallIndex:
+    """Past exchanges in recall.db, searchable by similarity to a new message.
+
+    Chunks carry the id of the chat they came from. In the JSON chat store
+    that id is the chat's position, so forget() moves the chunks of later
+    chats down along with their chats.
+    """
+
+    SCHEMA = """
+    CREATE TABLE IF NOT EXISTS chunks (
+        id      INTEGER PRIMARY KEY,
+        hash    TEXT UNIQUE NOT NULL,
+        chat_id INTEGER,
+        user    TEXT NOT NULL,
+        reply   TEXT NOT NULL,
+        vector  BLOB NOT NULL
+    );
+    CREATE TABLE IF NOT EXISTS meta (
+        key   TEXT PRIMARY KEY,
+        value TEXT
+    );
+    """
+
+    def __init__(self, embedder, model_name=None, db_file=RECALL_DB, k=DEFAULT_K,
+                 max_tokens=DEFAULT_TOKENS, min_score=DEFAULT_MIN_SCORE,
+                 ivf_min_chunks=DEFAULT_IVF_MIN_CHUNKS, nprobe=DEFAULT_NPROBE):
+        self.embedder       = embedder
+        hashed = isinstance(embedder, HashedNgramEmbedder)
+        self.embedder_name  = f"{'hashed' if hashed else model_name}:{embedder.dim}"
+        self.k              = k
+        self.max_tokens     = max_tokens
+        self.min_score      = min_score
+        self.ivf_min_chunks = ivf_min_chunks
+        self.nprobe         = nprobe
+        self.matrix         = VectorMatrix(embedder.dim)
+        self.ids            = array("q")     # row -> chunks.id
+        self.ivf            = None
+        self.ready          = False
+        self._db_lock       = threading.Lock()
+        self._queue         = queue.Queue()
+
+        self.db = sqlite3.connect(db_file, check_same_thread=False)
+        self.db.executescript(self.SCHEMA)
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    @classmethod
+    def from_config(cls, api_config):
+        """The index described by config.json["api"]["recall"], or None if it is off."""
+        config = api_config.get("recall") or {}
+        if not config.get("enabled", True):
+            return None
+        model_name = config.get("embedding_model")
+        embedder = get_embedder(model_name)
+        if embedder is None:
+            return None
+        try:
+            return cls(
+                embedder, model_name,
+                k=config.get("k", DEFAULT_K),
+                max_tokens=config.get("tokens", DEFAULT_TOKENS),
+                min_score=config.get("min_score", DEFAULT_MIN_SCORE),
+                ivf_min_chunks=config.get("ivf_min_chunks", DEFAULT_IVF_MIN_CHUNKS),
+                nprobe=config.get("nprobe", DEFAULT_NPROBE),
+            )
+        except sqlite3.Error as e:
+            print(f"Recall disabled: {e}", file=sys.stderr)
+            return None
+
+    def __len__(self):
+        return len(self.ids)
+
+    # ── worker thread ────────────────────────────────────────────────────────
+
+    def _run(self):
+        try:
+            self._load()
+            self.ready = True
+            if not self._meta("backfilled"):
+                for chat_id, messages in past_chats():
+                    self._store([(chat_id, user, reply) for user, reply in exchanges(messages)])
+                self._set_meta("backfilled", "1")
+        except Exception as e:
+            print(f"Recall load error: {e}", file=sys.stderr)
+            self.ready = True
+
+        stopped = False
+        while not stopped:
+            batch = [self._queue.get()]
+            while not self._queue.empty() and len(batch) < EMBED_BATCH:
+                batch.append(self._queue.get())
+            # None from close() ends the thread once what came before it is stored
+            stopped = None in batch
+            try:
+                pending = []
+                for item in batch:
+                    if isinstance(item, Forget):
+                        # Exchanges queued before the delete carry the old ids; store them first
+                        self._store(pending)
+                        pending = []
+                        self._forget(item.chat_id, item.renumber)
+                    elif item is not None:
+                        pending.append(item)
+                self._store(pending)
+            except Exception as e:
+                print(f"Recall save error: {e}", file=sys.stderr)
+        with self._db_lock:
+            self.db.close()
+
+    def _load(self):
+        if self._meta("embedder") != self.embedder_name:
+            self._reembed()
+        rows = self.db.execute("SELECT id, vector FROM chunks ORDER BY id")
+        while True:
+            page = rows.fetchmany(EMBED_BATCH)
+            if not page:
+                break
+            vectors = np.frombuffer(b"".join(r[1] for r in page), dtype=np.float32)
+            for (chunk_id, _), vector in zip(page, vectors.reshape(len(page), -1)):
+                self.matrix.add(vector)
+                self.ids.append(chunk_id)
+        self._maybe_train()
+
+    def _reembed(self):
+        """Recompute every vector after the embedding model changed."""
+        rows = self.db.execute("SELECT id, user, reply FROM chunks").fetchall()
+        for i in range(0, len(rows), EMBED_BATCH):
+            page = rows[i:i + EMBED_BATCH]
+            vectors = self.embedder.embed([f"{user}\n{reply}" for _, user, reply in page])
+            with self._db_lock, self.db:
+                self.db.executemany("UPDATE chunks SET vector = ? WHERE id = ?",
+                                    [(v.tobytes(), r[0]) for r, v in zip(page, vectors)])
+        self._set_meta("embedder", self.embedder_name)
+
+    def _store(self, exchanges):
+        chunks = []
+        for chat_id, user, reply in exchanges:
+            user, reply = user.strip()[:CHUNK_CHARS], reply.strip()[:CHUNK_CHARS]
+            if user and reply:
+                digest = hashlib.sha1(f"{user}\0{reply}".encode("utf-8")).hexdigest()
+                chunks.append((digest, chat_id, user, reply))
+        for i in range(0, len(chunks), EMBED_BATCH):
+            page = chunks[i:i + EMBED_BATCH]
+            vectors = self.embedder.embed([f"{user}\n{reply}" for _, _, user, reply in page])
+            added = []
+            with self._db_lock, self.db:
+                for chunk, vector in zip(page, vectors):
+                    cur = self.db.execute(
+                        "INSERT OR IGNORE INTO chunks (hash, chat_id, user, reply, vector) VALUES (?, ?, ?, ?, ?)",
+                        chunk + (vector.tobytes(),)
+                    )
+                    if cur.rowcount:
+                        added.append((cur.lastrowid, vector))
+            for chunk_id, vector in added:
+                row = self.matrix.add(vector)
+                self.ids.append(chunk_id)
+                if self.ivf is not None:
+                    self.ivf.add(row, vector)
+        self._maybe_train()
+
+    def _forget(self, chat_id, renumber):
+        with self._db_lock, self.db:
+            gone = delete_chunks(self.db, chat_id, renumber)
+        if gone:
+            # Matrix rows are never removed; a zero vector scores below any min_score
+            rows = np.flatnonzero(np.isin(np.frombuffer(self.ids, dtype=np.int64), gone))
+            zero = np.zeros(self.matrix.dim, dtype=np.float32)
+            for row in rows:
+                self.matrix.replace(row, zero)
+
+    def _maybe_train(self):
+        """(Re)train the IVF index once there are enough chunks, and when they have doubled."""
+        count = len(self.matrix)
+        if count < self.ivf_min_chunks or (self.ivf is not None and count < 2 * self.ivf.count):
+            return
+        # Rows are only added on this thread, so none arrive while training
+        self.ivf = IVFIndex(self.matrix, count)
+
+    def _meta(self, key):
+        with self._db_lock:
+            row = self.db.execute("SELECT value FROM meta WHERE key = ?", (key,)).fetchone()
+        return row[0] if row else None
+
+    def _set_meta(self, key, value):
+        with self._db_lock, self.db:
+            self.db.execute("INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)", (key, value))
+
+    # ── public ───────────────────────────────────────────────────────────────
+
+    def add(self, chat_id, user, reply):
+        """Remember one finished exchange (stored in the background)."""
+        self._queue.put((chat_id, user, reply))
+
+    def forget(self, chat_id, renumber=False):
+        """Drop the exchanges of a deleted chat (in the background).
+
+        With `renumber` the chats after it move down one id, as they do in
+        the JSON chat store.
+        """
+        self._queue.put(Forget(chat_id, renumber))
+
+    def search(self, text, skip=()):
+        """The exchanges most similar to `text`, best first, as (user, reply, score).
+
+        At most `k` are returned, within `max_tokens`. Exchanges whose
+        message starts one of the `skip` texts (e.g. those already in the
+        context window) are left out.
+        """
+        if not self.ready or not len(self.matrix):
+            return []
+        query = self.embedder.embed([text])[0]
+        ivf = self.ivf
+        rows = ivf.candidates(query, self.nprobe) if ivf is not None else None
+        found, scores = self.matrix.search(query, 2 * self.k, rows)
+
+        results, budget = [], self.max_tokens
+        for row, score in zip(found, scores):
+            if score < self.min_score or len(results) == self.k:
+                break
+            if row >= len(self.ids):
+                continue        # added to the matrix, its id not appended yet
+            with self._db_lock:
+                chunk = self.db.execute("SELECT user, reply FROM chunks WHERE id = ?",
+                                        (self.ids[row],)).fetchone()
+            if chunk is None or any(s.startswith(chunk[0]) or s.startswith(chunk[1]) for s in skip):
+                continue
+            cost = (len(chunk[0]) + len(chunk[1])) // CHARS_PER_TOKEN + 4
+            if cost > budget:
+                continue
+            budget -= cost
+            results.append((chunk[0], chunk[1], float(score)))
+        return results
+
+    def close(self):
+        """Store what is queued, then stop the worker and close the database."""
+        self.ready = False
+        self._queue.put(None)
+        self._thread.join(CLOSE_TIMEOUT)
+
+    def stats(self):
+        return {"chunks": len(self), "ivf_lists": self.ivf.nlist if self.ivf else 0, "ready": self.ready}